@@ -1,7 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.urls import path
+from .forms import BalanceAdjustmentForm
 from .models import (
     Member, Plan, Level, RankAndRewards, CompanyWallet, 
-    MemberPlan, IncomeHistory, RechargeTransaction, MemberBankDetails
+    MemberPlan, IncomeHistory, RechargeTransaction, MemberBankDetails, CommissionJob,
+    CompanyWalletEntry, LedgerTransaction, LedgerEntry, LedgerLine, DailyClose, IncomeDailyRollup, NetworkDailyIncome,
+    InsufficientFunds
 )
 
 @admin.register(Member)
@@ -9,7 +14,64 @@ class MemberAdmin(admin.ModelAdmin):
     list_display = ['user', 'mobile_no', 'status', 'sponsor', 'rank_no', 'total_income', 'joined_on']
     list_filter = ['status', 'rank_no', 'joined_on']
     search_fields = ['user__username', 'user__first_name', 'mobile_no']
-    readonly_fields = ['joined_on', 'last_updated']
+    readonly_fields = [
+        'joined_on', 'last_updated',
+        'left_active_count', 'left_inactive_count', 'left_total_count',
+        'right_active_count', 'right_inactive_count', 'right_total_count',
+        'tree_path', 'tree_depth', 'left_extreme', 'right_extreme',
+        # Money columns are snapshots of the ledger; change them with the "Adjust balances" action.
+        'account_balance', 'wallet_balance', 'today_income', 'total_income', 'direct_income', 'level_income',
+        'resale_income', 'matching_income', 'total_withdrawal',
+    ]
+    actions = ['adjust_balances']
+
+    @admin.action(description="Adjust balances through the ledger")
+    def adjust_balances(self, request, queryset):
+        """Credit or debit the selected members with one 'adjustment' ledger transaction."""
+        form = BalanceAdjustmentForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            account, amount = form.cleaned_data['account'], form.cleaned_data['amount']
+            members = list(queryset.order_by('pk'))
+            lines = [LedgerLine(member.pk, account, amount) for member in members]
+            lines.append(LedgerLine(None, 'company', -amount * len(members)))
+            try:
+                LedgerTransaction.post('adjustment', lines, description=form.cleaned_data['description'])
+            except InsufficientFunds as e:
+                self.message_user(request, f"No adjustment made: {e}", messages.ERROR)
+            else:
+                self.message_user(request, f"Adjusted the {account.replace('_', ' ')} of {len(members)} members by {amount}.", messages.SUCCESS)
+            return None
+
+        context = dict(
+            self.admin_site.each_context(request), opts=self.model._meta, title="Adjust balances",
+            form=form, members=queryset, action_checkbox_name=admin.helpers.ACTION_CHECKBOX_NAME,
+        )
+        return TemplateResponse(request, 'admin/mlm_app/member/adjust_balances.html', context)
+
+    def get_urls(self):
+        urls = [
+            path('network-stats/', self.admin_site.admin_view(self.network_stats_view), name='mlm_app_member_network_stats'),
+        ]
+        return urls + super().get_urls()
+
+    def network_stats_view(self, request):
+        """Whole-network subtree, depth, pair and rank statistics computed in memory."""
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, title="Network statistics")
+        try:
+            from .network import Network
+        except ImportError as e:
+            messages.error(request, f"Network statistics require NumPy: {e}")
+        else:
+            network = Network.load()
+            context['summary'] = network.summary()
+            context['top_pairs'] = self._with_usernames(network.top(network.pairs))
+            context['top_teams'] = self._with_usernames(network.top(network.subtree_total))
+            context['top_imbalance'] = self._with_usernames(network.top(network.imbalance))
+        return TemplateResponse(request, 'admin/mlm_app/member/network_stats.html', context)
+
+    def _with_usernames(self, rows):
+        members = Member.objects.select_related('user').in_bulk([user_id for user_id, _ in rows], field_name='user_id')
+        return [(members[user_id] if user_id in members else user_id, value) for user_id, value in rows]
 
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
@@ -27,8 +89,24 @@ class RankAndRewardsAdmin(admin.ModelAdmin):
 
 @admin.register(CompanyWallet)
 class CompanyWalletAdmin(admin.ModelAdmin):
-    list_display = ['balance', 'charges_balance']
-    readonly_fields = ['balance', 'charges_balance']
+    list_display = ['balance', 'current_balance', 'charges_balance', 'rolled_up_at']
+    readonly_fields = ['balance', 'current_balance', 'charges_balance', 'rolled_up_at']
+
+    @admin.display(description='Current balance')
+    def current_balance(self, obj):
+        return CompanyWallet.current_balance()
+
+@admin.register(CompanyWalletEntry)
+class CompanyWalletEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'entry_type', 'amount', 'rolled_up', 'created_at']
+    list_filter = ['entry_type', 'rolled_up', 'created_at']
+    search_fields = ['description']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(MemberPlan)
 class MemberPlanAdmin(admin.ModelAdmin):
@@ -36,6 +114,19 @@ class MemberPlanAdmin(admin.ModelAdmin):
     list_filter = ['plan', 'is_active', 'activated_on']
     search_fields = ['member__user__username']
 
+@admin.register(CommissionJob)
+class CommissionJobAdmin(admin.ModelAdmin):
+    list_display = ['member_plan', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['member_plan__member__user__username']
+    readonly_fields = ['member_plan', 'attempts', 'last_error', 'created_at', 'processed_at']
+
+@admin.register(DailyClose)
+class DailyCloseAdmin(admin.ModelAdmin):
+    list_display = ['business_date', 'status', 'members_closed', 'payout_cutoff', 'started_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['business_date', 'status', 'payout_cutoff', 'last_member_id', 'members_closed', 'started_at', 'finished_at']
+
 @admin.register(IncomeHistory)
 class IncomeHistoryAdmin(admin.ModelAdmin):
     list_display = ['member', 'income_type', 'amount', 'created_at']
@@ -43,12 +134,67 @@ class IncomeHistoryAdmin(admin.ModelAdmin):
     search_fields = ['member__user__username']
     readonly_fields = ['created_at']
 
+@admin.register(IncomeDailyRollup)
+class IncomeDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['member', 'day', 'income_type', 'amount', 'entries']
+    list_filter = ['income_type']
+    search_fields = ['member__user__username']
+    date_hierarchy = 'day'
+    readonly_fields = ['member', 'day', 'income_type', 'amount', 'entries']
+
+@admin.register(NetworkDailyIncome)
+class NetworkDailyIncomeAdmin(admin.ModelAdmin):
+    list_display = ['day', 'income_type', 'amount', 'entries']
+    list_filter = ['income_type']
+    date_hierarchy = 'day'
+    readonly_fields = ['day', 'income_type', 'amount', 'entries']
+
+class LedgerEntryInline(admin.TabularInline):
+    model = LedgerEntry
+    fields = ['member', 'account', 'income_type', 'amount']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(LedgerTransaction)
+class LedgerTransactionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'reference', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['reference', 'entries__member__user__username']
+    readonly_fields = ['kind', 'reference', 'description', 'created_at']
+    inlines = [LedgerEntryInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(RechargeTransaction)
 class RechargeTransactionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'mobile_no', 'amount', 'company_name', 'status', 'recharge_date']
-    list_filter = ['status', 'company_name', 'recharge_date']
-    search_fields = ['user__username', 'mobile_no', 'order_id']
-    readonly_fields = ['recharge_date']
+    list_display = ['user', 'mobile_no', 'amount', 'company_name', 'status', 'operator_status', 'recharge_date', 'settled_at']
+    list_filter = ['status', 'company_name', 'operator_status', 'recharge_date']
+    search_fields = ['user__username', 'mobile_no', 'order_id', 'provider_txn_id']
+    readonly_fields = ['recharge_date', 'submitted_at', 'last_checked_at', 'status_checks', 'settled_at',
+                       'provider_txn_id', 'operator_status']
+    actions = ['resolve_as_success', 'resolve_as_failed']
+
+    def resolve(self, request, queryset, status):
+        from .recharges import resolve_recharge
+
+        resolved = 0
+        for pk in queryset.filter(status='review').values_list('pk', flat=True):
+            if resolve_recharge(pk, status).status == status:
+                resolved += 1
+        self.message_user(request, f"Settled {resolved} recharges in review as {status}.", messages.SUCCESS)
+
+    @admin.action(description="Settle recharges in review as successful")
+    def resolve_as_success(self, request, queryset):
+        self.resolve(request, queryset, 'success')
+
+    @admin.action(description="Settle recharges in review as failed and refund them")
+    def resolve_as_failed(self, request, queryset):
+        self.resolve(request, queryset, 'failed')
 
 @admin.register(MemberBankDetails)
 class MemberBankDetailsAdmin(admin.ModelAdmin):
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 class MlmAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mlm_app'
+
+    def ready(self):
+        from django.core import checks
+
+        from .dashboard_cache import check_shared_cache
+        checks.register(check_shared_cache, checks.Tags.caches)
@@ -0,0 +1,53 @@
+"""
+Per-process copies of small, rarely changing configuration tables.
+
+Each process keeps the loaded value in memory and checks a version token in the Django cache at
+most every ``check_interval`` seconds, so the hot path (payouts, dashboards) never touches the cache
+backend, which is the database by default. Invalidating replaces the token and drops this process's
+copy at once; other processes reload within ``check_interval`` through the shared cache backend
+configured in settings. Every copy is also reloaded once it is older than ``ttl`` seconds, so a
+long-running worker never keeps a stale value for longer than that even if an invalidation is lost
+(for example, evicted).
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+
+CONFIG_TTL = 60
+VERSION_CHECK_INTERVAL = 5
+
+
+class VersionedConfig:
+    def __init__(self, key, loader, ttl=CONFIG_TTL, check_interval=VERSION_CHECK_INTERVAL):
+        self.key = key
+        self.loader = loader
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.version = None
+        self.value = None
+        self.loaded_at = None
+        self.checked_at = None
+
+    def get(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return self.value
+
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid.uuid4().hex, None)
+            version = cache.get(self.key)
+
+        # The version is read before loading, so an invalidation during the load forces a reload.
+        expired = self.loaded_at is None or now - self.loaded_at >= self.ttl
+        if self.version != version or version is None or expired:
+            self.loaded_at = now
+            self.value = self.loader()
+            self.version = version
+        self.checked_at = now
+        return self.value
+
+    def invalidate(self):
+        cache.set(self.key, uuid.uuid4().hex, None)
+        self.checked_at = None
@@ -0,0 +1,87 @@
+"""
+Cached dashboard summaries.
+
+Each member's dashboard summary is kept in the Django cache under the member's user id, so a hit
+needs no database query. Code that changes what the dashboard shows (placement, activation, ledger
+postings, income records, daily close) calls ``invalidate_dashboards``; the entries are dropped when
+the surrounding transaction commits and the next view rebuilds them. Hits and misses are counted in
+the cache as well, so ``dashboard_cache_stats`` reports them across processes.
+
+All of this relies on a cache shared by every process; with a process-local backend an invalidation
+in one worker leaves the others serving stale summaries, so ``check_shared_cache`` fails the Django
+system checks when one is configured.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+SUMMARY_TIMEOUT = 300
+STATS_KEYS = {
+    'hits': 'mlm_app:dashboard:hits',
+    'misses': 'mlm_app:dashboard:misses',
+}
+
+
+def summary_key(user_id):
+    return f'mlm_app:dashboard:{user_id}'
+
+
+def count(event):
+    key = STATS_KEYS[event]
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add and incr; losing one count is fine.
+            pass
+
+
+def get_summary(user_id, build):
+    """Return the cached summary of ``user_id``, calling ``build()`` and caching its result on a miss."""
+    key = summary_key(user_id)
+    summary = cache.get(key)
+    if summary is not None:
+        count('hits')
+        return summary
+
+    count('misses')
+    summary = build()
+    cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_dashboards(user_ids):
+    """Drop the summaries of ``user_ids`` once the current transaction commits (immediately outside one)."""
+    keys = [summary_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def stats():
+    values = cache.get_many(STATS_KEYS.values())
+    return {event: values.get(key, 0) for event, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+def cache_is_shared():
+    return settings.CACHES.get('default', {}).get('BACKEND') not in PROCESS_LOCAL_BACKENDS
+
+
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [checks.Error(
+        "The default cache backend is process-local, so dashboard and config invalidations do not "
+        "reach other processes.",
+        hint="Configure a shared backend in CACHES (DatabaseCache, Redis or Memcached).",
+        id='mlm_app.E001',
+    )]
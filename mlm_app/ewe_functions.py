@@ -1,10 +1,19 @@
+import bisect
+import math
 import random
+import re
 import requests
 import string
+import threading
+import time
+from requests.adapters import HTTPAdapter
 import smtplib
 from email.message import EmailMessage
-from django.contrib.auth.models import User
 import os
+from .sequences import order_ids, usernames
+
+# Usernames handed out by generate_username; members cannot pick one of these themselves.
+GENERATED_USERNAME = re.compile(r'EWE(\d{7,})')
 
 def generate_random_password(length: int):
     characters = string.ascii_letters + string.digits
@@ -30,65 +39,229 @@ def send_gmail(receiver_gmail: str, subject: str, message: str):
         server.quit()
 
 def generate_username():
-    """ Generates a unique username starting with 'EWE' followed by random digits. """
-    while True:
-        username = f"EWE{''.join(random.choices(string.digits, k=6))}"
-        if not User.objects.filter(username=username).exists():
-            return username
+    """ Generates a unique username: 'EWE' followed by the next value of the username sequence. """
+    return f"EWE{usernames.next()}"
+
+def generate_usernames(count: int):
+    """ Generates ``count`` unique usernames with at most one sequence reservation. """
+    return [f"EWE{value}" for value in usernames.take(count)]
 
 def create_otp(digits: int):
     return random.randint(10**(digits - 1), 10**digits - 1)
 
-API_URL = "https://mrobotics.in/api/recharge"
+API_BASE_URL = os.environ.get('RECHARGE_API_URL', 'https://mrobotics.in/api')
 API_TOKEN = os.environ.get('RECHARGE_API_TOKEN', '0c5b76e1-c06b-4a8f-a5cb-c7102d9ca11b')
 
-def create_order_id(digits: int):
-    return random.randint(10**(digits - 1), 10**digits - 1)
+def create_order_id():
+    return str(order_ids.next())
+
+# Operator ids of the provider, keyed by MobileRechargeForm.COMPANY_CHOICES values.
+COMPANY_IDS = {
+    "vi": 1,
+    "airtel": 2,
+    "bsnl": 4,
+    "jio": 5
+}
+
+# Upper bounds in milliseconds of the provider latency histogram buckets.
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf]
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the provider is degraded: after ``failure_threshold`` consecutive failures the
+    circuit opens for ``reset_timeout`` seconds, then lets one trial call through (half-open) and
+    closes again on its success.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class ClientMetrics:
+    """Per-process latency histograms and outcome counters of provider calls, by operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.outcomes = {}
+
+    def observe(self, operation, seconds, outcome):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self.lock:
+            histogram = self.latency.setdefault(operation, [0] * len(LATENCY_BUCKETS_MS))
+            histogram[bucket] += 1
+            outcomes = self.outcomes.setdefault(operation, {})
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                operation: {
+                    'latency_ms': {
+                        ('+Inf' if bound == math.inf else str(bound)): count
+                        for bound, count in zip(LATENCY_BUCKETS_MS, histogram)
+                    },
+                    'outcomes': dict(self.outcomes.get(operation, {})),
+                }
+                for operation, histogram in self.latency.items()
+            }
+
+
+class RechargeClient:
+    """
+    Recharge provider API over one keep-alive ``requests.Session``, so calls reuse pooled
+    connections. Every call has a (connect, read) timeout and goes through a circuit breaker.
+    Recharges are sent once, since a retried order could be charged twice; status checks are
+    idempotent and retried with exponential backoff and full jitter.
+
+    Results are provider JSON dicts. A recharge whose outcome is unknown (timeout, transport error,
+    unreadable answer) is reported as 'pending' so it is reconciled later, and one that could not be
+    sent at all as 'failed'.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, api_token=API_TOKEN, recharge_timeout=(3.05, 30),
+                 status_timeout=(3.05, 10), status_retries=3, backoff=0.5, pool_size=20, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_token = api_token
+        self.recharge_timeout = recharge_timeout
+        self.status_timeout = status_timeout
+        self.status_retries = status_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = ClientMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, operation, method, path, timeout, **kwargs):
+        """
+        Send one request through the circuit breaker. Returns the decoded JSON and an outcome:
+        'ok', 'circuit_open', 'timeout', 'connection_error', 'server_error', 'client_error' or 'bad_response'.
+        Any other exception is raised after it is counted as an 'error' failure.
+        """
+        if not self.breaker.allow():
+            self.metrics.observe(operation, 0, 'circuit_open')
+            return None, 'circuit_open'
+
+        started = time.perf_counter()
+        payload, outcome = None, 'error'
+        try:
+            response = self.session.request(method, f"{self.base_url}/{path}", timeout=timeout, **kwargs)
+            if response.status_code >= 500:
+                outcome = 'server_error'
+            elif response.status_code >= 400:
+                outcome = 'client_error'
+            else:
+                outcome = 'ok'
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+        except requests.exceptions.RequestException:
+            outcome = 'connection_error'
+        else:
+            if outcome == 'ok':
+                try:
+                    payload = response.json()
+                except ValueError:
+                    outcome = 'bad_response'
+        finally:
+            # Only signs of a degraded provider count against the breaker. Recording either way also
+            # ends a half-open trial, which would otherwise keep the circuit shut.
+            if outcome in ('timeout', 'connection_error', 'server_error', 'error'):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self.metrics.observe(operation, time.perf_counter() - started, outcome)
+        return payload, outcome
+
+    def recharge(self, mobile_no, amount, company_name, order_id, is_stv=False):
+        company_id = COMPANY_IDS.get(company_name.lower())
+        if company_id is None:
+            return {"status": "failed", "error": "Invalid company name"}
+
+        payload, outcome = self.request('recharge', 'POST', 'recharge', self.recharge_timeout, data={
+            "api_token": self.api_token,
+            "mobile_no": mobile_no,
+            "amount": amount,
+            "company_id": company_id,
+            "order_id": order_id,
+            "is_stv": str(bool(is_stv)).lower()
+        })
+        if outcome == 'ok':
+            return payload
+        if outcome == 'circuit_open':
+            return {"status": "failed", "error": "The recharge provider is unavailable; please try again later."}
+        if outcome == 'client_error':
+            return {"status": "failed", "error": "The recharge provider rejected the request."}
+        # The provider may still have accepted the order, so its outcome is unknown rather than failed.
+        return {"status": "pending", "error": f"Recharge provider {outcome.replace('_', ' ')}."}
+
+    def check_status(self, mobile_no, amount, company_name, order_id, is_stv=False):
+        company_id = COMPANY_IDS.get(company_name.lower())
+        if company_id is None:
+            return {"error": "Invalid company name"}
+
+        params = {
+            "api_token": self.api_token,
+            "mobile_no": mobile_no,
+            "amount": amount,
+            "company_id": company_id,
+            "order_id": order_id,
+            "is_stv": str(bool(is_stv)).lower()
+        }
+        for attempt in range(self.status_retries + 1):
+            payload, outcome = self.request('status', 'GET', 'recharge_get', self.status_timeout, params=params)
+            if outcome in ('ok', 'client_error', 'bad_response', 'circuit_open') or attempt == self.status_retries:
+                break
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        if outcome == 'ok':
+            return payload
+        return {"error": "API request failed", "details": outcome.replace('_', ' ')}
+
+
+recharge_client = RechargeClient()
 
 def recharge_mobile(mobile_no, amount, company_name, order_id, is_stv=False):
-    company_ids = {
-        "vi": 1,
-        "airtel": 2,
-        "bsnl": 4,
-        "jio": 5
-    }
-    company_id = company_ids.get(company_name.lower(), None)
-    
-    data = {
-        "api_token": API_TOKEN,
-        "mobile_no": mobile_no,
-        "amount": amount,
-        "company_id": company_id,
-        "order_id": order_id,
-        "is_stv": str(is_stv).lower()
-    }
-    
-    try:
-        response = requests.post(API_URL, data=data)
-        return response.json()
-    except Exception as e:
-        return {"status": "failed", "error": str(e)}
+    return recharge_client.recharge(mobile_no, amount, company_name, order_id, is_stv)
 
 def check_recharge_status(mobile_no, amount, company_name, order_id, is_stv=False):
-    company_ids = {
-        "Vodafone": 1,
-        "Airtel": 2,
-        "Idea": 3,
-        "Bsnl": 4,
-        "Jio": 5
-    }
-    
-    company_id = company_ids.get(company_name)
-    if company_id is None:
-        return {"error": "Invalid company name"}
-    
-    url = (f"https://mrobotics.in/api/recharge_get?api_token={API_TOKEN}"
-           f"&mobile_no={mobile_no}&amount={amount}&company_id={company_id}"
-           f"&order_id={order_id}&is_stv={str(bool(is_stv)).lower()}")
-
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": "API request failed", "details": str(e)}
+    return recharge_client.check_status(mobile_no, amount, company_name, order_id, is_stv)
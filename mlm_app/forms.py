@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from .ewe_functions import GENERATED_USERNAME
 from .models import Member, Plan
 
 class UserRegistrationForm(UserCreationForm):
@@ -19,6 +20,13 @@ class UserRegistrationForm(UserCreationForm):
         for field in self.fields.values():
             field.widget.attrs.update({'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'})
 
+    def clean_username(self):
+        # UserCreationForm rejects usernames that differ from an existing one only by case.
+        username = super().clean_username()
+        if username and GENERATED_USERNAME.fullmatch(username.upper()):
+            raise forms.ValidationError("Usernames of the form EWE followed by seven or more digits are reserved.")
+        return username
+
 class PlanSelectionForm(forms.Form):
     plan = forms.ModelChoiceField(
         queryset=Plan.objects.all(),
@@ -65,3 +73,15 @@ class MobileRechargeForm(forms.Form):
             'class': 'mr-2'
         })
     )
+
+class BalanceAdjustmentForm(forms.Form):
+    """Admin adjustment of member balances, posted to the ledger against the company account."""
+    account = forms.ChoiceField(choices=[('account_balance', 'Account balance'), ('wallet_balance', 'Wallet balance')])
+    amount = forms.DecimalField(max_digits=15, decimal_places=2, help_text="Negative amounts debit the members.")
+    description = forms.CharField(max_length=200)
+
+    def clean_amount(self):
+        amount = self.cleaned_data['amount']
+        if amount == 0:
+            raise forms.ValidationError("Enter a non-zero amount.")
+        return amount
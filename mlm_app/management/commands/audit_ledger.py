@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from mlm_app.models import (
+    BALANCE_ACCOUNTS, TOTAL_INCOME_TYPES, CompanyWalletEntry, IncomeHistory, LedgerEntry, LedgerTransaction, Member,
+)
+
+INCOME_FIELDS = [income_type for income_type, _ in IncomeHistory.INCOME_TYPES]
+# today_income is reset by the daily close, so it is not reconstructed from the full ledger.
+SNAPSHOT_FIELDS = BALANCE_ACCOUNTS + INCOME_FIELDS + ['total_income']
+
+
+def ledger_sum(condition):
+    return Coalesce(
+        Sum('ledger_entries__amount', filter=condition), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+
+def ledger_snapshots(queryset=None):
+    """Annotate members with their snapshot columns rebuilt from the ledger, in a single query."""
+    queryset = Member.objects.all() if queryset is None else queryset
+    annotations = {f'ledger_{account}': ledger_sum(Q(ledger_entries__account=account)) for account in BALANCE_ACCOUNTS}
+    annotations.update({
+        f'ledger_{income_type}': ledger_sum(Q(ledger_entries__income_type=income_type)) for income_type in INCOME_FIELDS
+    })
+    annotations['ledger_total_income'] = ledger_sum(Q(ledger_entries__income_type__in=TOTAL_INCOME_TYPES))
+    return queryset.annotate(**annotations)
+
+
+def opening_balance_lines(rows):
+    """
+    Ledger lines that open the existing snapshot values of (pk, account_balance, wallet_balance,
+    direct_income, level_income, matching_income, resale_income) rows against the 'opening' account.
+    """
+    lines = []
+    for pk, account_balance, wallet_balance, *incomes in rows:
+        for account, amount in zip(BALANCE_ACCOUNTS, (account_balance, wallet_balance)):
+            if amount:
+                lines.append((pk, account, amount, ''))
+                lines.append((None, 'opening', -amount, ''))
+        for income_type, amount in zip(INCOME_FIELDS, incomes):
+            if amount:
+                # Income already sits in the balances above; these legs only record its type.
+                lines.append((pk, 'opening', amount, income_type))
+                lines.append((pk, 'opening', -amount, ''))
+    return lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild member balance snapshots from the double-entry ledger, report members whose stored "
+        "columns differ and transactions that do not balance, and optionally overwrite the snapshots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Write the ledger values to the snapshot columns.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        mismatched = []
+        for member in ledger_snapshots().order_by('pk').iterator(chunk_size=5000):
+            differences = {
+                field: (getattr(member, field), getattr(member, f'ledger_{field}'))
+                for field in SNAPSHOT_FIELDS
+                if getattr(member, field) != getattr(member, f'ledger_{field}')
+            }
+            if differences:
+                mismatched.append((member, differences))
+                for field, (stored, ledger) in differences.items():
+                    self.stdout.write(f"  member {member.pk}: {field} stored {stored}, ledger {ledger}")
+
+        unbalanced = self.unbalanced_transactions()
+        for ledger_transaction in unbalanced:
+            self.stdout.write(self.style.ERROR(f"  transaction {ledger_transaction.pk} is off by {ledger_transaction.imbalance}"))
+
+        self.stdout.write(f"{len(mismatched)} members differ from the ledger; {len(unbalanced)} unbalanced transactions.")
+        if not options['fix'] or not mismatched:
+            return
+
+        with transaction.atomic():
+            members = []
+            for member, differences in mismatched:
+                for field, (_, ledger) in differences.items():
+                    setattr(member, field, ledger)
+                members.append(member)
+            Member.objects.bulk_update(members, SNAPSHOT_FIELDS, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt snapshots for {len(members)} members."))
+
+    def unbalanced_transactions(self):
+        def total(model):
+            return Coalesce(
+                Subquery(
+                    model.objects.filter(transaction=OuterRef('pk')).order_by()
+                    .values('transaction').annotate(total=Sum('amount')).values('total')
+                ),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=15, decimal_places=2),
+            )
+
+        return list(
+            LedgerTransaction.objects.annotate(imbalance=total(LedgerEntry) + total(CompanyWalletEntry))
+            .exclude(imbalance=0)
+        )
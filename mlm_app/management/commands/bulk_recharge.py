@@ -0,0 +1,70 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mlm_app.forms import MobileRechargeForm
+from mlm_app.models import InsufficientFunds, Member
+from mlm_app.recharges import (
+    BULK_RECHARGE_MAX_ROWS, BULK_RECHARGE_WORKERS, recharge_result, reserve_recharges, submit_recharges
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recharge the numbers in a CSV file (mobile_no, amount, company_name, is_stv) from a member's "
+        "wallet. Rows are reserved and sent in batches; each batch is held with one ledger posting "
+        "and sent to the provider from a bounded thread pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Member whose wallet pays for the recharges.")
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=BULK_RECHARGE_MAX_ROWS)
+        parser.add_argument('--workers', type=int, default=BULK_RECHARGE_WORKERS,
+                            help="Provider calls in flight at once.")
+
+    def handle(self, *args, **options):
+        try:
+            member = Member.objects.select_related('user').get(user__username=options['username'])
+        except Member.DoesNotExist:
+            raise CommandError(f"No member '{options['username']}'.")
+
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            raise CommandError("No rows to recharge.")
+
+        cleaned = []
+        for line, row in enumerate(rows, start=2):
+            form = MobileRechargeForm(row)
+            if not form.is_valid():
+                errors = '; '.join(f"{field}: {' '.join(messages)}" for field, messages in form.errors.items())
+                raise CommandError(f"Line {line}: {errors}")
+            cleaned.append(form.cleaned_data)
+
+        started = time.perf_counter()
+        counts = {}
+        for start in range(0, len(cleaned), options['batch_size']):
+            batch = cleaned[start:start + options['batch_size']]
+            try:
+                recharges = reserve_recharges(member, batch)
+            except InsufficientFunds:
+                raise CommandError(
+                    f"Insufficient wallet balance for rows {start + 1}-{start + len(batch)}; "
+                    f"{start} rows were submitted before."
+                )
+            recharges, responses = submit_recharges(recharges, max_workers=options['workers'])
+            for recharge, response in zip(recharges, responses):
+                result = recharge_result(recharge, response)
+                counts[result['status']] = counts.get(result['status'], 0) + 1
+                if options['verbosity'] >= 2 or 'error' in result:
+                    self.stdout.write(
+                        f"{result['order_id']} {result['mobile_no']} {result['amount']}: {result['status']}"
+                        + (f" ({result['error']})" if 'error' in result else '')
+                    )
+
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Submitted {len(cleaned)} recharges in {time.perf_counter() - started:.2f}s: {summary}."
+        ))
@@ -0,0 +1,106 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from mlm_app.management.commands.process_commission_jobs import Command as CommissionWorker
+from mlm_app.dashboard_cache import invalidate_dashboards
+from mlm_app.models import DailyClose, Member, MemberDailySnapshot
+
+
+def close_chunk(run, upper):
+    """
+    Snapshot members with ids in (run.last_member_id, upper], subtract the snapshotted income from
+    today_income and move the cursor, all in one transaction so an interrupted close resumes cleanly.
+    Income paid concurrently after the snapshot stays in today_income for the next business date.
+    """
+    member_table = Member._meta.db_table
+    snapshot_table = MemberDailySnapshot._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {snapshot_table}
+                    (member_id, business_date, income, total_income, account_balance, wallet_balance)
+                SELECT id, %s, today_income, total_income, account_balance, wallet_balance
+                FROM {member_table}
+                WHERE id > %s AND id <= %s
+                """,
+                [run.business_date, run.last_member_id, upper],
+            )
+            closed = cursor.rowcount
+
+        snapshot_income = MemberDailySnapshot.objects.filter(
+            member=OuterRef('pk'), business_date=run.business_date
+        ).values('income')[:1]
+        reset = Member.objects.filter(pk__gt=run.last_member_id, pk__lte=upper).exclude(today_income=0)
+        invalidate_dashboards(reset.values_list('user_id', flat=True))
+        reset.update(today_income=F('today_income') - Subquery(snapshot_income))
+
+        DailyClose.objects.filter(pk=run.pk).update(
+            last_member_id=upper, members_closed=F('members_closed') + closed
+        )
+        run.last_member_id = upper
+        run.members_closed += closed
+    return closed
+
+
+class Command(BaseCommand):
+    help = (
+        "Close a business date: pay queued commissions up to the cutoff, snapshot every member's income "
+        "and balances and reset today_income, in keyset-paginated chunks. Re-running resumes an "
+        "interrupted close."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help="Business date (YYYY-MM-DD); defaults to yesterday, the day that ended last.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--skip-commissions', action='store_true',
+                            help="Close without draining the commission queue first.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        # The close runs after midnight, so the day being closed is the previous local date.
+        business_date = options['date'] or timezone.localdate() - timedelta(days=1)
+
+        run, created = DailyClose.objects.get_or_create(
+            business_date=business_date, defaults={'payout_cutoff': timezone.now()}
+        )
+        if run.status == 'done':
+            raise CommandError(f"{business_date} was already closed at {run.finished_at}.")
+        if not created:
+            self.stdout.write(f"Resuming the close of {business_date} after member {run.last_member_id}.")
+
+        if not options['skip_commissions'] and run.last_member_id == 0:
+            self.drain_commissions()
+
+        chunk_size = options['chunk_size']
+        while True:
+            ids = Member.objects.filter(pk__gt=run.last_member_id).order_by('pk').values_list('pk', flat=True)
+            upper = ids[chunk_size - 1:chunk_size].first() or ids.last()
+            if upper is None:
+                break
+            close_chunk(run, upper)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"  closed members up to {upper}")
+
+        run.status = 'done'
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'finished_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed {business_date}: {run.members_closed} members in {time.perf_counter() - started:.2f}s."
+        ))
+
+    def drain_commissions(self):
+        worker = CommissionWorker(stdout=self.stdout, stderr=self.stderr)
+        processed = 0
+        while True:
+            count = worker.process_batch(1000, max_attempts=5)
+            if not count:
+                break
+            processed += count
+        self.stdout.write(f"Paid {processed} queued commission jobs before the cutoff.")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mlm_app import dashboard_cache
+
+
+class Command(BaseCommand):
+    help = "Report hits and misses of the dashboard summary cache since the counters were last reset."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after reporting them.")
+
+    def handle(self, *args, **options):
+        if not dashboard_cache.cache_is_shared():
+            raise CommandError("The default cache is process-local, so there are no counters to report from here.")
+        counts = dashboard_cache.stats()
+        lookups = counts['hits'] + counts['misses']
+        ratio = counts['hits'] / lookups if lookups else 0
+        self.stdout.write(
+            f"Dashboard cache: {counts['hits']} hits, {counts['misses']} misses ({ratio:.1%} hit rate)."
+        )
+        if options['reset']:
+            dashboard_cache.reset_stats()
+            self.stdout.write("Counters reset.")
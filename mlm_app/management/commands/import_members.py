@@ -0,0 +1,260 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from mlm_app.dashboard_cache import invalidate_dashboards
+from mlm_app.ewe_functions import GENERATED_USERNAME, generate_usernames
+from mlm_app.management.commands.process_commission_jobs import Command as CommissionWorker
+from mlm_app.management.commands.rebuild_team_counts import COUNT_FIELDS, compute_team_counts
+from mlm_app.models import CommissionJob, Member, MemberPlan, Plan
+from mlm_app.sequences import usernames as username_sequence
+
+TREE_FIELDS = ['left', 'right', 'left_extreme', 'right_extreme']
+
+
+class TreeNode:
+    """In-memory copy of the placement fields of one member."""
+    __slots__ = ['pk', 'user_id', 'left_id', 'right_id', 'left_extreme_id', 'right_extreme_id',
+                 'tree_path', 'tree_depth', 'status', 'counts', 'changed', 'loaded']
+
+    def __init__(self, pk, user_id, left_id, right_id, left_extreme_id, right_extreme_id,
+                 tree_path, tree_depth, status, counts=None):
+        self.pk = pk
+        self.user_id = user_id
+        self.left_id = left_id
+        self.right_id = right_id
+        self.left_extreme_id = left_extreme_id
+        self.right_extreme_id = right_extreme_id
+        self.tree_path = tree_path
+        self.tree_depth = tree_depth
+        self.status = status
+        self.counts = counts or (0,) * len(COUNT_FIELDS)
+        self.changed = False
+        # TREE_FIELDS as read from the database, to detect placements made since.
+        self.loaded = self.tree_fields()
+
+    def tree_fields(self):
+        return (self.left_id, self.right_id, self.left_extreme_id, self.right_extreme_id)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import members from a CSV or JSONL file (username, first_name, last_name, email, mobile_no, "
+        "sponsor, leg, plan, password). Placement is computed in memory, rows are written with "
+        "bulk_create without the per-row signals, and commissions are paid in one pass afterwards. "
+        "The members whose slots or leg pointers the import fills are locked before they are written, "
+        "and the import stops if a registration moved them after the network was read; team counts "
+        "of existing members are written as increments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-commissions', action='store_true',
+                            help="Leave the commission jobs queued for process_commission_jobs.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = self.read_rows(options['path'], options['format'])
+        if not rows:
+            raise CommandError("No rows to import.")
+        self.validate(rows)
+
+        plans = {}
+        for plan in Plan.objects.all():
+            plans[str(plan.pk)] = plan
+            plans[plan.name.lower()] = plan
+
+        with transaction.atomic():
+            jobs = self.import_rows(rows, plans, options['batch_size'])
+        imported = time.perf_counter()
+        self.stdout.write(
+            f"Imported {len(rows)} members in {imported - started:.2f}s "
+            f"({len(rows) / max(imported - started, 1e-9):.0f} rows/s)."
+        )
+
+        if options['skip_commissions'] or not jobs:
+            return
+
+        worker = CommissionWorker(stdout=self.stdout, stderr=self.stderr)
+        worker.process_batch(len(jobs), max_attempts=5, job_ids=[job.pk for job in jobs])
+        finished = time.perf_counter()
+        self.stdout.write(self.style.SUCCESS(
+            f"Paid commissions for {len(jobs)} activations in {finished - imported:.2f}s; "
+            f"total {len(rows) / max(finished - started, 1e-9):.0f} rows/s."
+        ))
+
+    def read_rows(self, path, file_format):
+        path = Path(path)
+        file_format = file_format or ('jsonl' if path.suffix.lower() in ('.jsonl', '.json') else 'csv')
+        with path.open(newline='', encoding='utf-8') as handle:
+            if file_format == 'jsonl':
+                return [json.loads(line) for line in handle if line.strip()]
+            return list(csv.DictReader(handle))
+
+    def validate(self, rows):
+        usernames = [row.get('username') for row in rows if row.get('username')]
+        mobiles = [row.get('mobile_no') for row in rows if row.get('mobile_no')]
+        if len(set(usernames)) != len(usernames):
+            raise CommandError("Duplicate usernames in the import file.")
+        if len(set(mobiles)) != len(mobiles):
+            raise CommandError("Duplicate mobile numbers in the import file.")
+
+        existing = self.find_existing(User.objects, 'username', usernames)
+        if existing:
+            raise CommandError(f"Usernames already registered: {', '.join(sorted(existing)[:10])}")
+        existing = self.find_existing(Member.objects, 'mobile_no', mobiles)
+        if existing:
+            raise CommandError(f"Mobile numbers already registered: {', '.join(sorted(existing)[:10])}")
+
+        for number, row in enumerate(rows, start=1):
+            if row.get('sponsor') and (row.get('leg') or 'Left').capitalize() not in dict(Member.POSITION_CHOICES):
+                raise CommandError(f"Row {number}: leg must be 'Left' or 'Right'.")
+
+    def find_existing(self, queryset, field, values, chunk_size=1000):
+        existing = set()
+        for start in range(0, len(values), chunk_size):
+            existing.update(queryset.filter(**{f'{field}__in': values[start:start + chunk_size]}).values_list(field, flat=True))
+        return existing
+
+    def load_tree(self):
+        """Load the placement fields of the whole network, keyed by user id and by path."""
+        nodes = {}
+        for values in Member.objects.order_by().values_list(
+            'pk', 'user_id', 'left_id', 'right_id', 'left_extreme_id', 'right_extreme_id',
+            'tree_path', 'tree_depth', 'status', *COUNT_FIELDS
+        ).iterator(chunk_size=10000):
+            nodes[values[1]] = TreeNode(*values[:9], counts=tuple(values[9:]))
+        return nodes, {node.tree_path: node for node in nodes.values()}
+
+    def place(self, nodes, paths, sponsor, node, position):
+        """Spillover placement on the in-memory tree, mirroring Member.place_member."""
+        direction = position.lower()
+        leg = position[0]
+        chain_top = paths[sponsor.tree_path.rstrip(leg)]
+        target = nodes[getattr(chain_top, f'{direction}_extreme_id') or chain_top.user_id]
+
+        setattr(target, f'{direction}_id', node.user_id)
+        target.changed = True
+        setattr(chain_top, f'{direction}_extreme_id', node.user_id)
+        chain_top.changed = True
+
+        node.tree_path = target.tree_path + leg
+        node.tree_depth = target.tree_depth + 1
+        paths[node.tree_path] = node
+        return target.user_id
+
+    def lock_placed(self, placed):
+        """Lock the existing members in ``placed`` and check that nobody placed below them since load_tree."""
+        stored = Member.objects.select_for_update().filter(pk__in=[node.pk for node in placed]).order_by('pk')
+        fields = [f'{field}_id' for field in TREE_FIELDS]
+        current = {values[0]: values[1:] for values in stored.values_list('pk', *fields)}
+        moved = [node.user_id for node in placed if current.get(node.pk) != node.loaded]
+        if moved:
+            raise CommandError(
+                f"Members were placed under {len(moved)} of the import's placement targets while it ran; "
+                "nothing was imported. Run the import again."
+            )
+
+    def import_rows(self, rows, plans, batch_size):
+        # Imported usernames may come from the generated range; move the sequence past them first.
+        matches = (GENERATED_USERNAME.fullmatch(row.get('username') or '') for row in rows)
+        generated = [int(match[1]) for match in matches if match]
+        if generated:
+            username_sequence.advance(max(generated) + 1)
+
+        generated_usernames = iter(generate_usernames(sum(1 for row in rows if not row.get('username'))))
+        users = []
+        for row in rows:
+            user = User(
+                username=row.get('username') or next(generated_usernames),
+                first_name=row.get('first_name', ''),
+                last_name=row.get('last_name', ''),
+                email=row.get('email', ''),
+            )
+            if row.get('password'):
+                user.set_password(row['password'])
+            else:
+                user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=batch_size)
+
+        nodes, paths = self.load_tree()
+        usernames = {user.username: user.pk for user in users}
+        sponsor_names = {row['sponsor'] for row in rows if row.get('sponsor')} - set(usernames)
+        usernames.update(User.objects.filter(username__in=sponsor_names).values_list('username', 'pk'))
+
+        members = []
+        member_plans = []
+        for row, user in zip(rows, users):
+            plan = plans.get(str(row.get('plan') or '').lower())
+            if row.get('plan') and plan is None:
+                raise CommandError(f"Unknown plan '{row['plan']}' for {user.username}.")
+
+            node = TreeNode(None, user.pk, None, None, None, None, f"{user.pk}/", 0,
+                            'Active' if plan else 'Inactive')
+            nodes[user.pk] = node
+            paths[node.tree_path] = node
+
+            member = Member(user=user, mobile_no=row.get('mobile_no') or None, status=node.status)
+            sponsor_id = usernames.get(row.get('sponsor')) if row.get('sponsor') else None
+            if row.get('sponsor'):
+                if sponsor_id not in nodes:
+                    raise CommandError(f"Unknown sponsor '{row['sponsor']}' for {user.username}.")
+                position = (row.get('leg') or 'Left').capitalize()
+                member.sponsor_id = sponsor_id
+                member.position = position
+                member.head_member_id = self.place(nodes, paths, nodes[sponsor_id], node, position)
+            members.append(member)
+            if plan:
+                member_plans.append((member, plan))
+
+        counts, _ = compute_team_counts(
+            (node.user_id, node.left_id, node.right_id, node.status) for node in nodes.values()
+        )
+        for member in members:
+            node = nodes[member.user_id]
+            member.left_id, member.right_id = node.left_id, node.right_id
+            member.left_extreme_id, member.right_extreme_id = node.left_extreme_id, node.right_extreme_id
+            member.tree_path, member.tree_depth = node.tree_path, node.tree_depth
+            for field, value in zip(COUNT_FIELDS, counts[member.user_id]):
+                setattr(member, field, value)
+        Member.objects.bulk_create(members, batch_size=batch_size)
+
+        # Existing members whose slots or leg pointers moved, locked like place_member locks its target.
+        imported_ids = {user.pk for user in users}
+        placed = [node for node in nodes.values() if node.changed and node.user_id not in imported_ids]
+        self.lock_placed(placed)
+        updated = []
+        for node in placed:
+            member = Member(pk=node.pk, user_id=node.user_id)
+            member.left_id, member.right_id = node.left_id, node.right_id
+            member.left_extreme_id, member.right_extreme_id = node.left_extreme_id, node.right_extreme_id
+            updated.append(member)
+        Member.objects.bulk_update(updated, TREE_FIELDS, batch_size=batch_size)
+
+        # Team counts grow by the imported members only, so counts changed since the read are kept.
+        counted = []
+        for node in nodes.values():
+            if node.user_id in imported_ids or counts[node.user_id] == node.counts:
+                continue
+            member = Member(pk=node.pk, user_id=node.user_id)
+            for field, new, old in zip(COUNT_FIELDS, counts[node.user_id], node.counts):
+                setattr(member, field, F(field) + (new - old))
+            counted.append(member)
+        Member.objects.bulk_update(counted, COUNT_FIELDS, batch_size=batch_size)
+        invalidate_dashboards({member.user_id for member in updated + counted})
+
+        plan_rows = MemberPlan.objects.bulk_create(
+            [MemberPlan(member=member, plan=plan) for member, plan in member_plans], batch_size=batch_size
+        )
+        return CommissionJob.objects.bulk_create(
+            [CommissionJob(member_plan=member_plan) for member_plan in plan_rows], batch_size=batch_size
+        )
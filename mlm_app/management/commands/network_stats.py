@@ -0,0 +1,49 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Load the whole binary network into memory and report subtree, depth, pair and rank statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Number of members to list per ranking.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            from mlm_app.network import Network
+        except ImportError as e:
+            raise CommandError(f"network_stats requires NumPy: {e}")
+
+        started = time.perf_counter()
+        network = Network.load()
+        loaded = time.perf_counter()
+
+        report = network.summary()
+        usernames = dict(User.objects.filter(
+            id__in=[user_id for values in (network.pairs, network.subtree_total, network.imbalance)
+                    for user_id, _ in network.top(values, options['top'])]
+        ).values_list('id', 'username'))
+        report['top_pairs'] = [(usernames.get(u, u), v) for u, v in network.top(network.pairs, options['top'])]
+        report['top_teams'] = [(usernames.get(u, u), v) for u, v in network.top(network.subtree_total, options['top'])]
+        report['top_imbalance'] = [(usernames.get(u, u), v) for u, v in network.top(network.imbalance, options['top'])]
+        report['load_seconds'] = round(loaded - started, 3)
+        report['compute_seconds'] = round(time.perf_counter() - loaded, 3)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Members: {report['members']} ({report['active_members']} active, {report['roots']} roots)")
+        self.stdout.write(f"Depth: max {report['max_depth']}, mean {report['mean_depth']:.2f}")
+        self.stdout.write(f"Matching pairs: {report['total_pairs']} across {report['members_with_pairs']} members")
+        self.stdout.write(f"Mean leg imbalance: {report['mean_imbalance']:.2f}")
+        self.stdout.write(f"Rank distribution: {report['rank_distribution']}")
+        for title, key in (("Most pairs", 'top_pairs'), ("Largest teams", 'top_teams'), ("Most imbalanced", 'top_imbalance')):
+            self.stdout.write(f"{title}: " + ", ".join(f"{username} ({value})" for username, value in report[key]))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded in {report['load_seconds']}s, computed in {report['compute_seconds']}s."
+        ))
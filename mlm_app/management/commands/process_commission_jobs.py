@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from mlm_app.models import CommissionJob
+from mlm_app.payouts import pay_activation_commissions
+
+
+class Command(BaseCommand):
+    help = "Drain pending commission jobs in batches, paying direct, level and matching commissions with one upline traversal per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            count = self.process_batch(options['batch_size'], options['max_attempts'])
+            processed += count
+            if count:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} commission jobs."))
+
+    def process_batch(self, batch_size, max_attempts, job_ids=None):
+        """
+        Claim a batch of pending jobs and pay them in one transaction. Returns the number handled.
+        ``job_ids`` restricts the batch to those jobs instead of the oldest pending ones.
+        """
+        jobs = []
+        try:
+            with transaction.atomic():
+                pending = CommissionJob.objects.select_for_update(skip_locked=True).filter(status='pending')
+                if job_ids is not None:
+                    pending = pending.filter(pk__in=job_ids)
+                jobs = list(pending.select_related('member_plan').order_by('id')[:batch_size])
+                if not jobs:
+                    return 0
+
+                pay_activation_commissions([job.member_plan for job in jobs])
+
+                CommissionJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status='done', attempts=F('attempts') + 1, last_error='', processed_at=timezone.now()
+                )
+                return len(jobs)
+        except Exception as e:
+            self.stderr.write(f"Commission batch failed: {e}")
+            if not jobs:
+                raise
+            if len(jobs) == 1:
+                self.record_failure(jobs, e, max_attempts)
+            else:
+                # Retry one by one so a single bad job cannot block the rest of the batch.
+                for job in jobs:
+                    self.process_single(job.pk, max_attempts)
+            return len(jobs)
+
+    def process_single(self, job_pk, max_attempts):
+        try:
+            with transaction.atomic():
+                job = CommissionJob.objects.select_for_update(skip_locked=True).select_related('member_plan').filter(
+                    pk=job_pk, status='pending'
+                ).first()
+                if job is None:
+                    return
+                pay_activation_commissions([job.member_plan])
+                job.status = 'done'
+                job.attempts += 1
+                job.last_error = ''
+                job.processed_at = timezone.now()
+                job.save(update_fields=['status', 'attempts', 'last_error', 'processed_at'])
+        except Exception as e:
+            self.record_failure([CommissionJob(pk=job_pk)], e, max_attempts)
+
+    def record_failure(self, jobs, error, max_attempts):
+        with transaction.atomic():
+            for job in CommissionJob.objects.select_for_update().filter(pk__in=[job.pk for job in jobs]):
+                job.attempts += 1
+                job.last_error = str(error)
+                if job.attempts >= max_attempts:
+                    job.status = 'failed'
+                job.save(update_fields=['attempts', 'last_error', 'status'])
@@ -0,0 +1,74 @@
+import time
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from mlm_app import models
+
+
+def rebuild_income_rollups(IncomeHistory, IncomeDailyRollup, NetworkDailyIncome, since=None, batch_size=1000):
+    """
+    Recompute the daily income rollups from IncomeHistory, for every day or from ``since`` on.
+    Takes the model classes so migrations can pass their historical versions. Returns the number of
+    member rollup rows written.
+    """
+    history = IncomeHistory.objects.all()
+    member_rollups = IncomeDailyRollup.objects.all()
+    network_rollups = NetworkDailyIncome.objects.all()
+    if since:
+        history = history.filter(created_at__gte=timezone.make_aware(datetime.combine(since, datetime.min.time())))
+        member_rollups = member_rollups.filter(day__gte=since)
+        network_rollups = network_rollups.filter(day__gte=since)
+
+    written = 0
+    with transaction.atomic():
+        member_rollups.delete()
+        network_rollups.delete()
+
+        batch = []
+        for row in history.annotate(day=TruncDate('created_at')).order_by().values(
+            'member_id', 'day', 'income_type'
+        ).annotate(total=Sum('amount'), count=Count('id')).iterator(chunk_size=5000):
+            batch.append(IncomeDailyRollup(
+                member_id=row['member_id'], day=row['day'], income_type=row['income_type'],
+                amount=row['total'], entries=row['count'],
+            ))
+            if len(batch) >= batch_size:
+                IncomeDailyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        IncomeDailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+
+        NetworkDailyIncome.objects.bulk_create([
+            NetworkDailyIncome(day=row['day'], income_type=row['income_type'], amount=row['total'], entries=row['count'])
+            for row in IncomeDailyRollup.objects.filter(day__gte=since or date.min).order_by().values(
+                'day', 'income_type'
+            ).annotate(total=Sum('amount'), count=Sum('entries'))
+        ], batch_size=batch_size)
+    return written
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-member and network daily income rollups from IncomeHistory. Rollups are kept "
+        "up to date as income is recorded; this repairs them after direct edits to the history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help="Only rebuild days from this date (YYYY-MM-DD).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_income_rollups(
+            models.IncomeHistory, models.IncomeDailyRollup, models.NetworkDailyIncome,
+            options['since'], options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} member daily rollups in {time.perf_counter() - started:.2f}s."
+        ))
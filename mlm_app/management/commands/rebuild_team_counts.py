@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mlm_app.dashboard_cache import invalidate_dashboards
+from mlm_app.models import Member
+
+COUNT_FIELDS = [
+    'left_active_count', 'left_inactive_count', 'left_total_count',
+    'right_active_count', 'right_inactive_count', 'right_total_count',
+]
+
+
+def compute_team_counts(rows, known_subtrees=None):
+    """
+    Compute left/right team counters for every member from (user_id, left_id, right_id, status) rows.
+    ``known_subtrees`` optionally maps user ids outside ``rows`` to their (active, inactive, total)
+    subtree totals, so a partial tree can be finished from subtrees computed elsewhere.
+    Returns a dict mapping user_id to a tuple ordered like COUNT_FIELDS, plus the subtree totals.
+    """
+    nodes = {user_id: (left_id, right_id, status) for user_id, left_id, right_id, status in rows}
+    # Subtree totals per user_id as (active, inactive, total), including the member itself.
+    subtree = dict(known_subtrees or {})
+    counts = {}
+
+    for root in nodes:
+        if root in subtree:
+            continue
+        stack = [(root, False)]
+        while stack:
+            user_id, expanded = stack.pop()
+            if user_id in subtree:
+                continue
+            left_id, right_id, status = nodes[user_id]
+            children = [child for child in (left_id, right_id) if child in nodes and child not in subtree]
+            if not expanded and children:
+                stack.append((user_id, True))
+                stack.extend((child, False) for child in children)
+                continue
+
+            left = subtree.get(left_id, (0, 0, 0))
+            right = subtree.get(right_id, (0, 0, 0))
+            counts[user_id] = left + right
+            is_active = 1 if status == 'Active' else 0
+            subtree[user_id] = (
+                left[0] + right[0] + is_active,
+                left[1] + right[1] + (1 - is_active),
+                left[2] + right[2] + 1,
+            )
+
+    return counts, subtree
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized left/right team counters for every member from the binary tree."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = Member.objects.values_list('user_id', 'left_id', 'right_id', 'status').iterator(chunk_size=5000)
+        counts, _ = compute_team_counts(rows)
+
+        batch = []
+        updated = 0
+        with transaction.atomic():
+            for member in Member.objects.only('id', 'user_id', *COUNT_FIELDS).iterator(chunk_size=5000):
+                values = counts.get(member.user_id, (0,) * len(COUNT_FIELDS))
+                if tuple(getattr(member, field) for field in COUNT_FIELDS) == values:
+                    continue
+                for field, value in zip(COUNT_FIELDS, values):
+                    setattr(member, field, value)
+                batch.append(member)
+                if len(batch) >= options['batch_size']:
+                    Member.objects.bulk_update(batch, COUNT_FIELDS)
+                    invalidate_dashboards(member.user_id for member in batch)
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                Member.objects.bulk_update(batch, COUNT_FIELDS)
+                invalidate_dashboards(member.user_id for member in batch)
+                updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt team counts: {updated} of {len(counts)} members updated."))
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mlm_app.models import Member
+
+
+def compute_tree_paths(rows):
+    """
+    Compute the materialized path and depth of every member from (user_id, left_id, right_id) rows.
+    Returns a dict mapping user_id to a (tree_path, tree_depth) tuple.
+    """
+    nodes = {user_id: (left_id, right_id) for user_id, left_id, right_id in rows}
+    children = {child for left_id, right_id in nodes.values() for child in (left_id, right_id) if child}
+    paths = {}
+
+    for root in nodes:
+        if root in children:
+            continue
+        stack = [(root, f"{root}/", 0)]
+        while stack:
+            user_id, tree_path, tree_depth = stack.pop()
+            if user_id not in nodes or user_id in paths:
+                continue
+            paths[user_id] = (tree_path, tree_depth)
+            left_id, right_id = nodes[user_id]
+            if left_id:
+                stack.append((left_id, tree_path + 'L', tree_depth + 1))
+            if right_id:
+                stack.append((right_id, tree_path + 'R', tree_depth + 1))
+
+    return paths
+
+
+def compute_leg_extremes(rows):
+    """
+    Compute the outermost left and right member from (user_id, left_id, right_id) rows. Pointers are only
+    kept on the top of each chain, so a member's left pointer is None when it is its head's left child.
+    Returns a dict mapping user_id to a (left_extreme_id, right_extreme_id) tuple; otherwise None means
+    the slot is free.
+    """
+    nodes = {user_id: (left_id, right_id) for user_id, left_id, right_id in rows}
+    extremes = {}
+
+    for side in (0, 1):
+        children = {values[side] for values in nodes.values() if values[side]}
+        resolved = {}
+        for start in nodes:
+            chain = []
+            user_id = start
+            while user_id not in resolved:
+                child = nodes[user_id][side] if user_id in nodes else None
+                if child is None or child not in nodes:
+                    resolved[user_id] = user_id
+                    break
+                chain.append(user_id)
+                user_id = child
+            end = resolved[user_id]
+            for user_id in chain:
+                resolved[user_id] = end
+        for user_id in nodes:
+            top = user_id not in children and resolved[user_id] != user_id
+            extremes.setdefault(user_id, [None, None])[side] = resolved[user_id] if top else None
+
+    return {user_id: tuple(values) for user_id, values in extremes.items()}
+
+
+INDEX_FIELDS = ['tree_path', 'tree_depth', 'left_extreme_id', 'right_extreme_id']
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized tree path, depth and leg-extreme pointers of every member from the binary tree."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = list(Member.objects.values_list('user_id', 'left_id', 'right_id').iterator(chunk_size=5000))
+        paths = compute_tree_paths(rows)
+        extremes = compute_leg_extremes(rows)
+
+        batch = []
+        updated = 0
+        with transaction.atomic():
+            for member in Member.objects.only('id', 'user_id', *INDEX_FIELDS).iterator(chunk_size=5000):
+                values = paths.get(member.user_id, (f"{member.user_id}/", 0)) + extremes.get(member.user_id, (None, None))
+                if tuple(getattr(member, field) for field in INDEX_FIELDS) == values:
+                    continue
+                for field, value in zip(INDEX_FIELDS, values):
+                    setattr(member, field, value)
+                batch.append(member)
+                if len(batch) >= options['batch_size']:
+                    Member.objects.bulk_update(batch, INDEX_FIELDS)
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                Member.objects.bulk_update(batch, INDEX_FIELDS)
+                updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tree index: {updated} of {len(paths)} members updated."))
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, F
+
+from mlm_app.dashboard_cache import invalidate_dashboards
+from mlm_app.management.commands.rebuild_team_counts import COUNT_FIELDS, compute_team_counts
+from mlm_app.models import Member, rank_ladder
+
+PAIR_FIELDS = ['all_matching_pairs', 'matching_pairs', 'rank_no']
+RECOMPUTED_FIELDS = COUNT_FIELDS + PAIR_FIELDS
+
+
+def load_rows(queryset):
+    """Fetch everything the recompute needs for the members in ``queryset`` in one query."""
+    return list(queryset.order_by().values_list(
+        'pk', 'user_id', 'left_id', 'right_id', 'status', *RECOMPUTED_FIELDS
+    ).iterator(chunk_size=5000))
+
+
+def recompute_rows(rows, ladder, known_subtrees=None):
+    """
+    Recompute team counts and rank for ``rows`` (as returned by load_rows).
+    all_matching_pairs records the pairs already paid, which depends on payout history and not on
+    the tree, so the stored value is kept: pairs the recomputed counts add stay unpaid until the
+    matching engine reaches them. Ranks are replayed one pair at a time from rank 0 up to it.
+    Returns the changed rows as (pk, stored values, new values) plus the subtree totals.
+    """
+    counts, subtree = compute_team_counts(
+        [(row[1], row[2], row[3], row[4]) for row in rows], known_subtrees
+    )
+
+    changes = []
+    for row in rows:
+        pk, user_id = row[:2]
+        stored = tuple(row[5:])
+        team_counts = counts[user_id]
+
+        all_matching_pairs = stored[len(COUNT_FIELDS)]
+        rank_no, matching_pairs = ladder.advance(0, 0, all_matching_pairs)
+
+        values = team_counts + (all_matching_pairs, matching_pairs, rank_no)
+        if values != stored:
+            changes.append((pk, stored, values))
+
+    return changes, subtree
+
+
+def close_connections():
+    # Forked workers must open their own database connections.
+    connections.close_all()
+
+
+def recompute_subtrees(frontier_pks, ladder):
+    """Process pool task: recompute the subtrees rooted at ``frontier_pks`` and return their totals."""
+    changes = []
+    totals = {}
+    for root in Member.objects.filter(pk__in=frontier_pks):
+        rows = load_rows(Member.objects.filter(pk=root.pk) | root.get_descendants())
+        subtree_changes, subtree = recompute_rows(rows, ladder)
+        changes.extend(subtree_changes)
+        totals[root.user_id] = subtree[root.user_id]
+    return changes, totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute team counts and ranks for the entire network bottom-up, splitting independent "
+        "subtrees across a process pool, and report the differences with stored values. Paid matching "
+        "pairs are kept as stored; income is not paid or reversed. Safe to run on a live network: "
+        "members are locked with SELECT ... FOR UPDATE while their batch is written, team counts are "
+        "corrected by the difference found (so members placed or activated since they were read are "
+        "kept) and ranks are recomputed from the paid pairs read under the lock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report differences without writing them.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        workers = max(1, options['workers'])
+        ladder = rank_ladder()
+
+        changes, members = self.recompute(workers, ladder)
+
+        diff = Counter()
+        for pk, stored, values in changes:
+            for field, old, new in zip(RECOMPUTED_FIELDS, stored, values):
+                if old != new:
+                    diff[field] += 1
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f"  member {pk}: {field} {old} -> {new}")
+
+        self.stdout.write(f"Recomputed {members} members; {len(changes)} differ from stored values.")
+        for field in RECOMPUTED_FIELDS:
+            if diff[field]:
+                self.stdout.write(f"  {field}: {diff[field]} changed")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+            return
+
+        self.write_changes(changes, options['batch_size'], ladder)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(changes)} members in {time.perf_counter() - started:.2f}s."
+        ))
+
+    def recompute(self, workers, ladder):
+        """Recompute the subtrees below a split depth in parallel, then finish the top of the tree."""
+        split_depth = self.choose_split_depth(workers)
+        if split_depth is None:
+            rows = load_rows(Member.objects.all())
+            changes, _ = recompute_rows(rows, ladder)
+            return changes, len(rows)
+
+        frontier = list(Member.objects.filter(tree_depth=split_depth).values_list('pk', flat=True))
+        tasks = [frontier[i::workers * 4] for i in range(min(len(frontier), workers * 4))]
+
+        changes = []
+        known_subtrees = {}
+        close_connections()
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('fork'), initializer=close_connections
+        )
+        with pool:
+            for task_changes, totals in pool.map(recompute_subtrees, tasks, [ladder] * len(tasks)):
+                changes.extend(task_changes)
+                known_subtrees.update(totals)
+
+        top_rows = load_rows(Member.objects.filter(tree_depth__lt=split_depth))
+        top_changes, _ = recompute_rows(top_rows, ladder, known_subtrees)
+        changes.extend(top_changes)
+
+        members = Member.objects.count()
+        return changes, members
+
+    def choose_split_depth(self, workers):
+        """Pick the shallowest depth wide enough to keep every worker busy, or None to run inline."""
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return None
+        widths = Member.objects.order_by('tree_depth').values_list('tree_depth').annotate(width=Count('pk'))
+        widest = None
+        for depth, width in widths:
+            if depth == 0:
+                continue
+            if width >= workers * 4:
+                return depth
+            if widest is None or width > widest[1]:
+                widest = (depth, width)
+        return widest[0] if widest and widest[1] > 1 else None
+
+    def write_changes(self, changes, batch_size, ladder):
+        """
+        Apply ``changes`` under row locks: counters move by new - stored, which keeps updates made
+        after the recompute read them, and ranks follow the locked all_matching_pairs.
+        """
+        for start in range(0, len(changes), batch_size):
+            chunk = changes[start:start + batch_size]
+            with transaction.atomic():
+                paid = dict(Member.objects.select_for_update().filter(
+                    pk__in=[pk for pk, _, _ in chunk]
+                ).order_by('pk').values_list('pk', 'all_matching_pairs'))
+                batch = []
+                for pk, stored, values in chunk:
+                    if pk not in paid:
+                        continue
+                    member = Member(pk=pk)
+                    for field, old, new in zip(COUNT_FIELDS, stored, values):
+                        setattr(member, field, F(field) + (new - old))
+                    member.rank_no, member.matching_pairs = ladder.advance(0, 0, paid[pk])
+                    batch.append(member)
+                Member.objects.bulk_update(batch, COUNT_FIELDS + ['matching_pairs', 'rank_no'])
+                invalidate_dashboards(Member.objects.filter(pk__in=paid).values_list('user_id', flat=True))
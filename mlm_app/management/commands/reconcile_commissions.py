@@ -0,0 +1,138 @@
+import json
+import time
+import zlib
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min, Sum
+
+from mlm_app.models import CommissionJob, IncomeHistory, Member, ReconciliationCheckpoint, invalidate_member_dashboards
+from mlm_app.payouts import MATCHING_UPDATE_FIELDS, Payout
+from mlm_app.simulator import INCOME_TYPES, NetworkSnapshot, Replay, from_paise, load_config, to_paise
+
+CHECKPOINTS_KEPT = 3
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the MemberPlan activation stream with the payout rules, compare the expected income and "
+        "matching pairs of every member with IncomeHistory and the Member counters, and optionally pay "
+        "the shortfalls. Replay state is checkpointed, so each run only streams new activations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', nargs='+', choices=INCOME_TYPES, default=['matching_income'],
+                            help="Income types to reconcile. Direct and level income were not paid before "
+                                 "the payout engine existed, so they are opt-in.")
+        parser.add_argument('--apply', action='store_true', help="Pay shortfalls and correct matching pairs; refused while any member is overpaid.")
+        parser.add_argument('--full', action='store_true', help="Ignore checkpoints and replay all history.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        types = options['types']
+
+        # Activations whose commission job has not run yet are left for the next run.
+        boundary = CommissionJob.objects.filter(status='pending').aggregate(first=Min('member_plan_id'))['first']
+
+        snapshot = NetworkSnapshot.load(historical=True)
+        plans, ladder = load_config()
+        checkpoint = None if options['full'] else ReconciliationCheckpoint.objects.first()
+        if checkpoint:
+            replay = Replay.restore(snapshot, plans, ladder, json.loads(zlib.decompress(checkpoint.state)))
+            last_id, replayed = checkpoint.last_member_plan_id, checkpoint.activations_replayed
+        else:
+            replay = Replay(snapshot, plans, ladder)
+            last_id, replayed = 0, 0
+
+        for member, plan_id, member_plan_id in snapshot.history(after_id=last_id, before_id=boundary):
+            replay.activate(member, plan_id)
+            last_id = member_plan_id
+            replayed += 1
+        self.stdout.write(f"Replayed {replayed} activations up to member plan {last_id}.")
+
+        shortfalls, excesses, pair_fixes = self.compare(snapshot, replay, types)
+        for income_type in types:
+            self.stdout.write(
+                f"  {income_type}: {sum(1 for (_, t) in shortfalls if t == income_type)} members underpaid by "
+                f"{from_paise(sum(v for (_, t), v in shortfalls.items() if t == income_type))}, "
+                f"{sum(1 for (_, t) in excesses if t == income_type)} overpaid by "
+                f"{from_paise(sum(v for (_, t), v in excesses.items() if t == income_type))}"
+            )
+        if pair_fixes:
+            self.stdout.write(f"  matching pairs differ for {len(pair_fixes)} members")
+
+        if excesses:
+            self.stdout.write(self.style.WARNING("Overpayments are reported only; no clawback is made."))
+        # Overpayments mean the replay and the payout engine disagree, so the shortfalls can't be trusted either.
+        refused = options['apply'] and bool(excesses)
+        if options['apply'] and not excesses and (shortfalls or pair_fixes):
+            self.apply(shortfalls, pair_fixes)
+
+        ReconciliationCheckpoint.objects.create(
+            last_member_plan_id=last_id, activations_replayed=replayed,
+            state=zlib.compress(json.dumps(replay.export_state()).encode()),
+        )
+        stale = ReconciliationCheckpoint.objects.values_list('pk', flat=True)[CHECKPOINTS_KEPT:]
+        ReconciliationCheckpoint.objects.filter(pk__in=list(stale)).delete()
+        if refused:
+            raise CommandError(
+                f"Refusing to apply: {len(excesses)} overpayments found in this run. Investigate them "
+                "before paying shortfalls."
+            )
+        self.stdout.write(self.style.SUCCESS(f"Reconciled in {time.perf_counter() - started:.2f}s."))
+
+    def compare(self, snapshot, replay, types):
+        """Return shortfalls and excesses keyed by (member id, income type) in paise, plus pair corrections."""
+        stored = Counter()
+        for member_id, income_type, total in IncomeHistory.objects.filter(income_type__in=types).values_list(
+            'member_id', 'income_type'
+        ).annotate(total=Sum('amount')).order_by().iterator():
+            stored[member_id, income_type] = to_paise(total)
+
+        shortfalls, excesses = {}, {}
+        for income_type in types:
+            for member_id, expected in zip(snapshot.member_ids, replay.state[income_type]):
+                difference = expected - stored[member_id, income_type]
+                if difference > 0:
+                    shortfalls[member_id, income_type] = difference
+                elif difference < 0:
+                    excesses[member_id, income_type] = -difference
+
+        pair_fixes = {}
+        if 'matching_income' in types:
+            expected_pairs = {
+                member_id: values for member_id, *values in zip(
+                    snapshot.member_ids, *(replay.state[field] for field in MATCHING_UPDATE_FIELDS)
+                )
+            }
+            for member_id, *values in Member.objects.values_list('pk', *MATCHING_UPDATE_FIELDS).iterator():
+                expected = expected_pairs.get(member_id)
+                # Only pairs that were never paid are corrected; lowering the counter would pay them twice.
+                if expected and expected[0] > values[0]:
+                    pair_fixes[member_id] = (tuple(values), tuple(expected))
+        return shortfalls, excesses, pair_fixes
+
+    def apply(self, shortfalls, pair_fixes):
+        payout = Payout()
+        with transaction.atomic():
+            members = Member.objects.select_for_update().filter(pk__in=pair_fixes).only('pk', *MATCHING_UPDATE_FIELDS)
+            corrected = []
+            for member in members.order_by('pk'):
+                stored, expected = pair_fixes[member.pk]
+                if tuple(getattr(member, field) for field in MATCHING_UPDATE_FIELDS) != stored:
+                    continue  # Paid concurrently since the comparison; the next run will look again.
+                for field, value in zip(MATCHING_UPDATE_FIELDS, expected):
+                    setattr(member, field, value)
+                corrected.append(member)
+            Member.objects.bulk_update(corrected, MATCHING_UPDATE_FIELDS)
+            invalidate_member_dashboards([member.pk for member in corrected])
+
+            for (member_id, income_type), amount in shortfalls.items():
+                payout.credit(member_id, income_type, from_paise(amount), "Reconciliation of missed commissions")
+            payout.post('reconciliation', 'account_balance', 'company', "Reconciliation of missed commissions")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Paid {payout.total} to {len({member_id for member_id, _ in shortfalls})} members; "
+            f"corrected matching pairs for {len(corrected)} members."
+        ))
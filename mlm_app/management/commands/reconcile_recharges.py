@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from mlm_app.ewe_functions import check_recharge_status, recharge_client
+from mlm_app.models import RechargeTransaction
+from mlm_app.recharges import SETTLED_STATUSES, settle_recharge
+
+
+class Command(BaseCommand):
+    help = (
+        "Poll the provider for pending recharges in batches and settle the ones with a final status: "
+        "successful recharges pay their resale income, failed ones refund the held wallet amount."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--min-age', type=int, default=60,
+                            help="Seconds to wait after submission, and between checks of one order.")
+        parser.add_argument('--expire-after', type=int, default=30,
+                            help="Minutes after which an order that never reached the provider is failed and refunded.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for pending recharges.")
+        parser.add_argument('--interval', type=float, default=30.0, help="Seconds to sleep when nothing is due.")
+
+    def handle(self, *args, **options):
+        settled = checked = 0
+        while True:
+            batch_checked, batch_settled = self.process_batch(
+                options['batch_size'], timedelta(seconds=options['min_age']), timedelta(minutes=options['expire_after'])
+            )
+            checked += batch_checked
+            settled += batch_settled
+            if batch_checked:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} pending recharges; settled {settled}."))
+        if options['verbosity'] >= 2:
+            for operation, metrics in recharge_client.metrics.snapshot().items():
+                self.stdout.write(f"  {operation}: outcomes {metrics['outcomes']}, latency ms {metrics['latency_ms']}")
+
+    def process_batch(self, batch_size, min_age, expire_after):
+        """
+        Claim due pending recharges by stamping last_checked_at, then ask the provider about each one
+        outside the transaction. Returns the number checked and the number settled.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            recharges = list(
+                RechargeTransaction.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', recharge_date__lt=now - min_age)
+                .filter(Q(last_checked_at__isnull=True) | Q(last_checked_at__lt=now - min_age))
+                .order_by('recharge_date', 'id')[:batch_size]
+            )
+            RechargeTransaction.objects.filter(pk__in=[recharge.pk for recharge in recharges]).update(
+                last_checked_at=now, status_checks=F('status_checks') + 1
+            )
+
+        settled = 0
+        for recharge in recharges:
+            if recharge.submitted_at is None:
+                if recharge.recharge_date >= now - expire_after:
+                    continue  # The web request may still be submitting it.
+                response = {'status': 'failed', 'error': 'The recharge was never submitted to the provider.'}
+            else:
+                response = check_recharge_status(
+                    recharge.mobile_no, recharge.amount, recharge.company_name, recharge.order_id, recharge.is_stv
+                )
+            try:
+                if settle_recharge(recharge.pk, response).status in SETTLED_STATUSES:
+                    settled += 1
+            except Exception as e:
+                self.stderr.write(f"Could not settle recharge {recharge.order_id}: {e}")
+        return len(recharges), settled
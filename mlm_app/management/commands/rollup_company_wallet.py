@@ -0,0 +1,53 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from mlm_app.models import CompanyWallet, CompanyWalletEntry
+
+
+def rollup_company_wallet(batch_size=10000):
+    """
+    Fold ledger entries that are not rolled up yet into the CompanyWallet snapshot, flagging exactly
+    the entries that were summed. Entries are tracked individually rather than by an id watermark, so
+    entries of transactions that commit late (with ids lower than already rolled-up ones) are picked
+    up by a later run. Returns the number of entries folded in.
+    """
+    rolled_up = 0
+    while True:
+        with transaction.atomic():
+            wallet, _ = CompanyWallet.objects.select_for_update().get_or_create(id=1)
+            entries = list(
+                CompanyWalletEntry.objects.filter(rolled_up=False).order_by('id').values_list('id', 'amount')[:batch_size]
+            )
+            if not entries:
+                return rolled_up
+
+            CompanyWalletEntry.objects.filter(pk__in=[pk for pk, _ in entries]).update(rolled_up=True)
+            wallet.balance += sum((amount for _, amount in entries), Decimal('0.00'))
+            wallet.rolled_up_at = timezone.now()
+            wallet.save(update_fields=['balance', 'rolled_up_at'])
+        rolled_up += len(entries)
+        if len(entries) < batch_size:
+            return rolled_up
+
+
+class Command(BaseCommand):
+    help = "Roll up appended company wallet entries into the CompanyWallet balance snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--loop', action='store_true', help="Keep rolling up until interrupted.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            entries = rollup_company_wallet(options['batch_size'])
+            self.stdout.write(
+                f"Rolled up {entries} entries; current balance {CompanyWallet.current_balance()}."
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mlm_app.models import Plan
+from mlm_app.simulator import NetworkSnapshot, load_config, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay plan activations against an in-memory copy of the network and report what commissions "
+        "would cost, optionally for several plan/level/rank scenarios in parallel. Nothing is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, metavar='COUNT',
+                            help="Start from the current state and activate COUNT random inactive members "
+                                 "instead of replaying the MemberPlan history.")
+        parser.add_argument('--plan', help="Plan name or id for synthetic activations (defaults to the first plan).")
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--scenarios', help="JSON file with a list of {\"name\": ..., \"overrides\": {...}}.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--json', action='store_true', help="Print the reports as JSON.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        historical = options['synthetic'] is None
+        snapshot = NetworkSnapshot.load(historical=historical)
+        plans, ladder = load_config()
+
+        if historical:
+            activations = [(member, plan_id) for member, plan_id, _ in snapshot.history()]
+        else:
+            plan = self.find_plan(options['plan'])
+            activations = snapshot.synthetic_activations(options['synthetic'], plan.pk, options['seed'])
+
+        scenarios = [{'name': 'current', 'overrides': {}}]
+        if options['scenarios']:
+            with open(options['scenarios'], encoding='utf-8') as handle:
+                scenarios += json.load(handle)
+        loaded = time.perf_counter()
+
+        reports = sweep(snapshot, activations, plans, ladder, scenarios, max(1, options['workers']))
+        finished = time.perf_counter()
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2, default=str))
+            return
+
+        self.stdout.write(
+            f"{snapshot.size} members, {len(activations)} "
+            f"{'historical' if historical else 'synthetic'} activations, {len(scenarios)} scenarios."
+        )
+        for report in reports:
+            payouts = ', '.join(f"{income_type} {amount}" for income_type, amount in report['payouts'].items())
+            self.stdout.write(f"[{report['scenario']}] total {report['total_payout']} ({payouts})")
+            self.stdout.write(
+                f"  company balance {report['company_balance']} (lowest {report['lowest_company_balance']}), "
+                f"{report['members_paid']} members paid, ranks {report['rank_distribution']}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded in {loaded - started:.2f}s, simulated in {finished - loaded:.2f}s."
+        ))
+
+    def find_plan(self, value):
+        plans = Plan.objects.order_by('pk')
+        if value is None:
+            plan = plans.first()
+        elif value.isdigit():
+            plan = plans.filter(pk=int(value)).first()
+        else:
+            plan = plans.filter(name__iexact=value).first()
+        if plan is None:
+            raise CommandError("No plan to activate with.")
+        return plan
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import COUNT_FIELDS, compute_team_counts
+
+
+def backfill_team_counts(apps, schema_editor):
+    Member = apps.get_model('mlm_app', 'Member')
+    counts = compute_team_counts(Member.objects.values_list('user_id', 'left_id', 'right_id', 'status'))
+    members = list(Member.objects.only('id', 'user_id'))
+    for member in members:
+        for field, value in zip(COUNT_FIELDS, counts.get(member.user_id, (0,) * len(COUNT_FIELDS))):
+            setattr(member, field, value)
+    Member.objects.bulk_update(members, COUNT_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='left_active_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='left_inactive_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='left_total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='right_active_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='right_inactive_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='right_total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_team_counts, migrations.RunPython.noop),
+    ]
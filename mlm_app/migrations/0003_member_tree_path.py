@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import compute_tree_paths
+
+
+def backfill_tree_paths(apps, schema_editor):
+    Member = apps.get_model('mlm_app', 'Member')
+    paths = compute_tree_paths(Member.objects.values_list('user_id', 'left_id', 'right_id'))
+    members = list(Member.objects.only('id', 'user_id'))
+    for member in members:
+        member.tree_path, member.tree_depth = paths.get(member.user_id, (f"{member.user_id}/", 0))
+    Member.objects.bulk_update(members, ['tree_path', 'tree_depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0002_member_team_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='tree_depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='tree_path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['tree_path'], name='member_tree_path_idx', opclasses=['text_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
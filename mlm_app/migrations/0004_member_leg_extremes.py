@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import compute_leg_extremes
+
+
+def backfill_leg_extremes(apps, schema_editor):
+    Member = apps.get_model('mlm_app', 'Member')
+    extremes = compute_leg_extremes(Member.objects.values_list('user_id', 'left_id', 'right_id'))
+    members = list(Member.objects.only('id', 'user_id'))
+    for member in members:
+        member.left_extreme_id, member.right_extreme_id = extremes.get(member.user_id, (None, None))
+    Member.objects.bulk_update(members, ['left_extreme', 'right_extreme'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0003_member_tree_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='left_extreme',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='right_extreme',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_leg_extremes, migrations.RunPython.noop),
+    ]
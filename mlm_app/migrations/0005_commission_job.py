@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0004_member_leg_extremes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommissionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('member_plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='commission_job', to='mlm_app.memberplan')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='mlm_app_com_status_86a4f0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0005_commission_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companywallet',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='companywallet',
+            name='rolled_up_to',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CompanyWalletEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('entry_type', models.CharField(choices=[('plan_activation', 'Plan Activation'), ('matching_income', 'Matching Income'), ('recharge_share', 'Recharge Share'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Company Wallet Entry',
+                'verbose_name_plural': 'Company Wallet Entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['created_at'], name='mlm_app_com_created_3d06a0_idx')],
+            },
+        ),
+    ]
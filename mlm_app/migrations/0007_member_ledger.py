@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import opening_balance_lines
+
+
+def open_member_balances(apps, schema_editor):
+    Member = apps.get_model('mlm_app', 'Member')
+    LedgerTransaction = apps.get_model('mlm_app', 'LedgerTransaction')
+    LedgerEntry = apps.get_model('mlm_app', 'LedgerEntry')
+
+    lines = opening_balance_lines(Member.objects.order_by('pk').values_list(
+        'pk', 'account_balance', 'wallet_balance', 'direct_income', 'level_income', 'matching_income', 'resale_income'
+    ))
+    if not lines:
+        return
+    opening = LedgerTransaction.objects.create(kind='opening_balance', description='Balances before the ledger')
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(transaction=opening, member_id=member_id, account=account, amount=amount, income_type=income_type)
+        for member_id, account, amount, income_type in lines
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0006_company_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('plan_activation', 'Plan Activation'), ('matching_income', 'Matching Income'), ('recharge', 'Recharge'), ('recharge_share', 'Recharge Share'), ('opening_balance', 'Opening Balance'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=50)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='companywalletentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='company_entries', to='mlm_app.ledgertransaction'),
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('account_balance', 'Account Balance'), ('wallet_balance', 'Wallet Balance'), ('provider', 'Recharge Provider'), ('resale_pool', 'Resale Pool'), ('opening', 'Opening Balance')], max_length=20)),
+                ('income_type', models.CharField(blank=True, choices=[('direct_income', 'Direct Income'), ('level_income', 'Level Income'), ('matching_income', 'Matching Income'), ('resale_income', 'Resale Income')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='mlm_app.member')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='mlm_app.ledgertransaction')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger Entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['member', 'account'], name='mlm_app_led_member__9a5df3_idx')],
+            },
+        ),
+        migrations.RunPython(open_member_balances, migrations.RunPython.noop),
+    ]
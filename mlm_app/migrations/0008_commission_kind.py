@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0007_member_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='companywalletentry',
+            name='entry_type',
+            field=models.CharField(choices=[('plan_activation', 'Plan Activation'), ('commission', 'Commission'), ('matching_income', 'Matching Income'), ('recharge_share', 'Recharge Share'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ledgertransaction',
+            name='kind',
+            field=models.CharField(choices=[('plan_activation', 'Plan Activation'), ('commission', 'Commission'), ('matching_income', 'Matching Income'), ('recharge', 'Recharge'), ('recharge_share', 'Recharge Share'), ('opening_balance', 'Opening Balance'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
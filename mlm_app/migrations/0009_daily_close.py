@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:23
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0008_commission_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField(unique=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done')], default='running', max_length=10)),
+                ('payout_cutoff', models.DateTimeField(help_text='Commission jobs queued before this time were paid before closing.')),
+                ('last_member_id', models.BigIntegerField(default=0)),
+                ('members_closed', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-business_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MemberDailySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('income', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('total_income', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('account_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('wallet_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_snapshots', to='mlm_app.member')),
+            ],
+            options={
+                'ordering': ['-business_date'],
+                'indexes': [models.Index(fields=['business_date'], name='mlm_app_mem_busines_8f0d04_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'business_date'), name='unique_member_daily_snapshot')],
+            },
+        ),
+    ]
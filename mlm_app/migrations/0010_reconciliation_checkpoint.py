@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0009_daily_close'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_member_plan_id', models.BigIntegerField()),
+                ('activations_replayed', models.PositiveIntegerField(default=0)),
+                ('state', models.BinaryField(help_text='zlib-compressed JSON of the per-member replay state.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='ledgertransaction',
+            name='kind',
+            field=models.CharField(choices=[('plan_activation', 'Plan Activation'), ('commission', 'Commission'), ('matching_income', 'Matching Income'), ('recharge', 'Recharge'), ('recharge_share', 'Recharge Share'), ('opening_balance', 'Opening Balance'), ('reconciliation', 'Reconciliation'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
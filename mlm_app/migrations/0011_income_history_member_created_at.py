@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0010_reconciliation_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incomehistory',
+            index=models.Index(fields=['member', 'created_at'], name='mlm_app_inc_member__aa9c08_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import rebuild_income_rollups
+
+
+def build_rollups(apps, schema_editor):
+    rebuild_income_rollups(
+        apps.get_model('mlm_app', 'IncomeHistory'),
+        apps.get_model('mlm_app', 'IncomeDailyRollup'),
+        apps.get_model('mlm_app', 'NetworkDailyIncome'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0011_income_history_member_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetworkDailyIncome',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('income_type', models.CharField(choices=[('direct_income', 'Direct Income'), ('level_income', 'Level Income'), ('matching_income', 'Matching Income'), ('resale_income', 'Resale Income')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('entries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Network daily income',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'income_type'), name='unique_network_daily_income')],
+            },
+        ),
+        migrations.CreateModel(
+            name='IncomeDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('income_type', models.CharField(choices=[('direct_income', 'Direct Income'), ('level_income', 'Level Income'), ('matching_income', 'Matching Income'), ('resale_income', 'Resale Income')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_income', to='mlm_app.member')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='mlm_app_inc_day_c9189e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'day', 'income_type'), name='unique_member_daily_income')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0012_income_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['rank_no'], name='mlm_app_mem_rank_no_a99bf0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['joined_on'], name='mlm_app_mem_joined__991aad_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0013_member_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='is_stv',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='last_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='status_checks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='account',
+            field=models.CharField(choices=[('account_balance', 'Account Balance'), ('wallet_balance', 'Wallet Balance'), ('provider', 'Recharge Provider'), ('recharge_hold', 'Recharges In Progress'), ('resale_pool', 'Resale Pool'), ('opening', 'Opening Balance')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ledgertransaction',
+            name='kind',
+            field=models.CharField(choices=[('plan_activation', 'Plan Activation'), ('commission', 'Commission'), ('matching_income', 'Matching Income'), ('recharge', 'Recharge'), ('recharge_share', 'Recharge Share'), ('recharge_reserve', 'Recharge Reservation'), ('recharge_refund', 'Recharge Refund'), ('opening_balance', 'Opening Balance'), ('reconciliation', 'Reconciliation'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='rechargetransaction',
+            index=models.Index(fields=['status', 'id'], name='mlm_app_rec_status_a9d602_idx'),
+        ),
+    ]
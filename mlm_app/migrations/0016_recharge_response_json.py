@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:45
+
+import django.core.serializers.json
+from django.conf import settings
+from django.db import migrations, models
+
+from mlm_app.migrations._helpers import parse_response_text, response_columns
+
+CHUNK_SIZE = 2000
+
+
+def parse_responses(apps, schema_editor):
+    """Parse the text responses into response_json and the extracted columns, a chunk of rows at a time."""
+    RechargeTransaction = apps.get_model('mlm_app', 'RechargeTransaction')
+    last_id = 0
+    while True:
+        rows = RechargeTransaction.objects.filter(pk__gt=last_id).order_by('pk').only('pk', 'response_data')
+        chunk = list(rows[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for recharge in chunk:
+            recharge.response_json = parse_response_text(recharge.response_data)
+            for field, value in response_columns(recharge.response_json).items():
+                setattr(recharge, field, value)
+        RechargeTransaction.objects.bulk_update(chunk, ['response_json', 'provider_txn_id', 'operator_status'])
+        last_id = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0015_id_sequences'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='rechargetransaction',
+            name='mlm_app_rec_status_a9d602_idx',
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='operator_status',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='provider_txn_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        # The text holds str(dict) rather than JSON, so it cannot be cast in place.
+        migrations.AddField(
+            model_name='rechargetransaction',
+            name='response_json',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.RunPython(parse_responses, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='rechargetransaction',
+            name='response_data',
+        ),
+        migrations.RenameField(
+            model_name='rechargetransaction',
+            old_name='response_json',
+            new_name='response_data',
+        ),
+        migrations.AddIndex(
+            model_name='rechargetransaction',
+            index=models.Index(fields=['user', '-recharge_date'], name='mlm_app_rec_user_id_4a9c79_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rechargetransaction',
+            index=models.Index(fields=['status', 'recharge_date'], name='mlm_app_rec_status_606c1c_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:12
+
+from django.db import migrations
+
+from mlm_app.migrations._helpers import compute_chain_top_extremes
+
+
+def keep_chain_top_extremes(apps, schema_editor):
+    """Leg-extreme pointers are now only kept on chain tops; clear the copies below them."""
+    Member = apps.get_model('mlm_app', 'Member')
+    extremes = compute_chain_top_extremes(Member.objects.values_list('user_id', 'left_id', 'right_id'))
+    changed = []
+    for member in Member.objects.only('id', 'user_id', 'left_extreme', 'right_extreme'):
+        values = extremes.get(member.user_id, (None, None))
+        if (member.left_extreme_id, member.right_extreme_id) != values:
+            member.left_extreme_id, member.right_extreme_id = values
+            changed.append(member)
+    Member.objects.bulk_update(changed, ['left_extreme', 'right_extreme'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0016_recharge_response_json'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_chain_top_extremes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:16
+
+from django.db import migrations, models
+
+
+def flag_rolled_up_entries(apps, schema_editor):
+    """Entries up to the old rolled_up_to watermark are already included in the balance."""
+    CompanyWallet = apps.get_model('mlm_app', 'CompanyWallet')
+    CompanyWalletEntry = apps.get_model('mlm_app', 'CompanyWalletEntry')
+    wallet = CompanyWallet.objects.filter(id=1).first()
+    if wallet and wallet.rolled_up_to:
+        CompanyWalletEntry.objects.filter(id__lte=wallet.rolled_up_to).update(rolled_up=True)
+
+
+def restore_watermark(apps, schema_editor):
+    """Fold any unrolled entries below the last flagged one in, so the watermark is exact again."""
+    CompanyWallet = apps.get_model('mlm_app', 'CompanyWallet')
+    CompanyWalletEntry = apps.get_model('mlm_app', 'CompanyWalletEntry')
+    wallet = CompanyWallet.objects.filter(id=1).first()
+    upper = CompanyWalletEntry.objects.filter(rolled_up=True).aggregate(upper=models.Max('id'))['upper']
+    if wallet is None or upper is None:
+        return
+    late = CompanyWalletEntry.objects.filter(rolled_up=False, id__lt=upper).aggregate(total=models.Sum('amount'))['total']
+    wallet.balance += late or 0
+    wallet.rolled_up_to = upper
+    wallet.save(update_fields=['balance', 'rolled_up_to'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0017_member_leg_extreme_chain_tops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companywalletentry',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_rolled_up_entries, restore_watermark),
+        migrations.RemoveField(
+            model_name='companywallet',
+            name='rolled_up_to',
+        ),
+        migrations.AddIndex(
+            model_name='companywalletentry',
+            index=models.Index(condition=models.Q(('rolled_up', False)), fields=['id'], name='wallet_entry_pending_idx'),
+        ),
+    ]
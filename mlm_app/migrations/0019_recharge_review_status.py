@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0018_company_wallet_entry_rolled_up'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rechargetransaction',
+            name='status',
+            field=models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('pending', 'Pending'), ('review', 'Manual review')], default='pending', max_length=10),
+        ),
+    ]
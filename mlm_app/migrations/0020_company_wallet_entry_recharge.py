@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mlm_app', '0019_recharge_review_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='companywalletentry',
+            name='entry_type',
+            field=models.CharField(choices=[('plan_activation', 'Plan Activation'), ('commission', 'Commission'), ('matching_income', 'Matching Income'), ('recharge', 'Recharge'), ('recharge_share', 'Recharge Share'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,259 @@
+"""
+Data-migration helpers, frozen as they were when each migration that uses them was written.
+
+Migrations must keep doing what they did when they shipped, so they do not import from the app's
+commands or models, whose code moves on. Never edit these functions; a migration that needs
+different behaviour gets a new helper.
+"""
+import ast
+import json
+import re
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# 0002_member_team_counts
+
+COUNT_FIELDS = [
+    'left_active_count', 'left_inactive_count', 'left_total_count',
+    'right_active_count', 'right_inactive_count', 'right_total_count',
+]
+
+
+def compute_team_counts(rows):
+    """
+    Compute left/right team counters for every member from (user_id, left_id, right_id, status) rows.
+    Returns a dict mapping user_id to a tuple ordered like COUNT_FIELDS.
+    """
+    nodes = {user_id: (left_id, right_id, status) for user_id, left_id, right_id, status in rows}
+    # Subtree totals per user_id as (active, inactive, total), including the member itself.
+    subtree = {}
+    counts = {}
+
+    for root in nodes:
+        if root in subtree:
+            continue
+        stack = [(root, False)]
+        while stack:
+            user_id, expanded = stack.pop()
+            if user_id in subtree:
+                continue
+            left_id, right_id, status = nodes[user_id]
+            children = [child for child in (left_id, right_id) if child in nodes and child not in subtree]
+            if not expanded and children:
+                stack.append((user_id, True))
+                stack.extend((child, False) for child in children)
+                continue
+
+            left = subtree.get(left_id, (0, 0, 0)) if left_id in nodes else (0, 0, 0)
+            right = subtree.get(right_id, (0, 0, 0)) if right_id in nodes else (0, 0, 0)
+            counts[user_id] = left + right
+            is_active = 1 if status == 'Active' else 0
+            subtree[user_id] = (
+                left[0] + right[0] + is_active,
+                left[1] + right[1] + (1 - is_active),
+                left[2] + right[2] + 1,
+            )
+
+    return counts
+
+
+# 0003_member_tree_path
+
+def compute_tree_paths(rows):
+    """
+    Compute the materialized path and depth of every member from (user_id, left_id, right_id) rows.
+    Returns a dict mapping user_id to a (tree_path, tree_depth) tuple.
+    """
+    nodes = {user_id: (left_id, right_id) for user_id, left_id, right_id in rows}
+    children = {child for left_id, right_id in nodes.values() for child in (left_id, right_id) if child}
+    paths = {}
+
+    for root in nodes:
+        if root in children:
+            continue
+        stack = [(root, f"{root}/", 0)]
+        while stack:
+            user_id, tree_path, tree_depth = stack.pop()
+            if user_id not in nodes or user_id in paths:
+                continue
+            paths[user_id] = (tree_path, tree_depth)
+            left_id, right_id = nodes[user_id]
+            if left_id:
+                stack.append((left_id, tree_path + 'L', tree_depth + 1))
+            if right_id:
+                stack.append((right_id, tree_path + 'R', tree_depth + 1))
+
+    return paths
+
+
+# 0004_member_leg_extremes
+
+def compute_leg_extremes(rows):
+    """
+    Compute the outermost left and right member of every member from (user_id, left_id, right_id) rows.
+    Returns a dict mapping user_id to a (left_extreme_id, right_extreme_id) tuple; None means the slot is free.
+    """
+    nodes = {user_id: (left_id, right_id) for user_id, left_id, right_id in rows}
+    extremes = {}
+
+    for side in (0, 1):
+        resolved = {}
+        for start in nodes:
+            chain = []
+            user_id = start
+            while user_id not in resolved:
+                child = nodes[user_id][side] if user_id in nodes else None
+                if child is None or child not in nodes:
+                    resolved[user_id] = user_id
+                    break
+                chain.append(user_id)
+                user_id = child
+            end = resolved[user_id]
+            for user_id in chain:
+                resolved[user_id] = end
+        for user_id in nodes:
+            extremes.setdefault(user_id, [None, None])[side] = resolved[user_id] if resolved[user_id] != user_id else None
+
+    return {user_id: tuple(values) for user_id, values in extremes.items()}
+
+
+# 0007_member_ledger
+
+BALANCE_ACCOUNTS = ['account_balance', 'wallet_balance']
+INCOME_FIELDS = ['direct_income', 'level_income', 'matching_income', 'resale_income']
+
+
+def opening_balance_lines(rows):
+    """
+    Ledger lines that open the existing snapshot values of (pk, account_balance, wallet_balance,
+    direct_income, level_income, matching_income, resale_income) rows against the 'opening' account.
+    """
+    lines = []
+    for pk, account_balance, wallet_balance, *incomes in rows:
+        for account, amount in zip(BALANCE_ACCOUNTS, (account_balance, wallet_balance)):
+            if amount:
+                lines.append((pk, account, amount, ''))
+                lines.append((None, 'opening', -amount, ''))
+        for income_type, amount in zip(INCOME_FIELDS, incomes):
+            if amount:
+                # Income already sits in the balances above; these legs only record its type.
+                lines.append((pk, 'opening', amount, income_type))
+                lines.append((pk, 'opening', -amount, ''))
+    return lines
+
+
+# 0012_income_daily_rollups
+
+def rebuild_income_rollups(IncomeHistory, IncomeDailyRollup, NetworkDailyIncome, since=None, batch_size=1000):
+    """
+    Recompute the daily income rollups from IncomeHistory, for every day or from ``since`` on.
+    Returns the number of member rollup rows written.
+    """
+    history = IncomeHistory.objects.all()
+    member_rollups = IncomeDailyRollup.objects.all()
+    network_rollups = NetworkDailyIncome.objects.all()
+    if since:
+        history = history.filter(created_at__gte=timezone.make_aware(datetime.combine(since, datetime.min.time())))
+        member_rollups = member_rollups.filter(day__gte=since)
+        network_rollups = network_rollups.filter(day__gte=since)
+
+    written = 0
+    with transaction.atomic():
+        member_rollups.delete()
+        network_rollups.delete()
+
+        batch = []
+        for row in history.annotate(day=TruncDate('created_at')).order_by().values(
+            'member_id', 'day', 'income_type'
+        ).annotate(total=Sum('amount'), count=Count('id')).iterator(chunk_size=5000):
+            batch.append(IncomeDailyRollup(
+                member_id=row['member_id'], day=row['day'], income_type=row['income_type'],
+                amount=row['total'], entries=row['count'],
+            ))
+            if len(batch) >= batch_size:
+                IncomeDailyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        IncomeDailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+
+        NetworkDailyIncome.objects.bulk_create([
+            NetworkDailyIncome(day=row['day'], income_type=row['income_type'], amount=row['total'], entries=row['count'])
+            for row in IncomeDailyRollup.objects.filter(day__gte=since or date.min).order_by().values(
+                'day', 'income_type'
+            ).annotate(total=Sum('amount'), count=Sum('entries'))
+        ], batch_size=batch_size)
+    return written
+
+
+# 0016_recharge_response_json
+
+# Keys under which the provider may return its own transaction id, in order of preference.
+PROVIDER_TXN_ID_KEYS = ['tnx_id', 'txn_id', 'transaction_id', 'id']
+
+
+def parse_response_text(text):
+    """
+    Provider response stored as text by older code: usually ``str(dict)``, sometimes JSON. Text that
+    is neither is kept under 'raw'.
+    """
+    if not text:
+        return {}
+    # literal_eval cannot build Decimal('1.00') reprs, so their values are kept as strings.
+    literal = re.sub(r"Decimal\('([^']*)'\)", r"'\1'", text)
+    for parse, source in ((ast.literal_eval, literal), (json.loads, text)):
+        try:
+            value = parse(source)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        if isinstance(value, dict):
+            return json.loads(json.dumps(value, default=str))
+    return {'raw': text}
+
+
+def response_columns(response):
+    """The provider transaction id and operator status extracted from a provider response."""
+    txn_id = next((response[key] for key in PROVIDER_TXN_ID_KEYS if response.get(key) not in (None, '')), '')
+    return {
+        'provider_txn_id': str(txn_id)[:64],
+        'operator_status': str(response.get('status') or '')[:20].lower(),
+    }
+
+
+# 0017_member_leg_extreme_chain_tops
+
+def compute_chain_top_extremes(rows):
+    """
+    Compute the outermost left and right member from (user_id, left_id, right_id) rows. Pointers are only
+    kept on the top of each chain, so a member's left pointer is None when it is its head's left child.
+    Returns a dict mapping user_id to a (left_extreme_id, right_extreme_id) tuple; otherwise None means
+    the slot is free.
+    """
+    nodes = {user_id: (left_id, right_id) for user_id, left_id, right_id in rows}
+    extremes = {}
+
+    for side in (0, 1):
+        children = {values[side] for values in nodes.values() if values[side]}
+        resolved = {}
+        for start in nodes:
+            chain = []
+            user_id = start
+            while user_id not in resolved:
+                child = nodes[user_id][side] if user_id in nodes else None
+                if child is None or child not in nodes:
+                    resolved[user_id] = user_id
+                    break
+                chain.append(user_id)
+                user_id = child
+            end = resolved[user_id]
+            for user_id in chain:
+                resolved[user_id] = end
+        for user_id in nodes:
+            top = user_id not in children and resolved[user_id] != user_id
+            extremes.setdefault(user_id, [None, None])[side] = resolved[user_id] if top else None
+
+    return {user_id: tuple(values) for user_id, values in extremes.items()}
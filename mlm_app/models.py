@@ -1,101 +1,68 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils import timezone
 import logging
-from django.db.models import F
+from django.db.models import Case, DecimalField, F, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
+import ast
+import bisect
 import json
+import re
+from collections import defaultdict, namedtuple
+
+from .config_cache import VersionedConfig
+from .dashboard_cache import invalidate_dashboards
 
 logger = logging.getLogger(__name__)
 
-def update_matching_income(member_plan):
+class CompanyWallet(models.Model): 
     """
-    Update matching pairs, rank, and matching income for each head member up to the 'admin' user.
-    Uses the last plan price of the head member to calculate income, considering only active members.
+    Snapshot of the company balance. Money movements are appended to CompanyWalletEntry instead of
+    updating this row; ``balance`` includes every entry flagged ``rolled_up`` and the
+    rollup_company_wallet command folds the others in periodically.
     """
-    try:
-        member = member_plan.member
-        parent_member = member.head_member.mlm_profile if member.head_member else None
-
-        if not parent_member:
-            return
-
-        while parent_member.user.username != "admin":
-            all_left_team_count = parent_member.count_team_members('left')['active']
-            all_right_team_count = parent_member.count_team_members('right')['active']
-
-            current_matching_pairs = min(all_left_team_count, all_right_team_count)
-            new_matching_pairs = current_matching_pairs - parent_member.all_matching_pairs
-
-            if new_matching_pairs > 0:
-                last_plan = parent_member.plans.last()
-                if not last_plan:
-                    break
-
-                matching_income = Decimal(last_plan.plan.matching)
-
-                parent_member.matching_income += matching_income
-                parent_member.total_income += matching_income
-                parent_member.today_income += matching_income
-                parent_member.account_balance += matching_income
-                parent_member.all_matching_pairs += new_matching_pairs
-                parent_member.matching_pairs += new_matching_pairs
-
-                IncomeHistory.objects.create(member=parent_member, income_type='matching_income', amount=matching_income)
-
-                next_rank = RankAndRewards.objects.filter(
-                    pairs__lte=parent_member.matching_pairs, rank_no__gt=parent_member.rank_no
-                ).order_by('rank_no').first()
-
-                if next_rank:
-                    parent_member.rank_no = next_rank.rank_no
-                    parent_member.matching_pairs = 0 
-
-                parent_member.save(update_fields=[
-                    'matching_income', 'total_income', 'today_income', 'account_balance',
-                    'all_matching_pairs', 'matching_pairs', 'rank_no'
-                ])
-
-                # Deduct income from company wallet
-                try:
-                    company_wallet, _ = CompanyWallet.objects.get_or_create(id=1)
-                    company_wallet.deduct_from_wallet(matching_income)
-                except Exception as e:
-                    logger.exception(f"Error deducting matching income from company wallet: {e}")
-
-            # Move to the next head member
-            parent_member = parent_member.head_member.mlm_profile if parent_member.head_member else None
-            if not parent_member:
-                break
-
-    except Exception as e:
-        logger.exception(f"Error updating matching income for member {member.user.username}: {e}")
-
-class CompanyWallet(models.Model): 
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
     charges_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def record(cls, amount, entry_type, description=''):
+        """Append a signed movement to the company ledger without touching the snapshot row."""
+        return CompanyWalletEntry.objects.create(amount=Decimal(amount), entry_type=entry_type, description=description)
 
-    def add_to_wallet(self, amount):
+    @classmethod
+    def add_to_wallet(cls, amount, entry_type='adjustment', description=''):
         """Add a specified amount to the wallet."""
         if amount < 0:
             raise ValueError("Amount to add cannot be negative.")
-        self.balance += Decimal(amount)
-        self.save()
-        return self.balance
+        return cls.record(amount, entry_type, description)
 
-    def deduct_from_wallet(self, amount):
+    @classmethod
+    def deduct_from_wallet(cls, amount, entry_type='adjustment', description=''):
         """Deduct a specified amount from the wallet."""
         if amount < 0:
             raise ValueError("Amount to deduct cannot be negative.")
-        if amount > self.balance:
+        if amount > cls.current_balance():
             raise ValueError("Insufficient balance in the wallet.")
-        self.balance -= Decimal(amount)
-        self.save()
-        return self.balance
+        return cls.record(-Decimal(amount), entry_type, description)
+
+    @classmethod
+    def current_balance(cls):
+        """
+        Snapshot balance plus the entries that have not been rolled up yet, read in one statement so
+        a concurrent rollup cannot be counted twice or missed.
+        """
+        zero = Value(Decimal('0.00'), output_field=DecimalField(max_digits=15, decimal_places=2))
+        balance = Subquery(cls.objects.filter(id=1).values('balance'))
+        return CompanyWalletEntry.objects.filter(rolled_up=False).aggregate(
+            total=Coalesce(models.Sum('amount'), zero) + Coalesce(balance, zero)
+        )['total']
 
     def __str__(self):
         return f"Company: {self.balance}"
@@ -104,6 +71,38 @@ class CompanyWallet(models.Model):
         verbose_name = "Company Wallet"
         verbose_name_plural = "Company Wallets"
 
+class CompanyWalletEntry(models.Model):
+    """Append-only company wallet movement; credits are positive and debits negative."""
+    ENTRY_TYPES = [
+        ('plan_activation', 'Plan Activation'),
+        ('commission', 'Commission'),
+        ('matching_income', 'Matching Income'),
+        ('recharge', 'Recharge'),
+        ('recharge_share', 'Recharge Share'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    description = models.TextField(blank=True)
+    # Set when the movement is the company side of a double-entry ledger transaction.
+    transaction = models.ForeignKey('LedgerTransaction', null=True, blank=True, on_delete=models.PROTECT, related_name='company_entries')
+    # Set once the amount is included in CompanyWallet.balance.
+    rolled_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} - {self.amount}"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Company Wallet Entry"
+        verbose_name_plural = "Company Wallet Entries"
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['id'], name='wallet_entry_pending_idx', condition=models.Q(rolled_up=False)),
+        ]
+
 class Plan(models.Model):
     name = models.CharField(max_length=50)
     price = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
@@ -141,6 +140,79 @@ class RankAndRewards(models.Model):
         verbose_name = "Rank and Reward"
         verbose_name_plural = "Ranks and Rewards"
 
+class RankLadder:
+    """
+    The RankAndRewards table sorted by rank_no, with suffix minima of the required pairs so that the
+    next reachable rank above any rank is found by bisect instead of a query.
+    """
+
+    def __init__(self, ranks):
+        self.ranks = sorted(ranks, key=lambda rank: rank.rank_no)
+        self.rank_nos = [rank.rank_no for rank in self.ranks]
+        self.pairs = [rank.pairs for rank in self.ranks]
+        self.by_rank_no = {rank.rank_no: rank for rank in self.ranks}
+
+        # suffix_min[i] is the fewest pairs any rank from i onwards requires, reached first at suffix_argmin[i].
+        count = len(self.ranks)
+        self.suffix_min = [None] * (count + 1)
+        self.suffix_argmin = [None] * (count + 1)
+        for i in range(count - 1, -1, -1):
+            if self.suffix_min[i + 1] is None or self.pairs[i] <= self.suffix_min[i + 1]:
+                self.suffix_min[i], self.suffix_argmin[i] = self.pairs[i], i
+            else:
+                self.suffix_min[i], self.suffix_argmin[i] = self.suffix_min[i + 1], self.suffix_argmin[i + 1]
+
+    @classmethod
+    def load(cls):
+        return cls(RankAndRewards.objects.all())
+
+    def get(self, rank_no):
+        return self.by_rank_no.get(rank_no)
+
+    def _first_reachable(self, start, matching_pairs):
+        """Index of the lowest rank at or after ``start`` requiring at most ``matching_pairs``, or None."""
+        if self.suffix_min[start] is None or self.suffix_min[start] > matching_pairs:
+            return None
+        if self.suffix_min[start] == matching_pairs:
+            return self.suffix_argmin[start]
+        index = start
+        while self.pairs[index] > matching_pairs:
+            index += 1
+        return index
+
+    def next_rank(self, rank_no, matching_pairs):
+        """The lowest rank above ``rank_no`` that ``matching_pairs`` qualifies for, or None."""
+        index = self._first_reachable(bisect.bisect_right(self.rank_nos, rank_no), matching_pairs)
+        return None if index is None else self.ranks[index]
+
+    def advance(self, rank_no, matching_pairs, new_pairs):
+        """
+        Apply ``new_pairs`` to a (rank_no, matching_pairs) state as if they arrived one at a time, promoting
+        to the lowest eligible higher rank (and resetting matching_pairs) whenever one is reached.
+        Returns the new state.
+        """
+        while new_pairs > 0:
+            start = bisect.bisect_right(self.rank_nos, rank_no)
+            if self.suffix_min[start] is None:
+                break
+            needed = max(1, self.suffix_min[start] - matching_pairs)
+            if needed > new_pairs:
+                break
+            matching_pairs += needed
+            new_pairs -= needed
+            rank_no = self.rank_nos[self._first_reachable(start, matching_pairs)]
+            matching_pairs = 0
+
+        return rank_no, matching_pairs + new_pairs
+
+
+RANK_LADDER = VersionedConfig('mlm_app:rank_ladder_version', RankLadder.load)
+
+
+def rank_ladder():
+    """The rank ladder from the per-process cache; editing RankAndRewards invalidates it."""
+    return RANK_LADDER.get()
+
 class Member(models.Model):
     POSITION_CHOICES = [
         ('Left', 'Left'),
@@ -162,6 +234,10 @@ class Member(models.Model):
     head_member = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='head_users')
     left = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='left_users')
     right = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='right_users')
+    # Outermost member reached by following only left (or right) links; empty while that slot is free.
+    # Only kept on the top member of each such chain, i.e. a member that is not its head's left (right) child.
+    left_extreme = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    right_extreme = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
 
     position = models.CharField(max_length=10, choices=POSITION_CHOICES, null=True, blank=True)
     level = models.PositiveIntegerField(default=0)
@@ -182,6 +258,18 @@ class Member(models.Model):
     wallet_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), help_text="Wallet balance for the member.")
     total_withdrawal = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), help_text="Total amount withdrawn.")
 
+    # Materialized team counters, maintained along the upline by place_member and update_status.
+    left_active_count = models.PositiveIntegerField(default=0)
+    left_inactive_count = models.PositiveIntegerField(default=0)
+    left_total_count = models.PositiveIntegerField(default=0)
+    right_active_count = models.PositiveIntegerField(default=0)
+    right_inactive_count = models.PositiveIntegerField(default=0)
+    right_total_count = models.PositiveIntegerField(default=0)
+
+    # Materialized path: "<root user id>/" followed by one 'L' or 'R' per level below the root.
+    tree_path = models.TextField(default='', blank=True)
+    tree_depth = models.PositiveIntegerField(default=0)
+
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="Inactive")
     block = models.CharField(max_length=10, choices=BLOCK_CHOICES, default="False")
     last_updated = models.DateTimeField(auto_now=True)
@@ -199,80 +287,223 @@ class Member(models.Model):
             models.Index(fields=['mobile_no']),
             models.Index(fields=['position']),
             models.Index(fields=['status']),
+            models.Index(fields=['rank_no']),
+            models.Index(fields=['joined_on']),
+            models.Index(fields=['tree_path'], name='member_tree_path_idx', opclasses=['text_pattern_ops']),
         ]
 
     def save(self, *args, **kwargs):
+        if not self.tree_path and self.user_id:
+            self.tree_path = f"{self.user_id}/"
         super().save(*args, **kwargs)
         
     def update_status(self):
         if self.status == 'Inactive':
             self.status = 'Active'
-            self.save()
+            self.save(update_fields=['status'])
+            self.update_upline_counts(active=1, inactive=-1)
 
     def place_member(self, new_member, position):
+        """
+        Place ``new_member`` at the outermost free slot of this member's ``position`` leg (spillover).
+
+        The slot is found through the leg-extreme pointer stored on the top of the chain this member
+        belongs to, so placement costs a constant number of queries and writes: the target slot row is
+        locked and updated, the chain top gets the new pointer, and intermediate ancestors are untouched.
+        """
         if position not in dict(self.POSITION_CHOICES):
             raise ValueError("Position must be 'Left' or 'Right'.")
 
-        new_member.head_member = self.user
+        direction = position.lower()
+        leg = position[0]
+        chain_top = Member.objects.filter(tree_path=self.tree_path.rstrip(leg))
 
-        if position == 'Left':
-            if self.left is None:
-                self.left = new_member.user
+        with transaction.atomic():
+            for _ in range(3):
+                extreme_user_id = chain_top.values_list(f'{direction}_extreme_id', flat=True).first()
+                target = Member.objects.select_for_update().get(user_id=extreme_user_id or self.user_id)
+                if target.is_leg_extreme_of(self, leg) and getattr(target, f'{direction}_id') is None:
+                    break
+                # Another registration filled the slot after we read the pointer; read it again.
             else:
-                left_member = Member.objects.get(user=self.left)
-                left_member.place_member(new_member, position)
-        elif position == 'Right':
-            if self.right is None:
-                self.right = new_member.user
+                target = self.find_leg_extreme(direction)
+
+            Member.objects.filter(pk=target.pk).update(**{direction: new_member.user})
+
+            # The chain that ended at the target now ends at the new member.
+            chain_top.update(**{f'{direction}_extreme': new_member.user})
+            if self.tree_path == self.tree_path.rstrip(leg):
+                setattr(self, f'{direction}_extreme', new_member.user)
+
+            new_member.head_member_id = target.user_id
+            new_member.move_tree_path(target.tree_path + leg, target.tree_depth + 1)
+            new_member.save()
+
+            if new_member.status == 'Active':
+                new_member.update_upline_counts(active=1, total=1)
             else:
-                right_member = Member.objects.get(user=self.right)
-                right_member.place_member(new_member, position)
+                new_member.update_upline_counts(inactive=1, total=1)
+
+    def is_leg_extreme_of(self, ancestor, leg):
+        """Check that this member sits on the outermost ``leg`` ('L' or 'R') chain below ``ancestor``."""
+        suffix = self.tree_path[len(ancestor.tree_path):]
+        return self.tree_path.startswith(ancestor.tree_path) and suffix == leg * len(suffix)
+
+    def find_leg_extreme(self, direction):
+        """Walk the leg one level at a time; only used when the stored pointer is stale."""
+        logger.warning(f"Stale {direction} leg pointer on {self.user_id}; run rebuild_tree_paths.")
+        member = Member.objects.select_for_update().get(pk=self.pk)
+        while getattr(member, f'{direction}_id') is not None:
+            member = Member.objects.select_for_update().get(user_id=getattr(member, f'{direction}_id'))
+        return member
+
+    def get_upline(self):
+        """
+        Return the upline members ordered from the immediate head member to the root, in one query.
+
+        Each member is annotated with ``upline_depth``, ``upline_username`` and ``last_plan_id``
+        (the plan of the member's last MemberPlan, or None when no plan has been taken).
+        """
+        return Member.get_uplines([self.pk])
+
+    @classmethod
+    def get_uplines(cls, member_ids):
+        """
+        Return the uplines of several members in one recursive query, ordered by starting member and
+        depth. Rows are annotated like get_upline plus ``upline_start_id``; shared ancestors repeat.
+        """
+        if not member_ids:
+            return []
+
+        member_table = cls._meta.db_table
+        placeholders = ', '.join(['%s'] * len(member_ids))
+        sql = f"""
+            WITH RECURSIVE upline (start_id, user_id, depth) AS (
+                SELECT id, head_member_id, 1 FROM {member_table}
+                WHERE id IN ({placeholders}) AND head_member_id IS NOT NULL
+                UNION ALL
+                SELECT upline.start_id, m.head_member_id, upline.depth + 1
+                FROM upline JOIN {member_table} m ON m.user_id = upline.user_id
+                WHERE m.head_member_id IS NOT NULL
+            )
+            SELECT m.*, upline.start_id AS upline_start_id, upline.depth AS upline_depth,
+                u.username AS upline_username, (
+                    SELECT mp.plan_id FROM {MemberPlan._meta.db_table} mp
+                    WHERE mp.member_id = m.id
+                    ORDER BY mp.id DESC LIMIT 1
+                ) AS last_plan_id
+            FROM upline
+            JOIN {member_table} m ON m.user_id = upline.user_id
+            JOIN {User._meta.db_table} u ON u.id = m.user_id
+            ORDER BY upline.start_id, upline.depth
+        """
+        return list(cls.objects.raw(sql, list(member_ids)))
+
+    def move_tree_path(self, tree_path, tree_depth):
+        """Re-root this member (and any existing downline) under a new materialized path."""
+        old_path, old_depth = self.tree_path, self.tree_depth
+        self.tree_path, self.tree_depth = tree_path, tree_depth
+        if not old_path or old_path == tree_path:
+            return
 
-        self.save()
-        new_member.save()
+        self.get_descendants().update(
+            tree_path=Concat(Value(tree_path), Substr('tree_path', len(old_path) + 1)),
+            tree_depth=F('tree_depth') + (tree_depth - old_depth),
+        )
+
+    def get_descendants(self, direction=None):
+        """
+        Return a queryset of the downline, optionally restricted to the 'left' or 'right' leg.
+        The range bounds keep the lookup on the tree_path index; startswith guards the bounds.
+        """
+        prefix = self.tree_path
+        if direction == 'left':
+            prefix += 'L'
+        elif direction == 'right':
+            prefix += 'R'
+        lower = prefix if direction else prefix + 'L'
+        return Member.objects.filter(
+            tree_path__gte=lower, tree_path__lt=prefix + 'Z', tree_path__startswith=prefix
+        )
+
+    def get_ancestor_paths(self):
+        """Return the materialized paths of every upline member, from the root downwards."""
+        root_length = self.tree_path.index('/') + 1 if '/' in self.tree_path else len(self.tree_path)
+        return [self.tree_path[:end] for end in range(root_length, len(self.tree_path))]
+
+    def get_ancestor_legs(self):
+        """
+        Return (pk, user_id, leg) for every upline member, where ``leg`` is 'L' or 'R' for the leg of
+        that member this member belongs to. The path prefixes are generated in SQL, so only this
+        member's own path is sent and each prefix is an indexed tree_path lookup.
+        """
+        root_length = self.tree_path.index('/') + 1 if '/' in self.tree_path else len(self.tree_path)
+        if root_length >= len(self.tree_path):
+            return []
+
+        sql = f"""
+            WITH RECURSIVE prefix (n) AS (
+                SELECT CAST(%s AS INTEGER)
+                UNION ALL
+                SELECT n + 1 FROM prefix WHERE n + 1 < %s
+            )
+            SELECT m.id, m.user_id, SUBSTR(p.path, prefix.n + 1, 1)
+            FROM (SELECT CAST(%s AS TEXT) AS path) p
+            CROSS JOIN prefix
+            JOIN {Member._meta.db_table} m ON m.tree_path = SUBSTR(p.path, 1, prefix.n)
+            ORDER BY prefix.n
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [root_length, len(self.tree_path), self.tree_path])
+            return cursor.fetchall()
+
+    def get_ancestors(self):
+        """Return a queryset of the upline members, matched by primary key."""
+        return Member.objects.filter(pk__in=[pk for pk, _, _ in self.get_ancestor_legs()])
+
+    def depth_under(self, ancestor):
+        """Return how many levels this member sits below ``ancestor``, or None if it is not in its downline."""
+        if self.tree_path.startswith(ancestor.tree_path) and self.tree_path != ancestor.tree_path:
+            return self.tree_depth - ancestor.tree_depth
+        return None
+
+    def update_upline_counts(self, active=0, inactive=0, total=0):
+        """Apply counter deltas to every upline member, in the leg this member belongs to."""
+        legs = {'left': [], 'right': []}
+        user_ids = [self.user_id]
+        for pk, user_id, leg in self.get_ancestor_legs():
+            legs['left' if leg == 'L' else 'right'].append(pk)
+            user_ids.append(user_id)
+
+        for direction, pks in legs.items():
+            if not pks:
+                continue
+            Member.objects.filter(pk__in=pks).update(**{
+                f'{direction}_active_count': F(f'{direction}_active_count') + active,
+                f'{direction}_inactive_count': F(f'{direction}_inactive_count') + inactive,
+                f'{direction}_total_count': F(f'{direction}_total_count') + total,
+            })
+
+        invalidate_dashboards(user_ids)
 
     def count_team_members(self, direction):
-        count = {
-            'active': 0,
-            'inactive': 0,
-            'total': 0,
+        if direction not in ('left', 'right'):
+            return {'active': 0, 'inactive': 0, 'total': 0}
+
+        return {
+            'active': getattr(self, f'{direction}_active_count'),
+            'inactive': getattr(self, f'{direction}_inactive_count'),
+            'total': getattr(self, f'{direction}_total_count'),
         }
-        
-        try:
-            if direction == 'left' and self.left:
-                left_member = Member.objects.get(user=self.left)
-                
-                left_counts = left_member.count_team_members('left')
-                right_counts = left_member.count_team_members('right')
-                
-                count['active'] += (1 if left_member.status == 'Active' else 0) + left_counts['active'] + right_counts['active']
-                count['inactive'] += (1 if left_member.status == 'Inactive' else 0) + left_counts['inactive'] + right_counts['inactive']
-                count['total'] += 1 + left_counts['total'] + right_counts['total']
-
-            elif direction == 'right' and self.right:
-                right_member = Member.objects.get(user=self.right)
-
-                left_counts = right_member.count_team_members('left')
-                right_counts = right_member.count_team_members('right')
-                
-                # Update the counts for the current right subtree
-                count['active'] += (1 if right_member.status == 'Active' else 0) + left_counts['active'] + right_counts['active']
-                count['inactive'] += (1 if right_member.status == 'Inactive' else 0) + left_counts['inactive'] + right_counts['inactive']
-                count['total'] += 1 + left_counts['total'] + right_counts['total']
-
-        except Member.DoesNotExist:
-            pass
-
-        return count
 
     def update_rank(self):
         """Automatically update rank based on matching pairs and reset matching_pairs."""
-        next_rank = RankAndRewards.objects.filter(pairs__lte=self.matching_pairs, rank_no__gt=self.rank_no).order_by('rank_no').first()
+        next_rank = rank_ladder().next_rank(self.rank_no, self.matching_pairs)
 
         if next_rank:
             self.rank_no = next_rank.rank_no
             self.matching_pairs = 0
-            self.save()
+            self.save(update_fields=['rank_no', 'matching_pairs'])
 
 class MemberBankDetails(models.Model):
     member = models.ForeignKey('Member', on_delete=models.CASCADE, related_name='bank_details')
@@ -295,6 +526,97 @@ class MemberPlan(models.Model):
     def __str__(self):
         return f"{self.member.user.username} - {self.plan.name}"
 
+class CommissionJob(models.Model):
+    """Durable queue entry for the commission work triggered by a plan activation."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    member_plan = models.OneToOneField(MemberPlan, on_delete=models.CASCADE, related_name='commission_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.member_plan} - {self.status}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+class DailyClose(models.Model):
+    """Progress of the end-of-day close for one business date; ``last_member_id`` is the resume cursor."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+
+    business_date = models.DateField(unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    payout_cutoff = models.DateTimeField(help_text="Commission jobs queued before this time were paid before closing.")
+    last_member_id = models.BigIntegerField(default=0)
+    members_closed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Close {self.business_date} - {self.status}"
+
+    class Meta:
+        ordering = ['-business_date']
+
+class MemberDailySnapshot(models.Model):
+    """Income earned and balances held by a member at the close of a business date."""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='daily_snapshots')
+    business_date = models.DateField()
+    income = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_income = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    account_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    wallet_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.member_id} - {self.business_date} - ₹{self.income}"
+
+    class Meta:
+        ordering = ['-business_date']
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'business_date'], name='unique_member_daily_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['business_date']),
+        ]
+
+class ReconciliationCheckpoint(models.Model):
+    """Replay state after every MemberPlan up to ``last_member_plan_id``, so reconciliation resumes there."""
+    last_member_plan_id = models.BigIntegerField()
+    activations_replayed = models.PositiveIntegerField(default=0)
+    state = models.BinaryField(help_text="zlib-compressed JSON of the per-member replay state.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Checkpoint at member plan {self.last_member_plan_id}"
+
+    class Meta:
+        ordering = ['-id']
+
+class IdSequence(models.Model):
+    """First value of a named ID sequence not yet reserved by any process; see mlm_app.sequences."""
+    name = models.CharField(max_length=30, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} - {self.next_value}"
+
+def invalidate_member_dashboards(member_ids):
+    if member_ids:
+        invalidate_dashboards(Member.objects.filter(pk__in=member_ids).values_list('user_id', flat=True))
+
 class IncomeHistory(models.Model):
     INCOME_TYPES = [
         ('direct_income', 'Direct Income'),
@@ -312,30 +634,328 @@ class IncomeHistory(models.Model):
     def __str__(self):
         return f"{self.member.user.username} - {self.income_type} - ₹{self.amount}"
 
+    @classmethod
+    def record(cls, rows):
+        """Insert ``rows`` and add them to the daily income rollups in the same transaction."""
+        with transaction.atomic():
+            rows = cls.objects.bulk_create(rows)
+            IncomeDailyRollup.add(rows)
+            invalidate_member_dashboards({row.member_id for row in rows})
+        return rows
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['member', 'created_at']),
+        ]
+
+def upsert_increments(model, key_fields, increments, batch_size=500):
+    """
+    Add ``increments`` ({key values: (amount, entries)}) to the rows of ``model`` identified by
+    ``key_fields`` with INSERT ... ON CONFLICT DO UPDATE, so concurrent writers add to the same row
+    instead of racing on a read-modify-write. Keys are written in sorted order to avoid deadlocks.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys = [quote(model._meta.get_field(field).column) for field in key_fields]
+    columns = ', '.join(keys + ['amount', 'entries'])
+    placeholder = f"({', '.join(['%s'] * (len(keys) + 2))})"
+
+    items = sorted(increments.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({columns})
+                VALUES {', '.join([placeholder] * len(batch))}
+                ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                    amount = {table}.amount + EXCLUDED.amount,
+                    entries = {table}.entries + EXCLUDED.entries
+                """,
+                [value for key, (amount, entries) in batch for value in (*key, amount, entries)],
+            )
+
+class IncomeDailyRollup(models.Model):
+    """Income of one member per day and income type, kept in step with IncomeHistory."""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='daily_income')
+    day = models.DateField()
+    income_type = models.CharField(max_length=20, choices=IncomeHistory.INCOME_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    entries = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.member_id} - {self.day} - {self.income_type} - ₹{self.amount}"
+
+    @classmethod
+    def add(cls, rows):
+        """Add IncomeHistory ``rows`` to the member and network rollups of their local day."""
+        members = defaultdict(lambda: [Decimal('0.00'), 0])
+        network = defaultdict(lambda: [Decimal('0.00'), 0])
+        for row in rows:
+            day = timezone.localdate(row.created_at)
+            for totals in (members[row.member_id, day, row.income_type], network[day, row.income_type]):
+                totals[0] += row.amount
+                totals[1] += 1
+        upsert_increments(cls, ['member', 'day', 'income_type'], members)
+        upsert_increments(NetworkDailyIncome, ['day', 'income_type'], network)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'day', 'income_type'], name='unique_member_daily_income'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+class NetworkDailyIncome(models.Model):
+    """Income paid to the whole network per day and income type."""
+    day = models.DateField()
+    income_type = models.CharField(max_length=20, choices=IncomeHistory.INCOME_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    entries = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.income_type} - ₹{self.amount}"
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = "Network daily income"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'income_type'], name='unique_network_daily_income'),
+        ]
+
+# One leg of a ledger posting. ``member_id`` is None for company and external accounts.
+LedgerLine = namedtuple('LedgerLine', ['member_id', 'account', 'amount', 'income_type'], defaults=[''])
+
+CENTS = Decimal('0.01')
+
+# Member snapshot columns maintained from ledger entries on these accounts.
+BALANCE_ACCOUNTS = ['account_balance', 'wallet_balance']
+# Income types counted in total_income and today_income; resale income only goes to the wallet.
+TOTAL_INCOME_TYPES = ['direct_income', 'level_income', 'matching_income']
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+class LedgerTransaction(models.Model):
+    """
+    A balanced set of money movements. Member and external legs are LedgerEntry rows and the company
+    leg is a CompanyWalletEntry, so the amounts of both always sum to zero.
+    """
+    KIND_CHOICES = [
+        ('plan_activation', 'Plan Activation'),
+        ('commission', 'Commission'),
+        ('matching_income', 'Matching Income'),
+        ('recharge', 'Recharge'),
+        ('recharge_share', 'Recharge Share'),
+        ('recharge_reserve', 'Recharge Reservation'),
+        ('recharge_refund', 'Recharge Refund'),
+        ('opening_balance', 'Opening Balance'),
+        ('reconciliation', 'Reconciliation'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    reference = models.CharField(max_length=50, blank=True)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk}"
+
+    @classmethod
+    def post(cls, kind, lines, description='', reference=''):
+        """
+        Record ``lines`` (LedgerLine tuples, which must sum to zero) as one transaction and apply them
+        to the member snapshot columns with F() increments. Debits on member accounts fail with
+        InsufficientFunds instead of overdrawing the snapshot.
+        """
+        lines = [line._replace(amount=Decimal(line.amount).quantize(CENTS)) for line in lines if line.amount]
+        if sum(line.amount for line in lines) != 0:
+            raise ValueError(f"Ledger transaction '{kind}' does not balance.")
+
+        with transaction.atomic():
+            ledger_transaction = cls.objects.create(kind=kind, description=description, reference=reference)
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(
+                    transaction=ledger_transaction, member_id=line.member_id, account=line.account,
+                    income_type=line.income_type, amount=line.amount,
+                )
+                for line in lines if line.account != 'company'
+            ])
+            company_amount = sum(line.amount for line in lines if line.account == 'company')
+            if company_amount:
+                CompanyWalletEntry.objects.create(
+                    transaction=ledger_transaction, amount=company_amount,
+                    entry_type=kind if kind in dict(CompanyWalletEntry.ENTRY_TYPES) else 'adjustment',
+                    description=description,
+                )
+            cls.apply_to_snapshots(lines)
+        return ledger_transaction
+
+    @staticmethod
+    def snapshot_deltas(lines):
+        """Per-member increments of the Member money columns implied by ``lines``."""
+        deltas = defaultdict(lambda: defaultdict(Decimal))
+        for line in lines:
+            if line.member_id is None:
+                continue
+            if line.account in BALANCE_ACCOUNTS:
+                deltas[line.member_id][line.account] += line.amount
+            if line.income_type:
+                deltas[line.member_id][line.income_type] += line.amount
+                if line.income_type in TOTAL_INCOME_TYPES:
+                    deltas[line.member_id]['total_income'] += line.amount
+                    deltas[line.member_id]['today_income'] += line.amount
+        return deltas
+
+    @classmethod
+    def apply_to_snapshots(cls, lines):
+        deltas = cls.snapshot_deltas(lines)
+        invalidate_member_dashboards(deltas)
+
+        # Members with a debit get a guarded update each; everyone else shares a single UPDATE.
+        credited = defaultdict(dict)
+        for member_id, fields in deltas.items():
+            debits = {f'{field}__gte': -amount for field, amount in fields.items() if field in BALANCE_ACCOUNTS and amount < 0}
+            if not debits:
+                for field, amount in fields.items():
+                    credited[field][member_id] = amount
+                continue
+            updated = Member.objects.filter(pk=member_id, **debits).update(
+                **{field: F(field) + amount for field, amount in fields.items()}
+            )
+            if not updated:
+                raise InsufficientFunds("Insufficient balance.")
+
+        if credited:
+            member_ids = {member_id for amounts in credited.values() for member_id in amounts}
+            Member.objects.filter(pk__in=member_ids).update(**{
+                field: F(field) + Case(
+                    *[When(pk=member_id, then=Value(amount)) for member_id, amount in amounts.items()],
+                    default=Value(Decimal('0.00')),
+                    output_field=DecimalField(max_digits=15, decimal_places=2),
+                )
+                for field, amounts in credited.items()
+            })
+
+    class Meta:
+        ordering = ['id']
+
+
+class LedgerEntry(models.Model):
+    """One leg of a LedgerTransaction; credits are positive and debits negative."""
+    ACCOUNT_CHOICES = [
+        ('account_balance', 'Account Balance'),
+        ('wallet_balance', 'Wallet Balance'),
+        ('provider', 'Recharge Provider'),
+        ('recharge_hold', 'Recharges In Progress'),
+        ('resale_pool', 'Resale Pool'),
+        ('opening', 'Opening Balance'),
+    ]
+
+    transaction = models.ForeignKey(LedgerTransaction, on_delete=models.PROTECT, related_name='entries')
+    member = models.ForeignKey(Member, null=True, blank=True, on_delete=models.PROTECT, related_name='ledger_entries')
+    account = models.CharField(max_length=20, choices=ACCOUNT_CHOICES)
+    income_type = models.CharField(max_length=20, choices=IncomeHistory.INCOME_TYPES, blank=True)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.account} {self.amount}"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = "Ledger Entries"
+        indexes = [
+            models.Index(fields=['member', 'account']),
+        ]
+
+# Keys under which the provider may return its own transaction id, in order of preference.
+PROVIDER_TXN_ID_KEYS = ['tnx_id', 'txn_id', 'transaction_id', 'id']
+
+
+def parse_response_text(text):
+    """
+    Provider response stored as text by older code: usually ``str(dict)``, sometimes JSON. Text that
+    is neither is kept under 'raw'.
+    """
+    if not text:
+        return {}
+    # literal_eval cannot build Decimal('1.00') reprs, so their values are kept as strings.
+    literal = re.sub(r"Decimal\('([^']*)'\)", r"'\1'", text)
+    for parse, source in ((ast.literal_eval, literal), (json.loads, text)):
+        try:
+            value = parse(source)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        if isinstance(value, dict):
+            return json.loads(json.dumps(value, default=str))
+    return {'raw': text}
+
+
+def response_columns(response):
+    """The provider transaction id and operator status extracted from a provider response."""
+    txn_id = next((response[key] for key in PROVIDER_TXN_ID_KEYS if response.get(key) not in (None, '')), '')
+    return {
+        'provider_txn_id': str(txn_id)[:64],
+        'operator_status': str(response.get('status') or '')[:20].lower(),
+    }
+
 
 class RechargeTransaction(models.Model):
     STATUS_CHOICES = [
         ('success', 'Success'),
         ('failed', 'Failed'),
         ('pending', 'Pending'),
+        # The provider answered with a status it is not known to send; the amount stays held.
+        ('review', 'Manual review'),
     ]
+    RESPONSE_FIELDS = ['response_data', 'provider_txn_id', 'operator_status']
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='recharge_transactions')
     mobile_no = models.CharField(max_length=10)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
     company_name = models.CharField(max_length=50)
     order_id = models.CharField(max_length=20, unique=True)
+    is_stv = models.BooleanField(default=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
-    response_data = models.TextField()
+    response_data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # Extracted from response_data by set_response, for lookups and reconciliation.
+    provider_txn_id = models.CharField(max_length=64, blank=True, db_index=True)
+    operator_status = models.CharField(max_length=20, blank=True, db_index=True)
     recharge_date = models.DateTimeField(auto_now_add=True)
+    # Pipeline timestamps: sent to the provider, last polled by reconcile_recharges, final status applied.
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    status_checks = models.PositiveIntegerField(default=0)
+    settled_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.mobile_no} - ₹{self.amount}"
 
+    def set_response(self, response, final=True):
+        """
+        Store a provider ``response`` and its extracted columns, unsaved; see RESPONSE_FIELDS. Columns
+        the response has no value for keep the value extracted from an earlier response, and a
+        response that is not ``final`` (the outcome is still open) is only kept if none is stored yet.
+        """
+        if final or not self.response_data:
+            self.response_data = response
+        for field, value in response_columns(response).items():
+            if value:
+                setattr(self, field, value)
+
     class Meta:
         ordering = ['-recharge_date']
+        indexes = [
+            models.Index(fields=['user', '-recharge_date']),
+            models.Index(fields=['status', 'recharge_date']),
+        ]
 
 # Signal to create Member profile when User is created
 @receiver(post_save, sender=User)
@@ -351,6 +971,17 @@ def handle_member_plan_activation(sender, instance, created, **kwargs):
     if created:
         # Update member status to active
         instance.member.update_status()
-        
-        # Update matching income for upline
-        update_matching_income(instance)
+
+        # Upline commissions are paid by the process_commission_jobs worker
+        CommissionJob.objects.create(member_plan=instance)
+
+# Payout configuration is cached per process; replace its version whenever plans or levels change.
+@receiver([post_save, post_delete], sender=Plan)
+@receiver([post_save, post_delete], sender=Level)
+def invalidate_payout_config(sender, **kwargs):
+    from .payouts import invalidate_payout_config
+    invalidate_payout_config()
+
+@receiver([post_save, post_delete], sender=RankAndRewards)
+def invalidate_rank_ladder(sender, **kwargs):
+    RANK_LADDER.invalidate()
@@ -0,0 +1,193 @@
+"""
+Array-backed, in-memory view of the whole binary network for analytics.
+
+The tree is loaded once into contiguous NumPy arrays indexed by position (not by user id). Subtree
+aggregates and depths for every member come from one Euler tour of the tree: the tour is laid out
+as a linked list of enter/exit events, ranked with vectorized pointer jumping (O(log n) passes,
+independent of how deep spillover legs grow), and a subtree is then the contiguous run of events
+between a member's enter and exit. This module requires NumPy.
+"""
+import numpy as np
+
+from .models import Member
+
+NO_NODE = -1
+
+
+class Network:
+    """Compact arrays describing the binary tree; index ``i`` refers to ``user_ids[i]``."""
+
+    def __init__(self, user_ids, left, right, parent, active, rank_no):
+        self.user_ids = user_ids
+        self.left = left
+        self.right = right
+        self.parent = parent
+        self.active = active
+        self.rank_no = rank_no
+        self.size = len(user_ids)
+
+        self.subtree_total, self.subtree_active, self.depth = self._compute_subtree_aggregates()
+        self.left_total = self._child_values(self.left, self.subtree_total)
+        self.right_total = self._child_values(self.right, self.subtree_total)
+        self.left_active = self._child_values(self.left, self.subtree_active)
+        self.right_active = self._child_values(self.right, self.subtree_active)
+        self.pairs = np.minimum(self.left_active, self.right_active)
+        self.imbalance = np.abs(self.left_total - self.right_total)
+
+    @classmethod
+    def load(cls, queryset=None, chunk_size=10000):
+        """Load the tree from the database with a single streaming query."""
+        queryset = Member.objects.all() if queryset is None else queryset
+        rows = queryset.order_by().values_list(
+            'user_id', 'left_id', 'right_id', 'head_member_id', 'status', 'rank_no'
+        ).iterator(chunk_size=chunk_size)
+
+        user_ids, left_ids, right_ids, head_ids, active, rank_no = [], [], [], [], [], []
+        for user_id, left_id, right_id, head_id, status, rank in rows:
+            user_ids.append(user_id)
+            left_ids.append(left_id or 0)
+            right_ids.append(right_id or 0)
+            head_ids.append(head_id or 0)
+            active.append(status == 'Active')
+            rank_no.append(rank)
+
+        return cls.from_arrays(
+            np.array(user_ids, dtype=np.int64),
+            np.array(left_ids, dtype=np.int64),
+            np.array(right_ids, dtype=np.int64),
+            np.array(head_ids, dtype=np.int64),
+            np.array(active, dtype=bool),
+            np.array(rank_no, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_arrays(cls, user_ids, left_ids, right_ids, head_ids, active, rank_no):
+        """Build a network from user-id keyed arrays; a 0 id means no link."""
+        order = np.argsort(user_ids, kind='stable')
+        user_ids = user_ids[order]
+
+        def to_index(ids):
+            ids = ids[order]
+            positions = np.searchsorted(user_ids, ids)
+            positions = np.minimum(positions, max(len(user_ids) - 1, 0))
+            found = (ids != 0) & (user_ids[positions] == ids) if len(user_ids) else ids != 0
+            return np.where(found, positions, NO_NODE).astype(np.int64)
+
+        return cls(
+            user_ids, to_index(left_ids), to_index(right_ids), to_index(head_ids),
+            active[order], rank_no[order],
+        )
+
+    def _euler_tour_order(self):
+        """
+        Return the position of every event in the concatenated Euler tours of all trees.
+        Event ``i`` enters node ``i`` and event ``size + i`` leaves it.
+        """
+        n = self.size
+        nodes = np.arange(n, dtype=np.int64)
+        has_left = self.left != NO_NODE
+        has_right = self.right != NO_NODE
+
+        # Parents are derived from the child links so the tour always matches left/right.
+        parent = np.full(n, NO_NODE, dtype=np.int64)
+        parent[self.left[has_left]] = nodes[has_left]
+        parent[self.right[has_right]] = nodes[has_right]
+        is_left_child = np.zeros(n, dtype=bool)
+        is_left_child[self.left[has_left]] = True
+
+        successor = np.empty(2 * n, dtype=np.int64)
+        successor[:n] = np.where(has_left, self.left, np.where(has_right, self.right, n + nodes))
+        safe_parent = np.maximum(parent, 0)
+        successor[n:] = np.where(
+            parent == NO_NODE,
+            n + nodes,  # leaving a root ends its tour
+            np.where(is_left_child & has_right[safe_parent], self.right[safe_parent], n + safe_parent),
+        )
+
+        # Pointer jumping: afterwards ``successor`` is the last event of each tour (one per tree)
+        # and ``remaining`` is the number of events left until it.
+        remaining = (successor != np.arange(2 * n)).astype(np.int64)
+        while True:
+            jumped = successor[successor]
+            if np.array_equal(jumped, successor):
+                break
+            remaining += remaining[successor]
+            successor = jumped
+
+        order = np.lexsort((-remaining, successor))
+        position = np.empty(2 * n, dtype=np.int64)
+        position[order] = np.arange(2 * n)
+        return order, position
+
+    def _compute_subtree_aggregates(self):
+        """Subtree sizes, active counts and depths for every node from one Euler tour."""
+        n = self.size
+        if not n:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty.astype(np.int32)
+
+        order, position = self._euler_tour_order()
+        enter, leave = position[:n], position[n:]
+
+        total = (leave - enter + 1) // 2
+
+        events = np.zeros(2 * n, dtype=np.int64)
+        events[:n] = self.active
+        running = np.concatenate(([0], np.cumsum(events[order])))
+        active = running[leave + 1] - running[enter]
+
+        events[:n], events[n:] = 1, -1
+        depth = (np.cumsum(events[order])[enter] - 1).astype(np.int32)
+
+        return total, active, depth
+
+    def _child_values(self, children, values):
+        return np.where(children != NO_NODE, values[np.maximum(children, 0)], 0)
+
+    def index_of(self, user_id):
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position < self.size and self.user_ids[position] == user_id:
+            return position
+        raise KeyError(user_id)
+
+    def team_counts(self, user_id):
+        """Return the same dict shape as Member.count_team_members for both legs."""
+        i = self.index_of(user_id)
+        return {
+            'left': {
+                'active': int(self.left_active[i]),
+                'inactive': int(self.left_total[i] - self.left_active[i]),
+                'total': int(self.left_total[i]),
+            },
+            'right': {
+                'active': int(self.right_active[i]),
+                'inactive': int(self.right_total[i] - self.right_active[i]),
+                'total': int(self.right_total[i]),
+            },
+        }
+
+    def top(self, values, limit=10):
+        """Return (user_id, value) pairs for the ``limit`` largest entries of a per-node array."""
+        limit = min(limit, self.size)
+        if not limit:
+            return []
+        candidates = np.argpartition(values, -limit)[-limit:]
+        candidates = candidates[np.argsort(values[candidates])[::-1]]
+        return [(int(self.user_ids[i]), int(values[i])) for i in candidates]
+
+    def summary(self):
+        """Network-wide figures for management commands and the admin."""
+        return {
+            'members': self.size,
+            'active_members': int(self.active.sum()),
+            'roots': int((self.parent == NO_NODE).sum()),
+            'max_depth': int(self.depth.max()) if self.size else 0,
+            'mean_depth': float(self.depth.mean()) if self.size else 0.0,
+            'depth_distribution': np.bincount(self.depth).tolist() if self.size else [],
+            'total_pairs': int(self.pairs.sum()),
+            'members_with_pairs': int((self.pairs > 0).sum()),
+            'mean_imbalance': float(self.imbalance.mean()) if self.size else 0.0,
+            'rank_distribution': {
+                int(rank): int(count) for rank, count in zip(*np.unique(self.rank_no, return_counts=True))
+            },
+        }
@@ -0,0 +1,267 @@
+"""
+Upline payout engine.
+
+Plan activations and recharges are paid from a single traversal of the placement upline (one
+recursive query for a whole batch). Every ancestor on the way is checked against the direct, level,
+matching and resale rules as they stood at each activation, and all resulting credits are written
+together: one ledger posting, one IncomeHistory bulk insert and one bulk update of the matching
+counters.
+
+Plan and Level rows are read from a per-process cache (see config_cache) that saving or deleting a
+Plan or Level invalidates.
+"""
+import bisect
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef
+
+from .config_cache import VersionedConfig
+from .models import (
+    CENTS, IncomeHistory, LedgerLine, LedgerTransaction, Level, Member, MemberPlan, Plan, rank_ladder,
+)
+
+MATCHING_UPDATE_FIELDS = ['all_matching_pairs', 'matching_pairs', 'rank_no']
+
+# ``levels`` maps an upline depth to its (distributed_amount, resale_percentage).
+PlanConfig = namedtuple('PlanConfig', ['price', 'direct', 'matching', 'levels'])
+
+
+def load_payout_config():
+    plans = {plan.pk: PlanConfig(plan.price, plan.direct, plan.matching, {}) for plan in Plan.objects.all()}
+    for level in Level.objects.filter(plan__in=plans):
+        plans[level.plan_id].levels[level.level] = (
+            Decimal(str(level.distributed_amount)).quantize(CENTS),
+            Decimal(str(level.resale_percentage)),
+        )
+    return plans
+
+
+PAYOUT_CONFIG = VersionedConfig('mlm_app:payout_config_version', load_payout_config)
+
+
+def payout_config():
+    """Return {plan_id: PlanConfig} from the per-process cache."""
+    return PAYOUT_CONFIG.get()
+
+
+def invalidate_payout_config():
+    PAYOUT_CONFIG.invalidate()
+
+
+class Payout:
+    """Credits collected during one traversal, written by ``post``."""
+
+    def __init__(self):
+        self.credits = defaultdict(Decimal)  # (member_id, income_type) -> amount
+        self.history = []
+
+    def credit(self, member_id, income_type, amount, description=''):
+        if amount <= 0:
+            return
+        self.credits[member_id, income_type] += amount
+        self.history.append(IncomeHistory(
+            member_id=member_id, income_type=income_type, amount=amount, description=description
+        ))
+
+    @property
+    def total(self):
+        return sum(self.credits.values(), Decimal('0.00'))
+
+    def lines(self, account, funding_account):
+        """Ledger lines crediting ``account`` for every member and debiting the total from ``funding_account``."""
+        if not self.credits:
+            return []
+        lines = [
+            LedgerLine(member_id, account, amount, income_type)
+            for (member_id, income_type), amount in self.credits.items()
+        ]
+        lines.append(LedgerLine(None, funding_account, -self.total))
+        return lines
+
+    def post(self, kind, account, funding_account, description, reference=''):
+        """Credit ``account`` for every member and debit the total from ``funding_account``."""
+        if not self.credits:
+            return None
+        lines = self.lines(account, funding_account)
+        ledger_transaction = LedgerTransaction.post(kind, lines, description=description, reference=reference)
+        IncomeHistory.record(self.history)
+        return ledger_transaction
+
+
+class ActivationMoments:
+    """
+    Network state as it was when each activation of a batch happened, rebuilt from MemberPlan order.
+
+    Stored counters and statuses reflect every activation committed so far, so for the activation
+    with MemberPlan id ``k`` an ancestor was active only if it had a plan before ``k``, its last plan
+    is the last one before ``k``, and its leg counts exclude the first activations after ``k``.
+    """
+
+    def __init__(self, ancestors, after_id, before_id, read_counts=True):
+        self.plans = defaultdict(list)  # member_id -> [(member_plan_id, plan_id)] in id order
+        for member_id, member_plan_id, plan_id in MemberPlan.objects.filter(
+            member_id__in=ancestors, pk__lt=before_id
+        ).order_by('pk').values_list('member_id', 'pk', 'plan_id'):
+            self.plans[member_id].append((member_plan_id, plan_id))
+
+        # First activations after the oldest one in the batch, sorted by tree path so a leg is a range.
+        later = []
+        if read_counts:
+            earlier_plan = MemberPlan.objects.filter(member=OuterRef('member'), pk__lt=OuterRef('pk'))
+            later = sorted(
+                MemberPlan.objects.filter(pk__gt=after_id).exclude(Exists(earlier_plan))
+                .values_list('member__tree_path', 'pk')
+            )
+        self.later_paths = [path for path, _ in later]
+        self.later_ids = [member_plan_id for _, member_plan_id in later]
+        self.leg_ids = {}
+
+    def is_active(self, ancestor, member_plan_id):
+        if ancestor.status != 'Active':
+            return False
+        plans = self.plans[ancestor.pk]
+        # Members activated without a plan have always been active.
+        return ancestor.last_plan_id is None or (bool(plans) and plans[0][0] < member_plan_id)
+
+    def last_plan_id(self, ancestor, member_plan_id):
+        plans = self.plans[ancestor.pk]
+        index = bisect.bisect_left(plans, (member_plan_id,))
+        return plans[index - 1][1] if index else None
+
+    def active_counts(self, member, member_plan_id):
+        """The member's (left, right) active counts right after activation ``member_plan_id``."""
+        return (
+            member.left_active_count - self.activated_after(member.tree_path + 'L', member_plan_id),
+            member.right_active_count - self.activated_after(member.tree_path + 'R', member_plan_id),
+        )
+
+    def activated_after(self, prefix, member_plan_id):
+        ids = self.leg_ids.get(prefix)
+        if ids is None:
+            # Tree paths only hold digits, '/', 'L' and 'R', which all sort before '~'.
+            low = bisect.bisect_left(self.later_paths, prefix)
+            high = bisect.bisect_left(self.later_paths, prefix + '~')
+            ids = self.leg_ids[prefix] = sorted(self.later_ids[low:high])
+        return len(ids) - bisect.bisect_right(ids, member_plan_id)
+
+
+def pay_activation_commissions(member_plans):
+    """
+    Pay direct, level and matching income for a batch of activated MemberPlans. Must run inside a
+    transaction; callers make sure each activation is paid once (see process_commission_jobs).
+
+    Walking up from each activated member, stopping at the 'admin' user:
+      * the sponsor receives the plan's ``direct`` amount,
+      * the ancestor at depth N receives the plan's level-N ``distributed_amount``,
+      * ancestors with new pairs earn the matching amount of their own last plan per pair and advance
+        the rank ladder; an ancestor with new pairs but no plan stops matching for that chain.
+    Direct and level income are only paid to active members. Activations are paid in MemberPlan id
+    order against the network as it was at that moment (see ActivationMoments), so a batch pays
+    exactly what processing the activations one by one would.
+    """
+    if not member_plans:
+        return None
+
+    config = payout_config()
+    member_plans = sorted(member_plans, key=lambda member_plan: member_plan.pk)
+    starts = {
+        member.pk: member
+        for member in Member.objects.select_related('user').filter(
+            pk__in={member_plan.member_id for member_plan in member_plans}
+        )
+    }
+
+    chains = defaultdict(list)
+    ended = set()
+    for ancestor in Member.get_uplines(sorted(starts)):
+        if ancestor.upline_start_id in ended:
+            continue
+        if ancestor.upline_username == "admin":
+            ended.add(ancestor.upline_start_id)
+            continue
+        chains[ancestor.upline_start_id].append(ancestor)
+
+    ancestors = {ancestor.pk: ancestor for chain in chains.values() for ancestor in chain}
+    # Lock the members that may have unpaid pairs so concurrent workers never pay the same pairs twice.
+    candidates = {
+        member.pk: member
+        for member in Member.objects.select_for_update().filter(pk__in=[
+            ancestor.pk for ancestor in ancestors.values()
+            if min(ancestor.left_active_count, ancestor.right_active_count) > ancestor.all_matching_pairs
+        ]).order_by('pk')
+    }
+    moments = ActivationMoments(
+        ancestors, member_plans[0].pk, member_plans[-1].pk, read_counts=bool(candidates)
+    )
+
+    payout = Payout()
+    ladder = rank_ladder()
+    updated_members = {}
+    for member_plan in member_plans:
+        start = starts[member_plan.member_id]
+        plan = config.get(member_plan.plan_id)
+        matching = True
+        for ancestor in chains[start.pk]:
+            if plan is not None and moments.is_active(ancestor, member_plan.pk):
+                if ancestor.user_id == start.sponsor_id:
+                    payout.credit(ancestor.pk, 'direct_income', plan.direct,
+                                  f"Direct income from {start.user.username}")
+                level_amount, _ = plan.levels.get(ancestor.upline_depth, (Decimal('0.00'), None))
+                payout.credit(ancestor.pk, 'level_income', level_amount,
+                              f"Level {ancestor.upline_depth} income from {start.user.username}")
+
+            member = candidates.get(ancestor.pk)
+            if not matching or member is None:
+                continue
+            new_matching_pairs = min(moments.active_counts(member, member_plan.pk)) - member.all_matching_pairs
+            if new_matching_pairs <= 0:
+                continue
+            own_plan = config.get(moments.last_plan_id(ancestor, member_plan.pk))
+            if own_plan is None:
+                matching = False
+                continue
+
+            member.all_matching_pairs += new_matching_pairs
+            member.rank_no, member.matching_pairs = ladder.advance(
+                member.rank_no, member.matching_pairs, new_matching_pairs
+            )
+            payout.credit(member.pk, 'matching_income', own_plan.matching * new_matching_pairs)
+            updated_members[member.pk] = member
+
+    Member.objects.bulk_update(updated_members.values(), MATCHING_UPDATE_FIELDS)
+    return payout.post(
+        'commission', 'account_balance', 'company',
+        f"Commissions for {len(member_plans)} plan activations",
+    )
+
+
+def recharge_commissions(pools):
+    """
+    Share the resale pool credits of a batch of recharges with the uplines, from one upline query.
+    ``pools`` are (member, pool_amount) pairs, pool_amount being the part of the member's recharge
+    credited to the resale pool. The active ancestor at depth N receives the level-N
+    ``resale_percentage`` of its own last plan, taken of ``pool_amount``, until that amount is used
+    up. Returns the unposted Payout, to be credited to wallets and funded from the resale pool.
+    """
+    config = payout_config()
+    chains = defaultdict(list)
+    for ancestor in Member.get_uplines(list({member.pk for member, _ in pools})):
+        chains[ancestor.upline_start_id].append(ancestor)
+
+    payout = Payout()
+    for member, pool_amount in pools:
+        remaining = pool_amount
+        for ancestor in chains[member.pk]:
+            if ancestor.upline_username == "admin" or remaining <= 0:
+                break
+            plan = config.get(ancestor.last_plan_id)
+            if plan is None or ancestor.status != 'Active':
+                continue
+            _, percentage = plan.levels.get(ancestor.upline_depth, (None, Decimal('0')))
+            amount = min((pool_amount * percentage / 100).quantize(CENTS), remaining)
+            if amount > 0:
+                payout.credit(ancestor.pk, 'resale_income', amount,
+                              f"Level {ancestor.upline_depth} resale income from {member.user.username}")
+                remaining -= amount
+    return payout
@@ -0,0 +1,346 @@
+"""
+Mobile recharge pipeline.
+
+No database lock is held while the provider works:
+
+  1. ``reserve_recharge`` moves the amount from the member's wallet to the 'recharge_hold' ledger
+     account and stores a pending RechargeTransaction, in one short transaction.
+  2. ``submit_recharge`` sends the order to the provider outside any transaction.
+  3. ``settle_recharge`` applies a final provider status: on success the held amount goes to the
+     provider and the resale share and upline commissions are paid; on failure it is refunded.
+
+Answers that leave the outcome open (a pending status, a timeout) keep the order pending; the
+reconcile_recharges command polls those with check_recharge_status and settles them. A status the
+provider is not known to send is logged and parks the order for manual review instead, where staff
+settle it with ``resolve_recharge``.
+
+Bulk recharges take the same steps for a batch of rows: ``reserve_recharges`` holds their total
+with one ledger posting and inserts them together, ``submit_recharges`` sends them to the provider
+from a bounded thread pool sharing the pooled provider client, and ``settle_recharges`` applies
+the answers in one transaction. However many recharges a settlement covers, it posts one ledger
+transaction for them and finds their uplines with one query.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ewe_functions import create_order_id, recharge_mobile
+from .sequences import order_ids
+from .models import CENTS, IncomeHistory, LedgerLine, LedgerTransaction, RechargeTransaction
+from .payouts import recharge_commissions
+
+logger = logging.getLogger(__name__)
+
+SETTLED_STATUSES = ['success', 'failed']
+BULK_RECHARGE_MAX_ROWS = 100
+BULK_RECHARGE_WORKERS = 8
+
+# Statuses the provider and our client send, normalized to lower case without surrounding spaces.
+PROVIDER_STATUSES = {
+    'success': 'success',
+    'successful': 'success',
+    'succeeded': 'success',
+    'completed': 'success',
+    'failed': 'failed',
+    'failure': 'failed',
+    'fail': 'failed',
+    'refunded': 'failed',
+    'refund': 'failed',
+    'reversed': 'failed',
+    'rejected': 'failed',
+    'cancelled': 'failed',
+    'canceled': 'failed',
+    'pending': 'pending',
+    'processing': 'pending',
+    'in process': 'pending',
+    'in_process': 'pending',
+    'accepted': 'pending',
+    'submitted': 'pending',
+    'queued': 'pending',
+    'initiated': 'pending',
+}
+
+
+def provider_status(response):
+    """
+    'success' or 'failed' when the provider response is final, 'pending' while the outcome is open
+    (including answers without a status, such as a failed status check), and 'review' for a status
+    the provider is not known to send, which is logged.
+    """
+    raw_status = response.get('status')
+    if raw_status is None or not str(raw_status).strip():
+        return 'pending'
+    status = PROVIDER_STATUSES.get(str(raw_status).strip().lower())
+    if status is None:
+        logger.warning("Unknown recharge provider status %r; sending the order to manual review.", raw_status)
+        return 'review'
+    return status
+
+
+def reserve_recharge(member, mobile_no, amount, company_name, is_stv=False):
+    """
+    Hold ``amount`` of the member's wallet and record a pending recharge. Raises InsufficientFunds
+    when the wallet cannot cover it.
+    """
+    with transaction.atomic():
+        order_id = create_order_id()
+        LedgerTransaction.post('recharge_reserve', [
+            LedgerLine(member.pk, 'wallet_balance', -amount),
+            LedgerLine(None, 'recharge_hold', amount),
+        ], description=f'Recharge of {mobile_no}', reference=order_id)
+
+        return RechargeTransaction.objects.create(
+            user=member.user,
+            mobile_no=mobile_no,
+            amount=amount,
+            company_name=company_name,
+            is_stv=is_stv,
+            order_id=order_id,
+            status='pending',
+        )
+
+
+def reserve_recharges(member, rows):
+    """
+    Hold the total of ``rows`` (cleaned MobileRechargeForm data) with one ledger posting and record
+    their pending recharges with one insert. Raises InsufficientFunds when the wallet cannot cover
+    the whole batch, in which case nothing is reserved.
+    """
+    with transaction.atomic():
+        # One sequence reservation at most for the whole batch.
+        recharges = [
+            RechargeTransaction(
+                user=member.user,
+                mobile_no=row['mobile_no'],
+                amount=row['amount'],
+                company_name=row['company_name'],
+                is_stv=row.get('is_stv', False),
+                order_id=str(order_id),
+                status='pending',
+            )
+            for row, order_id in zip(rows, order_ids.take(len(rows)))
+        ]
+        total = sum(recharge.amount for recharge in recharges)
+        LedgerTransaction.post('recharge_reserve', [
+            LedgerLine(member.pk, 'wallet_balance', -total),
+            LedgerLine(None, 'recharge_hold', total),
+        ], description=f'Bulk recharge of {len(recharges)} numbers',
+            reference=f'{recharges[0].order_id}-{recharges[-1].order_id}')
+        return RechargeTransaction.objects.bulk_create(recharges)
+
+
+def submit_recharge(recharge):
+    """
+    Send a reserved recharge to the provider and settle it if the answer is final. Must not run
+    inside a transaction. Returns the updated recharge and the provider response.
+    """
+    RechargeTransaction.objects.filter(pk=recharge.pk).update(submitted_at=timezone.now())
+    response = recharge_mobile(
+        recharge.mobile_no, recharge.amount, recharge.company_name, recharge.order_id, recharge.is_stv
+    )
+    return settle_recharge(recharge.pk, response), response
+
+
+def call_provider(recharge):
+    try:
+        return recharge_mobile(
+            recharge.mobile_no, recharge.amount, recharge.company_name, recharge.order_id, recharge.is_stv
+        )
+    except Exception as e:
+        # The order stays pending and reconcile_recharges settles it.
+        return {'status': 'pending', 'error': str(e)}
+
+
+def submit_recharges(recharges, max_workers=BULK_RECHARGE_WORKERS):
+    """
+    Send reserved ``recharges`` to the provider concurrently, at most ``max_workers`` at a time, and
+    settle the final answers. Must not run inside a transaction. Returns the updated recharges and
+    the provider responses, in the order given.
+    """
+    RechargeTransaction.objects.filter(pk__in=[recharge.pk for recharge in recharges]).update(
+        submitted_at=timezone.now()
+    )
+    # The workers only talk to the provider; all database work stays on this thread.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(call_provider, recharges))
+
+    settled = settle_recharges({recharge.pk: response for recharge, response in zip(recharges, responses)})
+    return [settled[recharge.pk] for recharge in recharges], responses
+
+
+def settle_recharge(recharge_pk, response):
+    """
+    Apply a provider ``response`` to a pending recharge. Orders already settled are left alone, so
+    the web request and reconcile_recharges may both report the same order. Responses that leave the
+    outcome open never replace what the provider answered before (see set_response).
+    """
+    status = provider_status(response)
+    with transaction.atomic():
+        recharge = RechargeTransaction.objects.select_for_update().select_related('user__mlm_profile').get(
+            pk=recharge_pk
+        )
+        if recharge.status != 'pending':
+            return recharge
+
+        recharge.set_response(response, final=status != 'pending')
+        if status in ('pending', 'review'):
+            recharge.status = status
+            recharge.save(update_fields=RechargeTransaction.RESPONSE_FIELDS + ['status'])
+            return recharge
+
+        income = apply_status([recharge], status)
+        recharge.save(update_fields=RechargeTransaction.RESPONSE_FIELDS + ['status', 'settled_at'])
+        if income:
+            IncomeHistory.record(income)
+    return recharge
+
+
+def settle_recharges(responses):
+    """
+    Apply provider responses, keyed by recharge pk, in one transaction: the successes are paid with
+    one ledger posting, the failures refunded with another, and the recharges updated and their
+    income recorded with one statement each. Returns the recharges by pk.
+    """
+    with transaction.atomic():
+        recharges = RechargeTransaction.objects.select_for_update().select_related('user__mlm_profile').filter(
+            pk__in=list(responses)
+        ).order_by('id')
+        recharges = {recharge.pk: recharge for recharge in recharges}
+
+        changed = []
+        settled = {status: [] for status in SETTLED_STATUSES}
+        for pk, response in responses.items():
+            recharge = recharges[pk]
+            if recharge.status != 'pending':
+                continue
+            status = provider_status(response)
+            recharge.set_response(response, final=status != 'pending')
+            if status in SETTLED_STATUSES:
+                settled[status].append(recharge)
+            else:
+                recharge.status = status
+            changed.append(recharge)
+
+        income = []
+        for status, batch in settled.items():
+            if batch:
+                income += apply_status(batch, status)
+
+        RechargeTransaction.objects.bulk_update(
+            changed, RechargeTransaction.RESPONSE_FIELDS + ['status', 'settled_at']
+        )
+        if income:
+            IncomeHistory.record(income)
+    return recharges
+
+
+def resolve_recharge(recharge_pk, status):
+    """
+    Settle a recharge held for manual review as 'success' or 'failed', once staff have confirmed the
+    outcome with the provider. Returns the recharge; orders no longer in review are left alone.
+    """
+    if status not in SETTLED_STATUSES:
+        raise ValueError(f"Status must be one of {SETTLED_STATUSES}.")
+    with transaction.atomic():
+        recharge = RechargeTransaction.objects.select_for_update().select_related('user__mlm_profile').get(
+            pk=recharge_pk
+        )
+        if recharge.status != 'review':
+            return recharge
+
+        income = apply_status([recharge], status)
+        recharge.save(update_fields=['status', 'settled_at'])
+        if income:
+            IncomeHistory.record(income)
+    return recharge
+
+
+def apply_status(recharges, status):
+    """
+    Post the ledger transaction of a final ``status`` shared by ``recharges`` and mark them settled,
+    unsaved. Returns the unsaved IncomeHistory rows to record.
+    """
+    income = []
+    if status == 'success':
+        income = pay_recharges(recharges)
+    else:
+        LedgerTransaction.post('recharge_refund', [
+            line
+            for recharge in recharges
+            for line in (
+                LedgerLine(None, 'recharge_hold', -recharge.amount),
+                LedgerLine(recharge.user.mlm_profile.pk, 'wallet_balance', recharge.amount),
+            )
+        ], **posting_details(recharges, 'Refund of failed recharge'))
+
+    settled_at = timezone.now()
+    for recharge in recharges:
+        recharge.status = status
+        recharge.settled_at = settled_at
+    return income
+
+
+def posting_details(recharges, action):
+    """Description and reference of a ledger transaction covering ``recharges``."""
+    if len(recharges) == 1:
+        return {'description': f'{action} of {recharges[0].mobile_no}', 'reference': recharges[0].order_id}
+    return {
+        'description': f'{action} of {len(recharges)} numbers',
+        'reference': f'{recharges[0].order_id}-{recharges[-1].order_id}',
+    }
+
+
+def recharge_result(recharge, response):
+    """JSON-serialisable outcome of one recharge of a bulk request."""
+    result = {
+        'order_id': recharge.order_id,
+        'mobile_no': recharge.mobile_no,
+        'amount': str(recharge.amount),
+        'company_name': recharge.company_name,
+        'status': recharge.status,
+    }
+    if recharge.status != 'success' and response.get('error'):
+        result['error'] = str(response['error'])
+    return result
+
+
+def resale_share(amount):
+    """The company's share of a recharge ``amount`` and the part of it paid to the recharging member."""
+    calculate_sharable_amount = (amount * 4 / 100).quantize(CENTS)  # 4% of amount
+    resale_income = (calculate_sharable_amount * 50 / 100).quantize(CENTS)  # 50% of sharable amount
+    return calculate_sharable_amount, resale_income
+
+
+def pay_recharges(recharges):
+    """
+    Release the held amounts of successful ``recharges`` to the provider and pay their resale shares
+    and upline commissions, with one ledger posting and one upline query. Returns the unsaved
+    IncomeHistory rows of the recharging members and their uplines.
+    """
+    lines, income, pools = [], [], []
+    for recharge in recharges:
+        member = recharge.user.mlm_profile
+        calculate_sharable_amount, resale_income = resale_share(recharge.amount)
+        pool_amount = calculate_sharable_amount - resale_income
+        lines += [
+            LedgerLine(None, 'recharge_hold', -recharge.amount),
+            LedgerLine(None, 'provider', recharge.amount),
+            LedgerLine(None, 'company', -calculate_sharable_amount),
+            LedgerLine(member.pk, 'wallet_balance', resale_income, 'resale_income'),
+            # The rest of the share is held for distribution to the upline.
+            LedgerLine(None, 'resale_pool', pool_amount),
+        ]
+        income.append(IncomeHistory(
+            member=member,
+            income_type='resale_income',
+            amount=resale_income,
+            description=f'Resale income from recharge of {recharge.mobile_no}'
+        ))
+        pools.append((member, pool_amount))
+
+    payout = recharge_commissions(pools)
+    lines += payout.lines('wallet_balance', 'resale_pool')
+    LedgerTransaction.post('recharge', lines, **posting_details(recharges, 'Recharge'))
+    return income + payout.history
@@ -0,0 +1,76 @@
+"""
+Block-allocated ID sequences.
+
+Order IDs and generated usernames are taken from named IdSequence rows. A process reserves a block
+of values with one locked update and then hands them out from memory, so the hot path needs no
+reads and no existence checks. Blocks never overlap, so values are unique across worker processes;
+values a process had not handed out when it exits are skipped, which leaves gaps but never
+duplicates.
+
+The rest of a freshly reserved block is only kept once the reserving transaction commits. If that
+transaction rolls back, so does the reservation, and another process may be given the same block.
+"""
+import threading
+
+from django.db import transaction
+
+from .models import IdSequence
+
+
+class BlockSequence:
+    def __init__(self, name, start, block_size):
+        self.name = name
+        self.start = start
+        self.block_size = block_size
+        self.next_value = self.end = 0
+        self.lock = threading.Lock()
+
+    def next(self):
+        return self.take(1)[0]
+
+    def take(self, count):
+        """
+        Return ``count`` values, reserving at most one new block. Use this rather than repeated
+        ``next`` calls inside one transaction, where each reservation is only kept on commit.
+        """
+        with self.lock:
+            available = min(count, self.end - self.next_value)
+            values = list(range(self.next_value, self.next_value + available))
+            self.next_value += available
+
+        missing = count - len(values)
+        if missing:
+            start, end = self.reserve(max(missing, self.block_size))
+            values.extend(range(start, start + missing))
+            transaction.on_commit(lambda: self.keep(start + missing, end))
+        return values
+
+    def reserve(self, size):
+        """Reserve the next ``size`` values in the database and return their bounds."""
+        with transaction.atomic():
+            sequence, _ = IdSequence.objects.select_for_update().get_or_create(
+                name=self.name, defaults={'next_value': self.start}
+            )
+            start = sequence.next_value
+            sequence.next_value = start + size
+            sequence.save(update_fields=['next_value'])
+        return start, sequence.next_value
+
+    def keep(self, start, end):
+        with self.lock:
+            # Another thread may have stored a block meanwhile; the unused one is then skipped.
+            if self.next_value >= self.end and start < end:
+                self.next_value, self.end = start, end
+
+    def advance(self, value):
+        """Never hand out values below ``value``, e.g. after importing rows that already use them."""
+        IdSequence.objects.filter(name=self.name, next_value__lt=value).update(next_value=value)
+        with self.lock:
+            if self.next_value < value:
+                self.next_value = self.end = 0
+
+
+# Random order IDs were 10 digits and random usernames 'EWE' + 6 digits, so both sequences start
+# above those ranges.
+order_ids = BlockSequence('order_id', start=10**10, block_size=100)
+usernames = BlockSequence('username', start=10**6, block_size=20)
@@ -0,0 +1,294 @@
+"""
+What-if commission simulator.
+
+A NetworkSnapshot copies the binary tree and member state into plain Python lists indexed by
+position. ``simulate`` replays a stream of plan activations against a copy of that
+state with the rules of the payout engine (direct to the sponsor, per-level amounts by upline depth,
+matching per new pair with rank promotion, stopping at the 'admin' user), keeping money in integer
+paise. Nothing is written to the database, so scenarios with different plan, level or rank settings
+can be swept side by side in worker processes.
+"""
+import multiprocessing
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.db import connections
+
+from .models import CENTS, CompanyWallet, Member, MemberPlan, RankAndRewards, RankLadder
+from .payouts import load_payout_config
+
+NO_NODE = -1
+INCOME_TYPES = ['direct_income', 'level_income', 'matching_income']
+
+
+def to_paise(amount):
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def from_paise(paise):
+    return (Decimal(paise) / 100).quantize(CENTS)
+
+
+class NetworkSnapshot:
+    """Tree and member state captured in one pass over the database."""
+
+    def __init__(self, member_ids, parent, side, sponsor, is_admin, state, starting_balance=0):
+        self.member_ids = member_ids
+        self.parent = parent
+        self.side = side  # 0 when the member is its parent's left child, 1 for the right child
+        self.sponsor = sponsor
+        self.is_admin = is_admin
+        self.state = state
+        self.starting_balance = starting_balance
+        self.size = len(member_ids)
+        self.position = {pk: i for i, pk in enumerate(member_ids)}
+
+    @classmethod
+    def load(cls, historical=True):
+        """
+        With ``historical`` every member starts inactive with empty counters, ready to replay
+        ``history``; otherwise the state is the current one, for ``synthetic_activations``.
+        """
+        rows = list(Member.objects.order_by('pk').values_list(
+            'pk', 'user_id', 'head_member_id', 'sponsor_id', 'left_id', 'user__username', 'status',
+            'left_active_count', 'right_active_count', 'all_matching_pairs', 'matching_pairs', 'rank_no',
+        ).iterator(chunk_size=10000))
+        index = {row[1]: i for i, row in enumerate(rows)}
+
+        member_ids = [row[0] for row in rows]
+        parent = [index.get(row[2], NO_NODE) for row in rows]
+        side = [0 if p != NO_NODE and rows[p][4] == row[1] else 1 for row, p in zip(rows, parent)]
+        sponsor = [index.get(row[3], NO_NODE) for row in rows]
+        is_admin = [row[5] == 'admin' for row in rows]
+
+        snapshot = cls(member_ids, parent, side, sponsor, is_admin, {})
+        if historical:
+            state = {
+                'active': [False] * len(rows),
+                'left_active': [0] * len(rows),
+                'right_active': [0] * len(rows),
+                'all_matching_pairs': [0] * len(rows),
+                'matching_pairs': [0] * len(rows),
+                'rank_no': [0] * len(rows),
+                'last_plan': [None] * len(rows),
+            }
+        else:
+            last_plan = [None] * len(rows)
+            for member, plan_id, _ in snapshot.history():
+                last_plan[member] = plan_id
+            state = {
+                'active': [row[6] == 'Active' for row in rows],
+                'left_active': [row[7] for row in rows],
+                'right_active': [row[8] for row in rows],
+                'all_matching_pairs': [row[9] for row in rows],
+                'matching_pairs': [row[10] for row in rows],
+                'rank_no': [row[11] for row in rows],
+                'last_plan': last_plan,
+            }
+            snapshot.starting_balance = to_paise(CompanyWallet.current_balance())
+
+        snapshot.state = state
+        return snapshot
+
+    def history(self, after_id=0, before_id=None, chunk_size=10000):
+        """Stream MemberPlan activations in id order as (position, plan_id, member_plan_id)."""
+        member_plans = MemberPlan.objects.filter(pk__gt=after_id)
+        if before_id is not None:
+            member_plans = member_plans.filter(pk__lt=before_id)
+        for pk, member_id, plan_id in member_plans.order_by('pk').values_list(
+            'pk', 'member_id', 'plan_id'
+        ).iterator(chunk_size=chunk_size):
+            yield self.position[member_id], plan_id, pk
+
+    def synthetic_activations(self, count, plan_id, seed=None):
+        """Activate ``count`` random inactive members with ``plan_id``, in random order."""
+        inactive = [i for i, active in enumerate(self.state['active']) if not active and not self.is_admin[i]]
+        chosen = random.Random(seed).sample(inactive, min(count, len(inactive)))
+        return [(i, plan_id) for i in chosen]
+
+
+def load_config():
+    """The current plan configuration and rank ladder, as used by the payout engine."""
+    return load_payout_config(), RankLadder.load()
+
+
+def apply_overrides(plans, ladder, overrides):
+    """
+    Return copies of ``plans`` and ``ladder`` changed by a scenario such as
+    {"matching": {"1": 60}, "direct": {"1": 0}, "levels": {"1": {"2": [5, 0.5]}}, "rank_pairs": {"1": 4}},
+    where plans are keyed by id and levels by depth.
+    """
+    plans = {plan_id: plan._replace(levels=dict(plan.levels)) for plan_id, plan in plans.items()}
+    for field in ('price', 'direct', 'matching'):
+        for plan_id, value in overrides.get(field, {}).items():
+            plans[int(plan_id)] = plans[int(plan_id)]._replace(**{field: Decimal(str(value))})
+    for plan_id, levels in overrides.get('levels', {}).items():
+        for level, (amount, percentage) in levels.items():
+            plans[int(plan_id)].levels[int(level)] = (Decimal(str(amount)), Decimal(str(percentage)))
+
+    rank_pairs = {int(rank_no): pairs for rank_no, pairs in overrides.get('rank_pairs', {}).items()}
+    if rank_pairs:
+        ladder = RankLadder([
+            RankAndRewards(rank_no=rank.rank_no, rank_name=rank.rank_name, pairs=rank_pairs.get(rank.rank_no, rank.pairs))
+            for rank in ladder.ranks
+        ])
+    return plans, ladder
+
+
+class Replay:
+    """
+    Replay state on top of a NetworkSnapshot. ``activate`` applies one plan activation and records
+    what every member earns by income type, in paise.
+    """
+
+    def __init__(self, snapshot, plans, ladder, state=None):
+        self.snapshot = snapshot
+        self.ladder = ladder
+        self.state = {key: list(values) for key, values in (state or snapshot.state).items()}
+        for income_type in INCOME_TYPES:
+            self.state.setdefault(income_type, [0] * snapshot.size)
+        self.plans = {
+            plan_id: (
+                to_paise(plan.price), to_paise(plan.direct), to_paise(plan.matching),
+                {level: to_paise(amount) for level, (amount, _) in plan.levels.items()},
+            )
+            for plan_id, plan in plans.items()
+        }
+
+    def export_state(self):
+        """The state keyed by member id, JSON-serializable, for ``restore``."""
+        return {'members': self.snapshot.member_ids, **self.state}
+
+    @classmethod
+    def restore(cls, snapshot, plans, ladder, exported):
+        """Continue from exported state; members that joined since keep the snapshot's state."""
+        replay = cls(snapshot, plans, ladder)
+        for i, member_id in enumerate(exported['members']):
+            position = snapshot.position.get(member_id)
+            if position is None:
+                continue
+            for key, values in exported.items():
+                if key in replay.state:
+                    replay.state[key][position] = values[i]
+        return replay
+
+    def activate(self, member, plan_id):
+        """Apply one activation; returns (price, paid) in paise, or None for an unknown plan."""
+        plan = self.plans.get(plan_id)
+        if plan is None:
+            return None
+        price, direct, _, levels = plan
+        state = self.state
+        active, last_plan = state['active'], state['last_plan']
+        left_active, right_active = state['left_active'], state['right_active']
+        all_matching_pairs, matching_pairs, rank_no = state['all_matching_pairs'], state['matching_pairs'], state['rank_no']
+        direct_income, level_income, matching_income = (state[income_type] for income_type in INCOME_TYPES)
+        parent, side, sponsor, is_admin = self.snapshot.parent, self.snapshot.side, self.snapshot.sponsor, self.snapshot.is_admin
+
+        newly_active = not active[member]
+        active[member] = True
+        last_plan[member] = plan_id
+
+        paid = 0
+        child, node, depth = member, parent[member], 1
+        paying = matching = True
+        while node != NO_NODE:
+            if newly_active:
+                if side[child] == 0:
+                    left_active[node] += 1
+                else:
+                    right_active[node] += 1
+            if paying and is_admin[node]:
+                paying = False
+            if paying:
+                if active[node]:
+                    income = levels.get(depth, 0)
+                    level_income[node] += income
+                    if node == sponsor[member]:
+                        direct_income[node] += direct
+                        income += direct
+                    paid += income
+                if matching:
+                    new_pairs = min(left_active[node], right_active[node]) - all_matching_pairs[node]
+                    if new_pairs > 0:
+                        own_plan = self.plans.get(last_plan[node])
+                        if own_plan is None:
+                            matching = False
+                        else:
+                            income = own_plan[2] * new_pairs
+                            matching_income[node] += income
+                            paid += income
+                            all_matching_pairs[node] += new_pairs
+                            rank_no[node], matching_pairs[node] = self.ladder.advance(
+                                rank_no[node], matching_pairs[node], new_pairs
+                            )
+            elif not newly_active:
+                break
+            child, node, depth = node, parent[node], depth + 1
+
+        return price, paid
+
+
+def simulate(snapshot, activations, plans, ladder, trajectory_points=50):
+    """
+    Replay ``activations`` ((position, plan_id) pairs) one at a time and return a report with payouts
+    by income type, the company wallet trajectory and the final rank distribution.
+    """
+    replay = Replay(snapshot, plans, ladder)
+    balance = snapshot.starting_balance
+    step = max(1, len(activations) // trajectory_points)
+    trajectory = [(0, balance)]
+
+    for count, (member, plan_id) in enumerate(activations, start=1):
+        result = replay.activate(member, plan_id)
+        if result is not None:
+            price, paid = result
+            balance += price - paid
+        if count % step == 0 or count == len(activations):
+            trajectory.append((count, balance))
+
+    earned = [replay.state[income_type] for income_type in INCOME_TYPES]
+    payouts = {income_type: sum(values) for income_type, values in zip(INCOME_TYPES, earned)}
+    return {
+        'activations': len(activations),
+        'payouts': {income_type: from_paise(amount) for income_type, amount in payouts.items()},
+        'total_payout': from_paise(sum(payouts.values())),
+        'members_paid': sum(1 for amounts in zip(*earned) if any(amounts)),
+        'company_balance': from_paise(balance),
+        'lowest_company_balance': from_paise(min(point for _, point in trajectory)),
+        'company_trajectory': [(count, from_paise(point)) for count, point in trajectory],
+        'rank_distribution': dict(sorted(Counter(replay.state['rank_no']).items())),
+    }
+
+
+_worker = {}
+
+
+def _init_worker(snapshot, activations, plans, ladder):
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+    _worker.update(snapshot=snapshot, activations=activations, plans=plans, ladder=ladder)
+
+
+def _simulate_scenario(scenario):
+    plans, ladder = apply_overrides(_worker['plans'], _worker['ladder'], scenario.get('overrides', {}))
+    report = simulate(_worker['snapshot'], _worker['activations'], plans, ladder)
+    report['scenario'] = scenario.get('name', '')
+    return report
+
+
+def sweep(snapshot, activations, plans, ladder, scenarios, workers=1):
+    """Simulate every scenario ({"name": ..., "overrides": {...}}) and return the reports in order."""
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        _worker.update(snapshot=snapshot, activations=activations, plans=plans, ladder=ladder)
+        return [_simulate_scenario(scenario) for scenario in scenarios]
+
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker, initargs=(snapshot, activations, plans, ladder),
+    )
+    with pool:
+        return list(pool.map(_simulate_scenario, scenarios))
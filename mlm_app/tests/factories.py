@@ -0,0 +1,57 @@
+"""Helpers that build small networks the way registration and plan activation do."""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from mlm_app.models import RANK_LADDER, CompanyWallet, Level, Member, MemberPlan, Plan, RankAndRewards
+from mlm_app.payouts import invalidate_payout_config
+
+
+def create_admin():
+    """The 'admin' root member, plus a funded company wallet."""
+    # Configuration cached in memory by an earlier test was rolled back with its database.
+    RANK_LADDER.invalidate()
+    invalidate_payout_config()
+    user = User.objects.create(username='admin')
+    CompanyWallet.objects.update_or_create(id=1, defaults={'balance': Decimal('1000000000.00')})
+    # New profiles start with an empty mobile number, which is unique, so give the root its own.
+    Member.objects.filter(user=user).update(mobile_no='9000000000')
+    return Member.objects.get(user=user)
+
+
+def create_plan(name='Basic', price=1000, direct=100, matching=50, levels=5):
+    plan = Plan.objects.create(name=name, price=price, direct=direct, matching=matching)
+    for depth in range(1, levels + 1):
+        Level.objects.create(plan=plan, level=depth, distributed_amount=10 * depth, resale_percentage=depth)
+    return plan
+
+
+def create_ranks(pairs=(1, 3, 5)):
+    for rank_no, rank_pairs in enumerate(pairs, start=1):
+        RankAndRewards.objects.create(rank_no=rank_no, rank_name=f'Rank {rank_no}', pairs=rank_pairs)
+
+
+def register(sponsor, position, username):
+    """Create a member sponsored by ``sponsor`` and place it on ``position`` of the sponsor's tree."""
+    user = User.objects.create(username=username)
+    member = Member.objects.get(user=user)
+    member.mobile_no = str(9100000000 + user.pk)
+    member.sponsor = sponsor.user
+    member.position = position
+    Member.objects.get(pk=sponsor.pk).place_member(member, position)
+    member.save()
+    return member
+
+
+def register_random(root, count, seed=0):
+    """Register ``count`` members under random sponsors and legs; returns them in joining order."""
+    rng = random.Random(seed)
+    members = [root]
+    for index in range(count):
+        members.append(register(rng.choice(members), rng.choice(['Left', 'Right']), f'member{index}'))
+    return members[1:]
+
+
+def activate(member, plan):
+    return MemberPlan.objects.create(member=Member.objects.get(pk=member.pk), plan=plan)
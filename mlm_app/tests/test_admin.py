@@ -0,0 +1,56 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from mlm_app.models import LedgerTransaction, Member
+
+from .factories import create_admin, register
+
+
+class MemberAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        cls.members = [register(admin, position, f'member-{position}') for position in ('Left', 'Right')]
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'Staff-pass-123')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def adjust(self, **data):
+        return self.client.post(reverse('admin:mlm_app_member_changelist'), {
+            'action': 'adjust_balances', ACTION_CHECKBOX_NAME: [member.pk for member in self.members], **data,
+        })
+
+    def test_money_columns_are_read_only(self):
+        response = self.client.get(reverse('admin:mlm_app_member_change', args=[self.members[0].pk]))
+        form = response.context['adminform'].form
+        for field in ('account_balance', 'wallet_balance', 'today_income', 'total_income', 'direct_income',
+                      'level_income', 'resale_income', 'matching_income', 'total_withdrawal'):
+            self.assertNotIn(field, form.fields)
+
+    def test_action_asks_for_the_adjustment_first(self):
+        response = self.adjust()
+        self.assertTemplateUsed(response, 'admin/mlm_app/member/adjust_balances.html')
+        self.assertFalse(LedgerTransaction.objects.filter(kind='adjustment').exists())
+
+    def test_adjustment_is_posted_to_the_ledger(self):
+        self.adjust(apply='1', account='wallet_balance', amount='150.00', description='Goodwill credit')
+
+        ledger_transaction = LedgerTransaction.objects.get(kind='adjustment')
+        self.assertEqual(ledger_transaction.description, 'Goodwill credit')
+        for member in self.members:
+            self.assertEqual(Member.objects.get(pk=member.pk).wallet_balance, Decimal('150.00'))
+        output = StringIO()
+        call_command('audit_ledger', stdout=output)
+        self.assertIn('0 members differ from the ledger; 0 unbalanced transactions.', output.getvalue())
+
+    def test_debit_beyond_the_balance_is_refused(self):
+        self.adjust(apply='1', account='account_balance', amount='-10.00', description='Correction')
+        self.assertFalse(LedgerTransaction.objects.filter(kind='adjustment').exists())
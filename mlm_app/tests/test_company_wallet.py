@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from mlm_app.management.commands.rollup_company_wallet import rollup_company_wallet
+from mlm_app.models import CompanyWallet
+
+
+class CurrentBalanceTests(TestCase):
+
+    def test_balance_without_a_snapshot_row(self):
+        CompanyWallet.add_to_wallet(Decimal('25.00'))
+        with self.assertNumQueries(1):
+            self.assertEqual(CompanyWallet.current_balance(), Decimal('25.00'))
+
+    def test_snapshot_and_tail_are_read_in_one_statement(self):
+        CompanyWallet.objects.create(id=1, balance=Decimal('100.00'))
+        self.assertEqual(CompanyWallet.current_balance(), Decimal('100.00'))
+
+        CompanyWallet.add_to_wallet(Decimal('40.00'))
+        CompanyWallet.deduct_from_wallet(Decimal('15.50'))
+        with self.assertNumQueries(1):
+            self.assertEqual(CompanyWallet.current_balance(), Decimal('124.50'))
+
+        rollup_company_wallet(batch_size=1)
+        self.assertEqual(CompanyWallet.objects.get(id=1).balance, Decimal('124.50'))
+        self.assertEqual(CompanyWallet.current_balance(), Decimal('124.50'))
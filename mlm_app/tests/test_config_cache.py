@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from mlm_app.models import RANK_LADDER, RankAndRewards, rank_ladder
+
+
+class VersionedConfigTests(TestCase):
+
+    def setUp(self):
+        RANK_LADDER.invalidate()
+
+    def test_warm_copy_needs_no_queries(self):
+        rank_ladder()
+        with self.assertNumQueries(0):
+            rank_ladder()
+
+    def test_saving_reloads_in_this_process(self):
+        self.assertEqual(rank_ladder().ranks, [])
+        RankAndRewards.objects.create(rank_no=1, rank_name='Star', pairs=2)
+        self.assertEqual([rank.rank_name for rank in rank_ladder().ranks], ['Star'])
+
+    def test_other_processes_are_noticed_after_the_check_interval(self):
+        rank_ladder()
+        # Another process saved a rank: only the shared token changed.
+        RankAndRewards.objects.bulk_create([RankAndRewards(rank_no=1, rank_name='Star', pairs=2)])
+        cache.set(RANK_LADDER.key, 'changed elsewhere', None)
+        self.assertEqual(rank_ladder().ranks, [])
+
+        RANK_LADDER.checked_at -= RANK_LADDER.check_interval
+        self.assertEqual([rank.rank_name for rank in rank_ladder().ranks], ['Star'])
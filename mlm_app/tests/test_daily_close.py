@@ -0,0 +1,39 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from mlm_app.models import DailyClose, LedgerLine, LedgerTransaction, Member, MemberDailySnapshot
+
+from .factories import create_admin, register
+
+
+class DailyCloseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = register(create_admin(), 'Left', 'member')
+        LedgerTransaction.post('commission', [
+            LedgerLine(cls.member.pk, 'account_balance', Decimal('75.00'), 'direct_income'),
+            LedgerLine(None, 'company', Decimal('-75.00')),
+        ])
+
+    def test_closes_the_previous_local_date_by_default(self):
+        call_command('daily_close', skip_commissions=True, stdout=StringIO())
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        self.assertEqual(DailyClose.objects.get().business_date, yesterday)
+        snapshot = MemberDailySnapshot.objects.get(member=self.member)
+        self.assertEqual((snapshot.business_date, snapshot.income), (yesterday, Decimal('75.00')))
+        self.assertEqual(Member.objects.get(pk=self.member.pk).today_income, 0)
+
+        with self.assertRaises(CommandError):
+            call_command('daily_close', skip_commissions=True, stdout=StringIO())
+
+    def test_explicit_date(self):
+        today = timezone.localdate()
+        call_command('daily_close', '--date', today.isoformat(), skip_commissions=True, stdout=StringIO())
+        self.assertEqual(DailyClose.objects.get().business_date, today)
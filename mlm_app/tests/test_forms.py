@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from mlm_app.forms import UserRegistrationForm
+
+
+class UserRegistrationFormTests(TestCase):
+
+    def form(self, username):
+        return UserRegistrationForm(data={
+            'username': username, 'first_name': 'Asha', 'last_name': 'Rao', 'email': 'asha@example.com',
+            'mobile_no': '9811111111', 'password1': 'Strong-pass-123', 'password2': 'Strong-pass-123',
+        })
+
+    def test_accepts_a_free_username(self):
+        self.assertTrue(self.form('asha').is_valid())
+
+    def test_rejects_an_existing_username_in_another_case(self):
+        User.objects.create(username='Asha')
+        self.assertIn('username', self.form('asha').errors)
+
+    def test_rejects_reserved_generated_usernames(self):
+        for username in ('EWE1000001', 'ewe1000001'):
+            self.assertIn('username', self.form(username).errors, username)
@@ -0,0 +1,190 @@
+import json
+import random
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mlm_app.management.commands.import_members import Command as ImportMembers
+from mlm_app.management.commands.process_commission_jobs import Command as CommissionWorker
+from mlm_app.management.commands.recompute_network import Command as RecomputeNetwork
+from mlm_app.models import Member, rank_ladder
+
+from .factories import activate, create_admin, create_plan, register, register_random
+
+COUNTERS = [
+    'left_active_count', 'left_inactive_count', 'left_total_count',
+    'right_active_count', 'right_inactive_count', 'right_total_count',
+]
+
+
+class BruteForceTree:
+    """The tree rebuilt from the left/right links only, for comparison with the stored indexes."""
+
+    def __init__(self):
+        self.members = {member.user_id: member for member in Member.objects.all()}
+
+    def child(self, member, direction):
+        return self.members.get(getattr(member, f'{direction}_id'))
+
+    def subtree(self, member):
+        stack, found = [member], []
+        while stack:
+            node = stack.pop()
+            found.append(node)
+            stack.extend(child for child in (self.child(node, 'left'), self.child(node, 'right')) if child)
+        return found
+
+    def counters(self, member):
+        values = []
+        for direction in ('left', 'right'):
+            child = self.child(member, direction)
+            team = self.subtree(child) if child else []
+            active = sum(1 for node in team if node.status == 'Active')
+            values += [active, len(team) - active, len(team)]
+        return values
+
+    def extreme(self, member, direction):
+        """The chain-top pointer: the end of the outermost leg, unless the member is its head's child on that side."""
+        head = self.members.get(member.head_member_id)
+        if head is not None and getattr(head, f'{direction}_id') == member.user_id:
+            return None
+        node = member
+        while self.child(node, direction):
+            node = self.child(node, direction)
+        return None if node is member else node.user_id
+
+    def path(self, member):
+        head = self.members.get(member.head_member_id)
+        if head is None:
+            return f'{member.user_id}/'
+        return self.path(head) + ('L' if head.left_id == member.user_id else 'R')
+
+
+class PlacementTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        cls.plan = create_plan()
+        cls.members = register_random(cls.admin, 80, seed=7)
+        for member in random.Random(8).sample(cls.members, 35):
+            activate(member, cls.plan)
+
+    def test_indexes_match_brute_force(self):
+        tree = BruteForceTree()
+        for member in tree.members.values():
+            self.assertEqual([getattr(member, field) for field in COUNTERS], tree.counters(member), member)
+            self.assertEqual(member.tree_path, tree.path(member), member)
+            self.assertEqual(member.tree_depth, len(member.tree_path) - len(member.tree_path.rstrip('LR')), member)
+            for direction in ('left', 'right'):
+                self.assertEqual(getattr(member, f'{direction}_extreme_id'), tree.extreme(member, direction), member)
+
+    def test_spillover_lands_at_the_end_of_the_leg(self):
+        for sponsor in random.Random(9).sample(self.members, 10):
+            for position in ('Left', 'Right'):
+                direction = position.lower()
+                tree = BruteForceTree()
+                node = tree.members[sponsor.user_id]
+                while tree.child(node, direction):
+                    node = tree.child(node, direction)
+
+                member = register(sponsor, position, f'spill-{sponsor.pk}-{direction}')
+                self.assertEqual(member.head_member_id, node.user_id)
+        self.test_indexes_match_brute_force()
+
+    def test_ancestor_legs_follow_the_path(self):
+        member = max(Member.objects.all(), key=lambda member: member.tree_depth)
+        by_path = {ancestor.tree_path: ancestor for ancestor in Member.objects.all()}
+        expected = [
+            (by_path[path].pk, by_path[path].user_id, member.tree_path[len(path)])
+            for path in member.get_ancestor_paths()
+        ]
+        self.assertEqual(member.get_ancestor_legs(), expected)
+        self.assertEqual(self.admin.get_ancestor_legs(), [])
+
+    def test_rebuild_restores_the_indexes(self):
+        Member.objects.update(tree_path='', tree_depth=0, left_extreme=None, right_extreme=None)
+        call_command('rebuild_tree_paths', stdout=StringIO())
+        self.test_indexes_match_brute_force()
+
+    def test_recompute_restores_counters_and_keeps_paid_pairs(self):
+        CommissionWorker().process_batch(1000, max_attempts=1)
+        paid = list(Member.objects.order_by('pk').values_list('pk', 'all_matching_pairs'))
+        Member.objects.update(left_active_count=0, right_total_count=0)
+
+        call_command('recompute_network', workers=1, stdout=StringIO())
+        self.test_indexes_match_brute_force()
+        self.assertEqual(list(Member.objects.order_by('pk').values_list('pk', 'all_matching_pairs')), paid)
+
+    def test_recompute_keeps_members_placed_while_it_runs(self):
+        Member.objects.update(left_active_count=0, right_total_count=0)
+        command = RecomputeNetwork()
+        ladder = rank_ladder()
+        changes, _ = command.recompute(1, ladder)
+
+        deepest = max(Member.objects.all(), key=lambda member: member.tree_depth)
+        activate(register(deepest, 'Left', 'latecomer'), create_plan('Late'))
+        command.write_changes(changes, 7, ladder)
+        self.test_indexes_match_brute_force()
+
+    def import_members(self, sponsor):
+        rows = [{'username': 'imported-0', 'sponsor': sponsor.user.username, 'leg': 'Left', 'plan': self.plan.name}]
+        rows += [
+            {'username': f'imported-{i}', 'sponsor': f'imported-{i // 2}', 'leg': ('Left', 'Right')[i % 2]}
+            for i in range(1, 12)
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as handle:
+            handle.writelines(json.dumps(row) + '\n' for row in rows)
+            handle.flush()
+            call_command('import_members', handle.name, skip_commissions=True, stdout=StringIO())
+
+    def test_import_places_members_like_registration(self):
+        self.import_members(self.members[3])
+        self.assertEqual(Member.objects.filter(user__username__startswith='imported-').count(), 12)
+        self.test_indexes_match_brute_force()
+
+    def import_racing(self, sponsor, racer):
+        """Import below ``sponsor`` while ``racer`` changes the network just after the import read it."""
+        load_tree = ImportMembers.load_tree
+
+        def load_then_race(command):
+            tree = load_tree(command)
+            racer()
+            return tree
+
+        with mock.patch.object(ImportMembers, 'load_tree', load_then_race):
+            self.import_members(sponsor)
+
+    def test_import_keeps_counts_changed_after_the_read(self):
+        sponsor = self.members[3]
+        self.import_racing(sponsor, lambda: register(self.members[40], 'Right', 'racer'))
+        self.test_indexes_match_brute_force()
+
+    def test_import_stops_when_its_targets_moved_after_the_read(self):
+        sponsor = self.members[3]
+        with self.assertRaises(CommandError):
+            self.import_racing(sponsor, lambda: register(sponsor, 'Left', 'racer'))
+        self.assertFalse(Member.objects.filter(user__username__startswith='imported-').exists())
+
+
+class DeepLegPlacementTests(TestCase):
+
+    def test_spillover_cost_grows_linearly_with_the_leg(self):
+        admin = create_admin()
+        costs = {}
+        for depth in range(1, 81):
+            with CaptureQueriesContext(connection) as queries:
+                member = register(admin, 'Left', f'deep{depth}')
+            costs[depth] = (len(queries), sum(len(query['sql']) for query in queries.captured_queries))
+
+        self.assertEqual(member.tree_depth, 80)
+        self.assertEqual(costs[20][0], costs[80][0])
+        # The SQL grows with the member's path and its ancestors' ids, not with every ancestor's path.
+        per_level = (costs[80][1] - costs[40][1]) / 40
+        self.assertLess(per_level, 30)
+        self.assertLess(abs((costs[40][1] - costs[20][1]) / 20 - per_level), 5)
@@ -0,0 +1,183 @@
+import random
+from collections import Counter
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import Sum
+from django.test import TestCase
+
+from mlm_app.management.commands.process_commission_jobs import Command as CommissionWorker
+from mlm_app.models import (
+    CommissionJob, IncomeHistory, LedgerTransaction, Member, MemberPlan, ReconciliationCheckpoint,
+)
+from mlm_app.payouts import MATCHING_UPDATE_FIELDS
+from mlm_app.simulator import INCOME_TYPES, NetworkSnapshot, Replay, load_config, simulate, to_paise
+
+from .factories import activate, create_admin, create_plan, create_ranks, register_random
+
+PAYOUT_FIELDS = ['direct_income', 'level_income', 'matching_income', *MATCHING_UPDATE_FIELDS]
+
+
+class BatchedActivationPayoutTests(TestCase):
+    """Batched commission jobs must pay what processing the activations one by one pays."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ranks()
+        cls.basic = create_plan('Basic')
+        cls.gold = create_plan('Gold', price=2000, direct=200, matching=80)
+        cls.members = register_random(create_admin(), 120, seed=3)
+
+    def setUp(self):
+        rng = random.Random(11)
+        for member in rng.sample(self.members, 15):
+            activate(member, self.basic)
+        self.drain(batch_size=1)
+        # Pending activations, including renewals and upgrades of members that are already active.
+        for _ in range(60):
+            activate(rng.choice(self.members), rng.choice([self.basic, self.basic, self.gold]))
+
+    def drain(self, batch_size):
+        worker = CommissionWorker()
+        while worker.process_batch(batch_size, max_attempts=1):
+            pass
+        self.assertFalse(CommissionJob.objects.exclude(status='done').exists())
+
+    def payouts(self):
+        return list(Member.objects.order_by('pk').values_list('pk', *PAYOUT_FIELDS))
+
+    def paid_one_by_one(self):
+        with transaction.atomic():
+            self.drain(batch_size=1)
+            paid = self.payouts()
+            transaction.set_rollback(True)
+        return paid
+
+    def test_batches_match_one_by_one(self):
+        expected = self.paid_one_by_one()
+        for batch_size in (7, 1000):
+            with self.subTest(batch_size=batch_size), transaction.atomic():
+                self.drain(batch_size)
+                self.assertEqual(self.payouts(), expected)
+                transaction.set_rollback(True)
+
+    def test_batch_matches_replay(self):
+        self.drain(batch_size=1000)
+
+        snapshot = NetworkSnapshot.load()
+        plans, ladder = load_config()
+        replay = Replay(snapshot, plans, ladder)
+        for member, plan_id, _ in snapshot.history():
+            replay.activate(member, plan_id)
+
+        stored = {pk: values for pk, *values in self.payouts()}
+        for position, member_id in enumerate(snapshot.member_ids):
+            expected = [replay.state[income_type][position] for income_type in INCOME_TYPES]
+            expected += [replay.state[field][position] for field in MATCHING_UPDATE_FIELDS]
+            values = stored[member_id]
+            self.assertEqual([to_paise(amount) for amount in values[:3]] + values[3:], expected, member_id)
+
+
+class SimulatorTests(TestCase):
+    """Replaying the recorded activations through the simulator must report what was actually paid."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ranks()
+        plans = [create_plan('Basic'), create_plan('Gold', price=2000, direct=200, matching=80)]
+        members = register_random(create_admin(), 40, seed=13)
+        rng = random.Random(17)
+        for _ in range(25):
+            activate(rng.choice(members), rng.choice(plans))
+        CommissionWorker().process_batch(1000, max_attempts=1)
+
+    def test_simulated_history_matches_the_payouts(self):
+        snapshot = NetworkSnapshot.load()
+        plans, ladder = load_config()
+        activations = [(member, plan_id) for member, plan_id, _ in snapshot.history()]
+        report = simulate(snapshot, activations, plans, ladder)
+
+        paid = dict(IncomeHistory.objects.values_list('income_type').annotate(total=Sum('amount')))
+        total = sum(paid.values())
+        self.assertTrue(all(paid.get(income_type) for income_type in INCOME_TYPES), paid)
+        self.assertEqual(report['payouts'], {income_type: paid[income_type] for income_type in INCOME_TYPES})
+        self.assertEqual(report['total_payout'], total)
+        self.assertEqual(report['members_paid'], IncomeHistory.objects.values('member').distinct().count())
+        sales = MemberPlan.objects.aggregate(total=Sum('plan__price'))['total']
+        self.assertEqual(report['company_balance'], sales - total)
+        ranks = Counter(Member.objects.values_list('rank_no', flat=True))
+        self.assertEqual(report['rank_distribution'], dict(sorted(ranks.items())))
+
+
+class ReconcileCommissionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ranks()
+        cls.plan = create_plan()
+        cls.members = register_random(create_admin(), 30, seed=5)
+        for member in cls.members[:12]:
+            activate(member, cls.plan)
+        CommissionWorker().process_batch(1000, max_attempts=1)
+        earners = IncomeHistory.objects.values('member').annotate(total=Sum('amount')).order_by('-total', 'member')
+        cls.earner, cls.other = (Member.objects.get(pk=row['member']) for row in earners[:2])
+
+    def reconcile(self, *args, full=True):
+        output = StringIO()
+        options = ['--full'] if full else []
+        call_command('reconcile_commissions', *options, '--types', *INCOME_TYPES, *args, stdout=output)
+        return output.getvalue()
+
+    def income(self, member):
+        return IncomeHistory.objects.filter(member=member).aggregate(total=Sum('amount'))['total']
+
+    def test_apply_pays_shortfalls(self):
+        expected = self.income(self.earner)
+        IncomeHistory.objects.filter(member=self.earner).delete()
+
+        self.reconcile('--apply')
+        self.assertEqual(self.income(self.earner), expected)
+
+    def test_resumes_from_the_checkpoint(self):
+        self.reconcile(full=False)
+        checkpoint = ReconciliationCheckpoint.objects.get()
+        self.assertEqual(checkpoint.activations_replayed, 12)
+        self.assertEqual(checkpoint.last_member_plan_id, MemberPlan.objects.order_by('pk').last().pk)
+
+        for member in self.members[12:15]:
+            activate(member, self.plan)
+        CommissionWorker().process_batch(1000, max_attempts=1)
+        streamed = mock.patch.object(NetworkSnapshot, 'history', autospec=True, side_effect=NetworkSnapshot.history)
+        with streamed as history:
+            output = self.reconcile(full=False)
+
+        self.assertEqual(history.call_args.kwargs['after_id'], checkpoint.last_member_plan_id)
+        latest = ReconciliationCheckpoint.objects.first()
+        self.assertEqual(latest.activations_replayed, 15)
+        self.assertEqual(latest.last_member_plan_id, MemberPlan.objects.order_by('pk').last().pk)
+        # The resumed replay agrees with a full one: nothing is missing or overpaid.
+        self.assertNotIn('matching pairs differ', output)
+        for income_type in INCOME_TYPES:
+            self.assertIn(f"{income_type}: 0 members underpaid by 0.00, 0 overpaid by 0.00", output)
+
+    def test_second_run_emits_no_corrections(self):
+        IncomeHistory.objects.filter(member=self.earner).delete()
+        Member.objects.filter(pk=self.earner.pk).update(all_matching_pairs=0, matching_pairs=0, rank_no=0)
+        self.assertIn("Paid ", self.reconcile('--apply', full=False))
+        transactions = LedgerTransaction.objects.filter(kind='reconciliation').count()
+
+        output = self.reconcile('--apply', full=False)
+        self.assertNotIn("Paid ", output)
+        self.assertNotIn('matching pairs differ', output)
+        self.assertEqual(LedgerTransaction.objects.filter(kind='reconciliation').count(), transactions)
+
+    def test_apply_refuses_while_overpaid(self):
+        IncomeHistory.objects.filter(member=self.earner).delete()
+        IncomeHistory.objects.create(member=self.other, income_type='level_income', amount=Decimal('25.00'))
+
+        with self.assertRaisesMessage(CommandError, "1 overpayments"):
+            self.reconcile('--apply')
+        self.assertIsNone(self.income(self.earner))
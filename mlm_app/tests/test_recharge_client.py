@@ -0,0 +1,121 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from mlm_app import ewe_functions
+from mlm_app.ewe_functions import CircuitBreaker, RechargeClient
+
+
+class StubResponse:
+
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        if self.payload is None:
+            raise ValueError("No JSON object could be decoded")
+        return self.payload
+
+
+class StubSession:
+    """Stands in for requests.Session: answers calls from ``results``, raising the exceptions among them."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, timeout))
+        result = self.results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+class RechargeClientTests(SimpleTestCase):
+
+    def client_with(self, *results, **options):
+        client = RechargeClient(base_url='https://provider.test/api', api_token='token', **options)
+        client.session = StubSession(*results)
+        return client
+
+    def outcomes(self, client, operation):
+        return client.metrics.snapshot()[operation]['outcomes']
+
+    def test_recharge_timeout_is_pending_and_not_retried(self):
+        client = self.client_with(requests.exceptions.ReadTimeout())
+        result = client.recharge('9800000001', 100, 'jio', '1001')
+
+        self.assertEqual(result['status'], 'pending')
+        self.assertEqual(client.session.calls, [('POST', 'https://provider.test/api/recharge', (3.05, 30))])
+        self.assertEqual(self.outcomes(client, 'recharge'), {'timeout': 1})
+
+    def test_status_checks_retry_with_jittered_backoff(self):
+        client = self.client_with(
+            requests.exceptions.ConnectTimeout(), StubResponse(503), StubResponse(200, {'status': 'Success'}),
+            backoff=0.5,
+        )
+        with mock.patch.object(ewe_functions.random, 'uniform', side_effect=[0.2, 0.7]) as uniform, \
+                mock.patch.object(ewe_functions.time, 'sleep') as sleep:
+            result = client.check_status('9800000001', 100, 'jio', '1001')
+
+        self.assertEqual(result, {'status': 'Success'})
+        self.assertEqual(uniform.call_args_list, [mock.call(0, 0.5), mock.call(0, 1.0)])
+        self.assertEqual(sleep.call_args_list, [mock.call(0.2), mock.call(0.7)])
+        self.assertEqual(self.outcomes(client, 'status'), {'timeout': 1, 'server_error': 1, 'ok': 1})
+
+    def test_status_checks_give_up_after_the_retries(self):
+        client = self.client_with(*[StubResponse(502)] * 3, status_retries=2)
+        with mock.patch.object(ewe_functions.time, 'sleep'):
+            result = client.check_status('9800000001', 100, 'jio', '1001')
+        self.assertEqual(result, {'error': 'API request failed', 'details': 'server error'})
+        self.assertEqual(len(client.session.calls), 3)
+
+    def test_breaker_opens_then_lets_one_trial_through_and_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        client = self.client_with(
+            requests.exceptions.ConnectionError(), requests.exceptions.ConnectionError(),
+            StubResponse(200, {'status': 'Success'}), breaker=breaker,
+        )
+        for _ in range(2):
+            self.assertEqual(client.recharge('9800000001', 100, 'jio', '1001')['status'], 'pending')
+        self.assertEqual(breaker.state, 'open')
+
+        result = client.recharge('9800000001', 100, 'jio', '1002')
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(len(client.session.calls), 2)
+
+        breaker.opened_at -= 30
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertEqual(client.recharge('9800000001', 100, 'jio', '1003'), {'status': 'Success'})
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(self.outcomes(client, 'recharge'), {'connection_error': 2, 'circuit_open': 1, 'ok': 1})
+
+    def test_unexpected_error_ends_the_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        client = self.client_with(
+            requests.exceptions.ConnectionError(), TypeError("bad adapter"), StubResponse(200, {'status': 'Success'}),
+            breaker=breaker,
+        )
+        client.recharge('9800000001', 100, 'jio', '1001')
+        breaker.opened_at -= 30
+        with self.assertRaises(TypeError):
+            client.recharge('9800000001', 100, 'jio', '1002')
+        self.assertFalse(breaker.trial_running)
+        self.assertEqual(breaker.state, 'open')
+
+        breaker.opened_at -= 30
+        self.assertEqual(client.recharge('9800000001', 100, 'jio', '1003'), {'status': 'Success'})
+        self.assertEqual(self.outcomes(client, 'recharge'), {'connection_error': 1, 'error': 1, 'ok': 1})
+
+    def test_metrics_bucket_latencies(self):
+        client = self.client_with(StubResponse(200, {'status': 'Success'}), StubResponse(400), StubResponse(200))
+        for order_id in ('1001', '1002', '1003'):
+            client.recharge('9800000001', 100, 'jio', order_id)
+
+        recharge = client.metrics.snapshot()['recharge']
+        self.assertEqual(recharge['outcomes'], {'ok': 1, 'client_error': 1, 'bad_response': 1})
+        self.assertEqual(sum(recharge['latency_ms'].values()), 3)
+        self.assertIn('+Inf', recharge['latency_ms'])
@@ -0,0 +1,230 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mlm_app.models import (
+    IncomeHistory, InsufficientFunds, LedgerEntry, LedgerLine, LedgerTransaction, Level, Member,
+)
+from mlm_app.recharges import (
+    provider_status, reserve_recharge, reserve_recharges, resale_share, resolve_recharge, settle_recharge,
+    settle_recharges,
+)
+
+from .factories import activate, create_admin, create_plan, register
+
+
+class ProviderStatusTests(SimpleTestCase):
+
+    def test_final_statuses_in_any_case(self):
+        for raw in ('success', 'SUCCESS', ' Successful '):
+            self.assertEqual(provider_status({'status': raw}), 'success', raw)
+        for raw in ('failed', 'FAILED', 'Failure', 'Refunded', 'REVERSED'):
+            self.assertEqual(provider_status({'status': raw}), 'failed', raw)
+
+    def test_open_outcomes_stay_pending(self):
+        for response in ({'status': 'Pending'}, {'status': 'PROCESSING'}, {'error': 'API request failed'}, {'status': ''}):
+            self.assertEqual(provider_status(response), 'pending', response)
+
+    def test_unknown_status_goes_to_review(self):
+        with self.assertLogs('mlm_app.recharges', 'WARNING') as logs:
+            self.assertEqual(provider_status({'status': 'ON_HOLD'}), 'review')
+        self.assertIn('ON_HOLD', logs.output[0])
+
+
+class RechargeTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        plan = create_plan()
+        cls.sponsor = register(admin, 'Left', 'sponsor')
+        cls.member = register(cls.sponsor, 'Left', 'member')
+        for member in (cls.sponsor, cls.member):
+            activate(member, plan)
+        LedgerTransaction.post('adjustment', [
+            LedgerLine(cls.member.pk, 'wallet_balance', Decimal('1000.00')),
+            LedgerLine(None, 'company', Decimal('-1000.00')),
+        ])
+
+    def wallet(self):
+        return Member.objects.get(pk=self.member.pk).wallet_balance
+
+    def held(self):
+        return LedgerEntry.objects.filter(account='recharge_hold').aggregate(total=Sum('amount'))['total']
+
+    def reserve(self, amount=Decimal('100.00')):
+        return reserve_recharge(self.member, '9800000001', amount, 'jio')
+
+    def test_reserve_holds_the_amount(self):
+        recharge = self.reserve()
+        self.assertEqual(recharge.status, 'pending')
+        self.assertEqual(self.wallet(), Decimal('900.00'))
+        self.assertEqual(self.held(), Decimal('100.00'))
+
+    def test_reserve_beyond_the_wallet_holds_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            self.reserve(Decimal('5000.00'))
+        self.assertEqual(self.wallet(), Decimal('1000.00'))
+        self.assertIsNone(self.held())
+
+    def test_success_releases_the_hold_and_pays_resale_income(self):
+        recharge = settle_recharge(self.reserve().pk, {'status': 'SUCCESS', 'txn_id': 'T1'})
+        _, resale_income = resale_share(Decimal('100.00'))
+
+        self.assertEqual(recharge.status, 'success')
+        self.assertIsNotNone(recharge.settled_at)
+        self.assertEqual(self.held(), 0)
+        self.assertEqual(self.wallet(), Decimal('900.00') + resale_income)
+        self.assertTrue(IncomeHistory.objects.filter(member=self.member, income_type='resale_income').exists())
+
+    def test_failure_refunds_the_hold(self):
+        recharge = settle_recharge(self.reserve().pk, {'status': 'Failure'})
+        self.assertEqual(recharge.status, 'failed')
+        self.assertEqual(self.held(), 0)
+        self.assertEqual(self.wallet(), Decimal('1000.00'))
+
+    def test_open_outcome_keeps_the_hold(self):
+        recharge = settle_recharge(self.reserve().pk, {'status': 'pending', 'error': 'Recharge provider timeout.'})
+        self.assertEqual(recharge.status, 'pending')
+        self.assertIsNone(recharge.settled_at)
+        self.assertEqual(self.held(), Decimal('100.00'))
+
+    def test_open_outcomes_never_blank_the_provider_answer(self):
+        recharge = self.reserve()
+        accepted = {'status': 'Accepted', 'txn_id': 'T42'}
+        settle_recharge(recharge.pk, accepted)
+        recharge = settle_recharge(recharge.pk, {'error': 'API request failed', 'details': 'timeout'})
+        self.assertEqual(recharge.response_data, accepted)
+        self.assertEqual((recharge.provider_txn_id, recharge.operator_status), ('T42', 'accepted'))
+
+        recharge = settle_recharge(recharge.pk, {'status': 'Success', 'operator_ref': 'OP7'})
+        recharge.refresh_from_db()
+        self.assertEqual(recharge.response_data, {'status': 'Success', 'operator_ref': 'OP7'})
+        self.assertEqual((recharge.provider_txn_id, recharge.operator_status), ('T42', 'success'))
+
+    def test_settled_recharges_are_not_settled_again(self):
+        recharge = settle_recharge(self.reserve().pk, {'status': 'success'})
+        transactions = LedgerTransaction.objects.count()
+        self.assertEqual(settle_recharge(recharge.pk, {'status': 'failed'}).status, 'success')
+        self.assertEqual(LedgerTransaction.objects.count(), transactions)
+
+    def test_unknown_status_is_held_for_review_until_resolved(self):
+        with self.assertLogs('mlm_app.recharges', 'WARNING'):
+            recharge = settle_recharge(self.reserve().pk, {'status': 'ON_HOLD'})
+        self.assertEqual(recharge.status, 'review')
+        self.assertEqual(self.held(), Decimal('100.00'))
+        # Status polling leaves it alone; staff settle it.
+        self.assertEqual(settle_recharge(recharge.pk, {'status': 'success'}).status, 'review')
+
+        recharge = resolve_recharge(recharge.pk, 'failed')
+        self.assertEqual(recharge.status, 'failed')
+        self.assertEqual(self.held(), 0)
+        self.assertEqual(self.wallet(), Decimal('1000.00'))
+
+    def test_bulk_reserve_and_settle(self):
+        rows = [{'mobile_no': f'980000000{i}', 'amount': Decimal('50.00'), 'company_name': 'jio'} for i in range(3)]
+        recharges = reserve_recharges(self.member, rows)
+        self.assertEqual(self.held(), Decimal('150.00'))
+        self.assertEqual(len({recharge.order_id for recharge in recharges}), 3)
+
+        settled = settle_recharges({
+            recharges[0].pk: {'status': 'success'},
+            recharges[1].pk: {'status': 'FAILED'},
+            recharges[2].pk: {'status': 'processing'},
+        })
+        self.assertEqual([settled[recharge.pk].status for recharge in recharges], ['success', 'failed', 'pending'])
+        self.assertEqual(self.held(), Decimal('50.00'))
+
+    def test_bulk_settlement_posts_once_per_outcome(self):
+        rows = [{'mobile_no': f'980000000{i}', 'amount': Decimal('50.00'), 'company_name': 'jio'} for i in range(5)]
+        recharges = reserve_recharges(self.member, rows)
+        transactions = LedgerTransaction.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            settle_recharges({
+                recharge.pk: {'status': 'failed' if index == 4 else 'success'}
+                for index, recharge in enumerate(recharges)
+            })
+
+        kinds = LedgerTransaction.objects.order_by('pk').values_list('kind', flat=True)[transactions:]
+        self.assertEqual(sorted(kinds), ['recharge', 'recharge_refund'])
+        self.assertEqual(sum('WITH RECURSIVE' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(self.held(), 0)
+        _, resale_income = resale_share(Decimal('50.00'))
+        self.assertEqual(self.wallet(), Decimal('1000.00') - 4 * Decimal('50.00') + 4 * resale_income)
+        self.assertEqual(IncomeHistory.objects.filter(income_type='resale_income', member=self.sponsor).count(), 4)
+
+
+class ResalePoolTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        plan = create_plan()
+        # Level percentages that add up to more than the whole pool.
+        for level in Level.objects.filter(plan=plan):
+            level.resale_percentage = 40
+            level.save()
+        cls.upline = []
+        sponsor = admin
+        for depth in range(5):
+            sponsor = register(sponsor, 'Left', f'upline-{depth}')
+            activate(sponsor, plan)
+            cls.upline.append(sponsor)
+        cls.member = register(sponsor, 'Left', 'member')
+        activate(cls.member, plan)
+        LedgerTransaction.post('adjustment', [
+            LedgerLine(cls.member.pk, 'wallet_balance', Decimal('1000.00')),
+            LedgerLine(None, 'company', Decimal('-1000.00')),
+        ])
+
+    def pool(self):
+        return LedgerEntry.objects.filter(account='resale_pool').aggregate(total=Sum('amount'))['total']
+
+    def test_upline_shares_never_overdraw_the_pool(self):
+        for amount in ('100.00', '33.33', '499.99'):
+            settle_recharge(reserve_recharge(self.member, '9800000001', Decimal(amount), 'jio').pk, {'status': 'success'})
+            self.assertGreaterEqual(self.pool(), 0, amount)
+
+        # 40% each of a 2.00 pool: the parent gets 0.80, the next 0.80 and the third what is left.
+        sharable, resale_income = resale_share(Decimal('100.00'))
+        shares = [
+            income.amount for income in IncomeHistory.objects.filter(
+                income_type='resale_income', description__endswith='from member'
+            ).order_by('pk')[:3]
+        ]
+        self.assertEqual(sharable - resale_income, Decimal('2.00'))
+        self.assertEqual(shares, [Decimal('0.80'), Decimal('0.80'), Decimal('0.40')])
+
+
+class BulkRechargeViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = register(create_admin(), 'Left', 'member')
+        LedgerTransaction.post('adjustment', [
+            LedgerLine(cls.member.pk, 'wallet_balance', Decimal('500.00')),
+            LedgerLine(None, 'company', Decimal('-500.00')),
+        ])
+
+    def post(self, client, **headers):
+        body = json.dumps({'rows': [{'mobile_no': '9800000001', 'amount': '100', 'company_name': 'jio'}]})
+        with mock.patch('mlm_app.recharges.recharge_mobile', return_value={'status': 'Success'}):
+            return client.post(reverse('api_bulk_recharge'), body, content_type='application/json', **headers)
+
+    def test_session_callers_must_send_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.member.user)
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            self.assertEqual(self.post(client).status_code, 403)
+
+        client.get(reverse('dashboard'))
+        response = self.post(client, HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['status'], 'success')
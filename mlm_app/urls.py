@@ -23,7 +23,11 @@ urlpatterns = [
     # Admin URLs
     path('admin-panel/plans/', views.admin_plans, name='admin_plans'),
     path('admin-panel/members/', views.admin_members, name='admin_members'),
+    path('admin-panel/members/export/', views.admin_members_export, name='admin_members_export'),
     
     # API URLs
     path('api/member-search/', views.api_member_search, name='api_member_search'),
+    path('api/genealogy/<str:username>/', views.api_genealogy, name='api_genealogy'),
+    path('api/recharges/bulk/', views.api_bulk_recharge, name='api_bulk_recharge'),
+    path('api/recharge-metrics/', views.api_recharge_metrics, name='api_recharge_metrics'),
 ]
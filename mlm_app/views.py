@@ -3,20 +3,30 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
 from decimal import Decimal
+from urllib.parse import urlencode
+import csv
+import datetime
 import json
 
 from .models import (
     Member, Plan, MemberPlan, CompanyWallet, RechargeTransaction, 
-    IncomeHistory, RankAndRewards, Level
+    IncomeHistory, IncomeDailyRollup, RankAndRewards, Level, LedgerTransaction, LedgerLine,
+    InsufficientFunds, rank_ladder
 )
 from .forms import UserRegistrationForm, PlanSelectionForm, MobileRechargeForm
-from .ewe_functions import (
-    generate_username, generate_random_password, send_gmail,
-    recharge_mobile, create_order_id
+from .ewe_functions import generate_username, generate_random_password, send_gmail, recharge_client
+from .recharges import (
+    BULK_RECHARGE_MAX_ROWS, recharge_result, resale_share, reserve_recharge, reserve_recharges, submit_recharge,
+    submit_recharges
 )
+from .dashboard_cache import get_summary
 from mlm_app import models
 
 def home(request):
@@ -104,37 +114,39 @@ def register(request):
         'position_from_url': position
     })
 
+DASHBOARD_MEMBER_FIELDS = [
+    'account_balance', 'wallet_balance', 'today_income', 'total_income',
+    'direct_income', 'level_income', 'matching_income', 'resale_income', 'status',
+]
+
+def dashboard_summary(member):
+    """Everything the dashboard shows for ``member``, as plain values for the summary cache."""
+    current_rank = rank_ladder().get(member.rank_no)
+    return {
+        'member': {field: getattr(member, field) for field in DASHBOARD_MEMBER_FIELDS},
+        'left_team': member.count_team_members('left'),
+        'right_team': member.count_team_members('right'),
+        'has_plan': member.plans.exists(),
+        'current_rank': {'rank_no': current_rank.rank_no, 'rank_name': current_rank.rank_name} if current_rank else None,
+        'recent_income': [
+            {'label': income.get_income_type_display(), 'amount': income.amount, 'created_at': income.created_at}
+            for income in IncomeHistory.objects.filter(member=member).order_by('-created_at')[:5]
+        ],
+        'income_trend': monthly_income(IncomeDailyRollup.objects.filter(member=member)),
+    }
+
 @login_required
 def dashboard(request):
     """Main dashboard view"""
-    try:
-        member = request.user.mlm_profile
-    except Member.DoesNotExist:
-        # Create member if not exists
-        member = Member.objects.create(user=request.user)
-    
-    # Get team counts
-    left_team = member.count_team_members('left')
-    right_team = member.count_team_members('right')
-    
-    # Get recent income history
-    recent_income = IncomeHistory.objects.filter(member=member).order_by('-created_at')[:5]
-    
-    # Get current rank
-    try:
-        current_rank = RankAndRewards.objects.get(rank_no=member.rank_no)
-    except RankAndRewards.DoesNotExist:
-        current_rank = None
-    
-    context = {
-        'member': member,
-        'left_team': left_team,
-        'right_team': right_team,
-        'recent_income': recent_income,
-        'current_rank': current_rank,
-    }
-    
-    return render(request, 'dashboard/dashboard.html', context)
+    def build():
+        try:
+            member = request.user.mlm_profile
+        except Member.DoesNotExist:
+            # Create member if not exists
+            member = Member.objects.create(user=request.user)
+        return dashboard_summary(member)
+
+    return render(request, 'dashboard/dashboard.html', get_summary(request.user.pk, build))
 
 @login_required
 def profile(request):
@@ -166,9 +178,11 @@ def select_plan(request):
             if member.account_balance >= plan.price:
                 try:
                     with transaction.atomic():
-                        # Deduct plan price from account balance
-                        member.account_balance -= plan.price
-                        member.save()
+                        # Move the plan price from the account balance to the company wallet
+                        LedgerTransaction.post('plan_activation', [
+                            LedgerLine(member.pk, 'account_balance', -plan.price),
+                            LedgerLine(None, 'company', plan.price),
+                        ], description=f'{plan.name} activated by {member.user.username}')
                         
                         # Create member plan
                         member_plan = MemberPlan.objects.create(
@@ -176,10 +190,6 @@ def select_plan(request):
                             plan=plan
                         )
                         
-                        # Add to company wallet
-                        company_wallet, _ = CompanyWallet.objects.get_or_create(id=1)
-                        company_wallet.add_to_wallet(plan.price)
-                        
                         messages.success(request, f'Plan {plan.name} activated successfully!')
                         return redirect('dashboard')
                 except Exception as e:
@@ -198,67 +208,209 @@ def select_plan(request):
     
     return render(request, 'dashboard/select_plan.html', context)
 
+GENEALOGY_DEFAULT_DEPTH = 3
+GENEALOGY_MAX_DEPTH = 6
+
+def load_genealogy(root, max_depth=GENEALOGY_DEFAULT_DEPTH):
+    """
+    Load ``max_depth`` levels of the binary tree below ``root`` breadth-first, one query per level.
+    Nodes on the last loaded level are flagged with ``has_more`` when they have their own downline.
+    """
+    tree = {'member': root, 'left': None, 'right': None, 'has_more': False}
+    level = [tree]
+
+    for depth in range(1, max_depth):
+        child_ids = [
+            user_id for node in level
+            for user_id in (node['member'].left_id, node['member'].right_id) if user_id
+        ]
+        if not child_ids:
+            break
+
+        children = {
+            child.user_id: child
+            for child in Member.objects.select_related('user').filter(user__in=child_ids)
+        }
+        next_level = []
+        for node in level:
+            for direction in ('left', 'right'):
+                child = children.get(getattr(node['member'], f'{direction}_id'))
+                if child:
+                    node[direction] = {'member': child, 'left': None, 'right': None, 'has_more': False}
+                    next_level.append(node[direction])
+        level = next_level
+
+    for node in level:
+        node['has_more'] = bool(node['member'].left_id or node['member'].right_id)
+
+    return tree
+
+def genealogy_to_json(node):
+    """Serialize a genealogy tree built by load_genealogy for the lazy-loading tree widget."""
+    if node is None:
+        return None
+
+    member = node['member']
+    return {
+        'username': member.user.username,
+        'name': f"{member.user.first_name} {member.user.last_name}".strip(),
+        'status': member.status,
+        'left_count': member.left_total_count,
+        'right_count': member.right_total_count,
+        'has_more': node['has_more'],
+        'left': genealogy_to_json(node['left']),
+        'right': genealogy_to_json(node['right']),
+    }
+
+def get_genealogy_depth(request):
+    try:
+        depth = int(request.GET.get('depth', GENEALOGY_DEFAULT_DEPTH))
+    except ValueError:
+        depth = GENEALOGY_DEFAULT_DEPTH
+    return max(1, min(depth, GENEALOGY_MAX_DEPTH))
+
 @login_required
 def genealogy(request):
     """Genealogy tree view"""
-    member = get_object_or_404(Member, user=request.user)
-    
-    def build_tree(member_obj, depth=0, max_depth=3):
-        if depth >= max_depth:
-            return None
-        
-        tree = {
-            'member': member_obj,
-            'left': None,
-            'right': None,
-        }
-        
-        if member_obj.left:
-            try:
-                left_member = Member.objects.get(user=member_obj.left)
-                tree['left'] = build_tree(left_member, depth + 1, max_depth)
-            except Member.DoesNotExist:
-                pass
-        
-        if member_obj.right:
-            try:
-                right_member = Member.objects.get(user=member_obj.right)
-                tree['right'] = build_tree(right_member, depth + 1, max_depth)
-            except Member.DoesNotExist:
-                pass
-        
-        return tree
-    
-    tree_data = build_tree(member)
-    
+    member = get_object_or_404(Member.objects.select_related('user'), user=request.user)
+
+    tree_data = load_genealogy(member, get_genealogy_depth(request))
+
     context = {
         'tree_data': tree_data,
+        'tree_json': genealogy_to_json(tree_data),
         'member': member,
+        'left_team': member.count_team_members('left'),
+        'right_team': member.count_team_members('right'),
     }
-    
+
     return render(request, 'dashboard/genealogy.html', context)
 
+@login_required
+def api_genealogy(request, username):
+    """API endpoint returning a subtree of the genealogy for lazy expansion"""
+    viewer = get_object_or_404(Member, user=request.user)
+    node = get_object_or_404(Member.objects.select_related('user'), user__username=username)
+
+    # Members may only browse their own downline
+    if not request.user.is_staff and node.pk != viewer.pk and node.depth_under(viewer) is None:
+        return JsonResponse({'error': 'Member is not in your downline.'}, status=403)
+
+    tree_data = load_genealogy(node, get_genealogy_depth(request))
+    return JsonResponse({'tree': genealogy_to_json(tree_data)})
+
+INCOME_PAGE_SIZE = 20
+
+def income_totals(queryset):
+    """Sum the amounts of ``queryset`` (income rows or rollups) per income type in one query."""
+    return queryset.aggregate(**{
+        income_type: Sum('amount', filter=Q(income_type=income_type), default=Decimal('0.00'))
+        for income_type, _ in IncomeHistory.INCOME_TYPES
+    })
+
+def monthly_income(rollups, months=12):
+    """
+    Income per calendar month for the last ``months`` months, oldest first, summed from daily
+    rollups. Each entry is a dict with the month, its total and its share of the best month in percent.
+    """
+    today = timezone.localdate()
+    start_index = today.year * 12 + today.month - months
+    first_month = datetime.date(start_index // 12, start_index % 12 + 1, 1)
+    totals = dict(
+        rollups.filter(day__gte=first_month).annotate(month=TruncMonth('day')).order_by()
+        .values_list('month').annotate(total=Sum('amount'))
+    )
+
+    trend = []
+    for index in range(start_index, start_index + months):
+        month = datetime.date(index // 12, index % 12 + 1, 1)
+        trend.append({'month': month, 'total': totals.get(month) or Decimal('0.00')})
+    best = max(entry['total'] for entry in trend)
+    for entry in trend:
+        entry['share'] = int(entry['total'] * 100 / best) if best else 0
+    return trend
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def encode_income_cursor(income):
+    return f"{income.created_at.isoformat()}|{income.pk}"
+
+def decode_income_cursor(cursor):
+    """Return (created_at, id) from a cursor made by encode_income_cursor, or None if malformed."""
+    try:
+        created_at, pk = cursor.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+def income_page(queryset, cursor=None, page_size=INCOME_PAGE_SIZE):
+    """
+    One page of income history, newest first, continuing after ``cursor`` with a keyset on
+    (created_at, id) so every page is an index range scan however far back it is.
+    Returns the rows and the cursor of the next page, or None on the last page.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_income_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        return rows[:page_size], encode_income_cursor(rows[page_size - 1])
+    return rows, None
+
 @login_required
 def income_report(request):
     """Income report view"""
     member = get_object_or_404(Member, user=request.user)
-    
-    # Get income history
-    income_history = IncomeHistory.objects.filter(member=member).order_by('-created_at')
-    
-    # Calculate income by type
-    income_by_type = {}
-    for income_type, _ in IncomeHistory.INCOME_TYPES:
-        income_by_type[income_type] = income_history.filter(income_type=income_type).aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
-    
+
+    # Date filters are turned into datetime bounds so the (member, created_at) index stays usable.
+    income_history = IncomeHistory.objects.filter(member=member)
+    rollups = IncomeDailyRollup.objects.filter(member=member)
+    trend = monthly_income(rollups)
+    date_from = parse_date(request.GET.get('from'))
+    date_to = parse_date(request.GET.get('to'))
+    if date_from:
+        income_history = income_history.filter(
+            created_at__gte=timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min))
+        )
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        income_history = income_history.filter(
+            created_at__lt=timezone.make_aware(datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+        )
+        rollups = rollups.filter(day__lte=date_to)
+
+    # Totals per type for the selected dates, whatever type is being listed, from the daily rollups
+    income_by_type = income_totals(rollups)
+
+    income_type = request.GET.get('type')
+    if income_type in dict(IncomeHistory.INCOME_TYPES):
+        income_history = income_history.filter(income_type=income_type)
+    else:
+        income_type = ''
+
+    page, next_cursor = income_page(income_history, request.GET.get('cursor'))
+
+    filters = {'type': income_type, 'from': date_from or '', 'to': date_to or ''}
     context = {
         'member': member,
-        'income_history': income_history,
+        'income_history': page,
         'income_by_type': income_by_type,
+        'income_trend': trend,
+        'income_types': IncomeHistory.INCOME_TYPES,
+        'filters': filters,
+        'filter_query': urlencode({key: value for key, value in filters.items() if value}),
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
     }
-    
+
     return render(request, 'dashboard/income_report.html', context)
 
 @login_required
@@ -282,53 +434,23 @@ def initiate_recharge(request):
                 })
             
             try:
-                with transaction.atomic():
-                    order_id = create_order_id(10)
-                    while RechargeTransaction.objects.filter(order_id=order_id).exists():
-                        order_id = create_order_id(10)
-
-                    response = recharge_mobile(mobile_no, amount, company_name, order_id, is_stv)
-
-                    if response.get("status") == 'success':
-                        member.wallet_balance -= amount
-                        member.save(update_fields=['wallet_balance'])
-
-                        # Calculate and distribute resale income
-                        company_wallet, _ = CompanyWallet.objects.get_or_create(id=1)
-                        calculate_sharable_amount = amount * 4 / 100  # 4% of amount
-                        company_wallet.balance -= calculate_sharable_amount 
-                        company_wallet.save()
-                        
-                        resale_income = calculate_sharable_amount * 50 / 100  # 50% of sharable amount
-                        member.wallet_balance += resale_income
-                        member.resale_income += resale_income
-                        member.save(update_fields=['wallet_balance', 'resale_income'])
-                        
-                        # Create income history
-                        IncomeHistory.objects.create(
-                            member=member,
-                            income_type='resale_income',
-                            amount=resale_income,
-                            description=f'Resale income from recharge of {mobile_no}'
-                        )
-
-                    # Create transaction record
-                    transaction_record = RechargeTransaction.objects.create(
-                        user=request.user,
-                        mobile_no=mobile_no,
-                        amount=amount,
-                        company_name=company_name,
-                        order_id=order_id,
-                        status=response.get("status", "failed"),
-                        response_data=response
-                    )
-
-                    return render(request, "service/mobile_recharge/recharge_result.html", {
-                        "response": response, 
-                        "transaction": transaction_record
-                    })
+                recharge = reserve_recharge(member, mobile_no, amount, company_name, is_stv)
+            except InsufficientFunds:
+                messages.error(request, 'Insufficient wallet balance!')
             except Exception as e:
                 messages.error(request, f'Recharge failed: {str(e)}')
+            else:
+                # The provider is called after the reservation has committed, holding no locks.
+                try:
+                    transaction_record, response = submit_recharge(recharge)
+                except Exception as e:
+                    # The order stays pending and reconcile_recharges settles it.
+                    transaction_record, response = recharge, {'status': 'pending', 'error': str(e)}
+                return render(request, "service/mobile_recharge/recharge_result.html", {
+                    "response": response,
+                    "transaction": transaction_record,
+                    "resale_income": resale_share(transaction_record.amount)[1],
+                })
     else:
         form = MobileRechargeForm()
 
@@ -338,6 +460,44 @@ def initiate_recharge(request):
         "history": history
     })
 
+@login_required
+def api_bulk_recharge(request):
+    """
+    API endpoint taking a JSON batch of recharges, {"rows": [{"mobile_no", "amount", "company_name",
+    "is_stv"}, ...]}. Every row is validated and the whole total reserved before any is sent; the
+    response lists the result of each row in order.
+
+    Authentication is the member's browser session, so the view keeps Django's CSRF protection:
+    scripts calling it must log in through the site and send the csrftoken cookie's value in an
+    X-CSRFToken header. There is no token authentication for server-to-server callers.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required.'}, status=405)
+    try:
+        rows = json.loads(request.body)['rows']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with a list of rows.'}, status=400)
+    if not isinstance(rows, list) or not 0 < len(rows) <= BULK_RECHARGE_MAX_ROWS:
+        return JsonResponse({'error': f'Send between 1 and {BULK_RECHARGE_MAX_ROWS} rows.'}, status=400)
+
+    forms = [MobileRechargeForm(row if isinstance(row, dict) else {}) for row in rows]
+    errors = [
+        {'row': index, 'errors': form.errors.get_json_data()}
+        for index, form in enumerate(forms) if not form.is_valid()
+    ]
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+
+    member = get_object_or_404(Member, user=request.user)
+    try:
+        recharges = reserve_recharges(member, [form.cleaned_data for form in forms])
+    except InsufficientFunds:
+        return JsonResponse({'error': 'Insufficient wallet balance!'}, status=400)
+
+    # The provider is called after the reservation has committed, holding no locks.
+    recharges, responses = submit_recharges(recharges)
+    return JsonResponse({'results': [recharge_result(*pair) for pair in zip(recharges, responses)]})
+
 # Admin views (basic implementation)
 @login_required
 def admin_plans(request):
@@ -349,17 +509,129 @@ def admin_plans(request):
     plans = Plan.objects.all()
     return render(request, 'admin/plans.html', {'plans': plans})
 
+ADMIN_MEMBERS_PAGE_SIZE = 50
+
+MEMBER_EXPORT_COLUMNS = [
+    ('Username', 'user__username'),
+    ('First Name', 'user__first_name'),
+    ('Last Name', 'user__last_name'),
+    ('Email', 'user__email'),
+    ('Mobile', 'mobile_no'),
+    ('Sponsor', 'sponsor__username'),
+    ('Position', 'position'),
+    ('Status', 'status'),
+    ('Rank', 'rank_no'),
+    ('Plan', 'last_plan_name'),
+    ('Left Team', 'left_total_count'),
+    ('Right Team', 'right_total_count'),
+    ('Total Income', 'total_income'),
+    ('Account Balance', 'account_balance'),
+    ('Wallet Balance', 'wallet_balance'),
+    ('Joined On', 'joined_on'),
+]
+
+def filter_members(request):
+    """
+    Members matching the admin filters in ``request.GET`` (q, status, rank, joined_from, joined_to),
+    newest first and annotated with the name of their last plan. Returns the queryset and the filters.
+    """
+    members = Member.objects.annotate(
+        last_plan_name=Subquery(
+            MemberPlan.objects.filter(member=OuterRef('pk')).order_by('-id').values('plan__name')[:1]
+        ),
+    ).order_by('-joined_on', '-id')
+
+    query = request.GET.get('q', '').strip()
+    if query:
+        members = members.filter(
+            Q(user__username__icontains=query) | Q(user__first_name__icontains=query) | Q(mobile_no__icontains=query)
+        )
+    status = request.GET.get('status', '')
+    if status in dict(Member.STATUS_CHOICES):
+        members = members.filter(status=status)
+    else:
+        status = ''
+    rank = request.GET.get('rank', '')
+    if rank.isdigit():
+        members = members.filter(rank_no=int(rank))
+    else:
+        rank = ''
+    joined_from = parse_date(request.GET.get('joined_from'))
+    if joined_from:
+        members = members.filter(
+            joined_on__gte=timezone.make_aware(datetime.datetime.combine(joined_from, datetime.time.min))
+        )
+    joined_to = parse_date(request.GET.get('joined_to'))
+    if joined_to:
+        members = members.filter(
+            joined_on__lt=timezone.make_aware(datetime.datetime.combine(joined_to + datetime.timedelta(days=1), datetime.time.min))
+        )
+
+    filters = {'q': query, 'status': status, 'rank': rank, 'joined_from': joined_from or '', 'joined_to': joined_to or ''}
+    return members, filters
+
 @login_required
 def admin_members(request):
     """Admin members management"""
     if not request.user.is_staff:
         messages.error(request, 'Access denied.')
         return redirect('dashboard')
-    
-    members = Member.objects.all().order_by('-joined_on')
-    return render(request, 'admin/members.html', {'members': members})
 
-# API views for AJAX calls
+    members, filters = filter_members(request)
+    page = Paginator(
+        members.select_related('user', 'sponsor'), ADMIN_MEMBERS_PAGE_SIZE
+    ).get_page(request.GET.get('page'))
+
+    ladder = rank_ladder()
+    for member in page:
+        rank = ladder.get(member.rank_no)
+        member.rank_name = rank.rank_name if rank else ''
+
+    month_start = timezone.localdate().replace(day=1)
+    stats = Member.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='Active')),
+        inactive=Count('id', filter=Q(status='Inactive')),
+        new_this_month=Count('id', filter=Q(
+            joined_on__gte=timezone.make_aware(datetime.datetime.combine(month_start, datetime.time.min))
+        )),
+    )
+
+    filter_query = urlencode({key: value for key, value in filters.items() if value})
+    return render(request, 'admin/members.html', {
+        'page': page,
+        'stats': stats,
+        'filters': filters,
+        'filter_query': filter_query,
+        'ranks': ladder.ranks,
+        'statuses': Member.STATUS_CHOICES,
+    })
+
+class Echo:
+    """File-like object whose write returns the value, so csv.writer rows can be streamed."""
+    def write(self, value):
+        return value
+
+@login_required
+def admin_members_export(request):
+    """Stream the filtered members as CSV, reading them in chunks so memory use stays constant."""
+    if not request.user.is_staff:
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+
+    members, _ = filter_members(request)
+    rows = members.values_list(*[field for _, field in MEMBER_EXPORT_COLUMNS]).iterator(chunk_size=2000)
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield writer.writerow([header for header, _ in MEMBER_EXPORT_COLUMNS])
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="members-{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
 @login_required
 def referral_links(request):
     """Generate referral links for left and right placement"""
@@ -391,3 +663,13 @@ def api_member_search(request):
         ).values('user__username', 'user__first_name', 'user__last_name')[:10]
         return JsonResponse({'members': list(members)})
     return JsonResponse({'members': []})
+
+@login_required
+def api_recharge_metrics(request):
+    """API endpoint with the recharge provider client's latency histograms and breaker state for this process"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied.'}, status=403)
+    return JsonResponse({
+        'circuit': recharge_client.breaker.state,
+        'operations': recharge_client.metrics.snapshot(),
+    })
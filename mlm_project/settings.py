@@ -83,6 +83,23 @@ if not all([os.environ.get('PGDATABASE'), os.environ.get('PGUSER'), os.environ.g
         }
     }
 
+# Cache shared by every process (web workers, commission and recharge workers), so config and
+# dashboard invalidations reach all of them. Create the table with `python manage.py createcachetable`,
+# or set REDIS_URL to use Redis instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mlm_cache',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {